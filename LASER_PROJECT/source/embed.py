@@ -17,13 +17,18 @@
 
 
 import re
+import io
 import os
 import tempfile
 import sys
+import threading
 import time
 import argparse
+import shutil
+import multiprocessing
 import numpy as np
 from collections import namedtuple
+from itertools import chain, repeat, islice
 
 import torch
 import torch.nn as nn
@@ -105,7 +110,11 @@ class SentenceEncoder:
             if verbose:
                 print(' - transfer encoder to GPU')
             self.encoder.cuda()
+        self.encoder.eval()
         self.sort_kind = sort_kind
+        # the padding helpers share buffers, so one thread encodes at a time
+        self._lock = threading.Lock()
+        self._pad_buffer = None
 
     def _process_batch(self, batch):
         tokens = batch.tokens
@@ -113,56 +122,78 @@ class SentenceEncoder:
         if self.use_cuda:
             tokens = tokens.cuda()
             lengths = lengths.cuda()
-        self.encoder.eval()
         embeddings = self.encoder(tokens, lengths)['sentemb']
         return embeddings.detach().cpu().numpy()
 
-    def _tokenize(self, line):
-        tokens = SPACE_NORMALIZER.sub(" ", line).strip().split()
-        ntokens = len(tokens)
-        ids = torch.LongTensor(ntokens + 1)
-        for i, token in enumerate(tokens):
-            ids[i] = self.dictionary.get(token, self.unk_index)
-        ids[ntokens] = self.eos_index
-        return ids
-
-    def _make_batches(self, lines):
-        tokens = [self._tokenize(line) for line in lines]
-        lengths = np.array([t.numel() for t in tokens])
+    def _token_ids(self, lines):
+        """Returns the ids of all the lines (each ending with eos) in one array, and the lengths"""
+        # str.split() normalizes the white space like SPACE_NORMALIZER
+        tokens = [line.split() for line in lines]
+        lengths = np.fromiter((len(t) + 1 for t in tokens), dtype=np.int64, count=len(tokens))
+        ids = np.full(lengths.sum(), self.eos_index, dtype=np.int64)
+        # one hashed lookup per token, without any per-element tensor assignment
+        is_token = np.ones(len(ids), dtype=bool)
+        is_token[np.cumsum(lengths) - 1] = False
+        ids[is_token] = np.fromiter(
+            map(self.dictionary.get, chain.from_iterable(tokens), repeat(self.unk_index)),
+            dtype=np.int64, count=len(ids) - len(lines))
+        return ids, lengths
+
+    def _pad_batch(self, ids, starts, lengths, indices):
+        """Left-padded (len(indices), max length) tokens of the given lines
+
+        The tokens are a view of a buffer shared by all the batches: they are
+        only valid until the next batch is made.
+        """
+        batch_lengths = lengths[indices]
+        width = batch_lengths.max()
+        size = len(indices) * width
+        capacity = 0 if self._pad_buffer is None else len(self._pad_buffer)
+        if capacity < size:
+            self._pad_buffer = np.empty(max(size, 2 * capacity), dtype=np.int64)
+        toks = self._pad_buffer[:size]
+        toks.fill(self.pad_index)
+        # one gather of the tokens of all the lines and one scatter into the
+        # padded rows (no loop over the lines): line r ends at the end of row r
+        ends = np.cumsum(batch_lengths)
+        sources = np.repeat(starts[indices] - (ends - batch_lengths), batch_lengths)
+        targets = np.repeat((np.arange(len(indices)) + 1) * width - ends, batch_lengths)
+        positions = np.arange(ends[-1])
+        toks[targets + positions] = ids[sources + positions]
+        return Batch(
+            srcs=None,
+            tokens=torch.from_numpy(toks.reshape(len(indices), width)),
+            lengths=torch.from_numpy(batch_lengths)
+        )
+
+    def _make_batches(self, lines, max_sentences=None):
+        max_sentences = max_sentences or self.max_sentences
+        ids, lengths = self._token_ids(lines)
+        starts = np.cumsum(lengths) - lengths
         indices = np.argsort(-lengths, kind=self.sort_kind)
 
-        def batch(tokens, lengths, indices):
-            toks = tokens[0].new_full((len(tokens), tokens[0].shape[0]), self.pad_index)
-            for i in range(len(tokens)):
-                toks[i, -tokens[i].shape[0]:] = tokens[i]
-            return Batch(
-                srcs=None,
-                tokens=toks,
-                lengths=torch.LongTensor(lengths)
-            ), indices
-
-        batch_tokens, batch_lengths, batch_indices = [], [], []
-        ntokens = nsentences = 0
-        for i in indices:
-            if nsentences > 0 and ((self.max_tokens is not None and ntokens + lengths[i] > self.max_tokens) or
-                                   (self.max_sentences is not None and nsentences == self.max_sentences)):
-                yield batch(batch_tokens, batch_lengths, batch_indices)
-                ntokens = nsentences = 0
-                batch_tokens, batch_lengths, batch_indices = [], [], []
-            batch_tokens.append(tokens[i])
-            batch_lengths.append(lengths[i])
-            batch_indices.append(i)
-            ntokens += tokens[i].shape[0]
-            nsentences += 1
-        if nsentences > 0:
-            yield batch(batch_tokens, batch_lengths, batch_indices)
-
-    def encode_sentences(self, sentences):
+        batch_start = ntokens = 0
+        for end, length in enumerate(lengths[indices].tolist()):
+            nsentences = end - batch_start
+            if nsentences > 0 and ((self.max_tokens is not None and ntokens + length > self.max_tokens) or
+                                   (max_sentences is not None and nsentences == max_sentences)):
+                batch_indices = indices[batch_start:end]
+                yield self._pad_batch(ids, starts, lengths, batch_indices), batch_indices.tolist()
+                batch_start = end
+                ntokens = 0
+            ntokens += length
+        if batch_start < len(indices):
+            batch_indices = indices[batch_start:]
+            yield self._pad_batch(ids, starts, lengths, batch_indices), batch_indices.tolist()
+
+    def encode_sentences(self, sentences, max_sentences=None):
+        """max_sentences overrides the batch size given to the constructor"""
         indices = []
         results = []
-        for batch, batch_indices in self._make_batches(sentences):
-            indices.extend(batch_indices)
-            results.append(self._process_batch(batch))
+        with self._lock:
+            for batch, batch_indices in self._make_batches(sentences, max_sentences):
+                indices.extend(batch_indices)
+                results.append(self._process_batch(batch))
         return np.vstack(results)[np.argsort(indices, kind=self.sort_kind)]
 
 
@@ -275,11 +306,12 @@ def EncodeTime(t):
         print(' in {:d}m{:d}s'.format(t // 60, t % 60))
 
 # Encode sentences (existing file pointers)
-def EncodeFilep(encoder, inp_file, out_file, buffer_size=10000, verbose=False):
+def EncodeFilep(encoder, inp_file, out_file, buffer_size=10000, verbose=False,
+                max_sentences=None):
     n = 0
     t = time.time()
     for sentences in buffered_read(inp_file, buffer_size):
-        encoder.encode_sentences(sentences).tofile(out_file)
+        encoder.encode_sentences(sentences, max_sentences).tofile(out_file)
         n += len(sentences)
         if verbose and n % 10000 == 0:
             print('\r - Encoder: {:d} sentences'.format(n), end='')
@@ -290,7 +322,7 @@ def EncodeFilep(encoder, inp_file, out_file, buffer_size=10000, verbose=False):
 # Encode sentences (file names)
 def EncodeFile(encoder, inp_fname, out_fname,
               buffer_size=10000, verbose=False, over_write=False,
-              inp_encoding='utf-8'):
+              inp_encoding='utf-8', max_sentences=None):
     # TODO :handle over write
     if not os.path.isfile(out_fname):
         if verbose:
@@ -299,12 +331,105 @@ def EncodeFile(encoder, inp_fname, out_fname,
                          os.path.basename(out_fname)))
         fin = open(inp_fname, 'r', encoding=inp_encoding, errors='surrogateescape') if len(inp_fname) > 0 else sys.stdin
         fout = open(out_fname, mode='wb')
-        EncodeFilep(encoder, fin, fout, buffer_size=buffer_size, verbose=verbose)
+        EncodeFilep(encoder, fin, fout, buffer_size=buffer_size, verbose=verbose,
+                    max_sentences=max_sentences)
         fin.close()
         fout.close()
     elif not over_write and verbose:
         print(' - Encoder: {} exists already'.format(os.path.basename(out_fname)))
 
+# Split the lines into contiguous ranges, one per shard
+# The ranges start at multiples of buffer_size, so that every shard reads the
+# same buffers (hence makes the same batches) as a single process would
+def ShardRanges(nlines, num_shards, buffer_size=10000):
+    nbuffers = (nlines + buffer_size - 1) // buffer_size
+    bounds = [min(nbuffers * i // num_shards * buffer_size, nlines)
+              for i in range(num_shards + 1)]
+    bounds[-1] = nlines
+    return [(start, end) for start, end in zip(bounds[:-1], bounds[1:]) if end > start]
+
+# Count the lines of a file (split like text mode: at \n, \r\n and \r) and
+# return, for every buffer_size-th line, the byte offset of the last '\n'
+# delimited line starting at or before it, with the number of this line
+# (the encoding must be ASCII compatible)
+def LineOffsets(inp_fname, buffer_size=10000):
+    nlines, offset, offsets = 0, 0, []
+    with open(inp_fname, 'rb') as fin:
+        for line in fin:
+            n = len(line.splitlines()) if b'\r' in line else 1
+            while nlines + n > len(offsets) * buffer_size:
+                offsets.append((offset, nlines))
+            nlines += n
+            offset += len(line)
+    return nlines, offsets
+
+# Encode nlines lines of a file (runs in a shard process), from the line skip
+# lines after the byte offset
+def EncodeShard(encoder_kwargs, inp_fname, out_fname, offset, skip, nlines,
+                buffer_size=10000, max_sentences=None, num_threads=1,
+                inp_encoding='utf-8'):
+    torch.set_num_threads(num_threads)
+    encoder = SentenceEncoder(**encoder_kwargs)
+    with open(inp_fname, 'rb') as fbin, open(out_fname, mode='wb') as fout:
+        fbin.seek(offset)
+        fin = io.TextIOWrapper(fbin, encoding=inp_encoding, errors='surrogateescape')
+        EncodeFilep(encoder, islice(fin, skip, skip + nlines), fout,
+                    buffer_size=buffer_size, max_sentences=max_sentences)
+
+# Encode sentences (file names) with several encoder processes
+# encoder_kwargs are the arguments of SentenceEncoder: every shard loads its
+# own encoder and uses num_threads torch threads (default: an equal share of
+# the cores). The shard outputs are concatenated in order, which gives the
+# same file as EncodeFile.
+def EncodeFileSharded(encoder_kwargs, inp_fname, out_fname, num_shards,
+                      buffer_size=10000, verbose=False, over_write=False,
+                      inp_encoding='utf-8', max_sentences=None, num_threads=None):
+    if os.path.isfile(out_fname):
+        if not over_write and verbose:
+            print(' - Encoder: {} exists already'.format(os.path.basename(out_fname)))
+        return
+    # the shards seek to their first line instead of reading the lines before it
+    nlines, offsets = LineOffsets(inp_fname, buffer_size)
+    ranges = ShardRanges(nlines, num_shards, buffer_size)
+    if num_threads is None:
+        num_threads = max(1, (os.cpu_count() or 1) // max(len(ranges), 1))
+    if verbose:
+        print(' - Encoder: {} to {} ({:d} shards, {:d} threads each)'.
+              format(os.path.basename(inp_fname), os.path.basename(out_fname),
+                     len(ranges), num_threads))
+    t = time.time()
+    shard_fnames = ['{}.shard{:d}'.format(out_fname, i) for i in range(len(ranges))]
+    # spawn: torch does not support forking a process that already uses threads
+    context = multiprocessing.get_context('spawn')
+    processes = [
+        context.Process(target=EncodeShard, args=(
+            encoder_kwargs, inp_fname, shard_fname, offsets[start // buffer_size][0],
+            start - offsets[start // buffer_size][1], end - start,
+            buffer_size, max_sentences, num_threads, inp_encoding))
+        for shard_fname, (start, end) in zip(shard_fnames, ranges)]
+    try:
+        for p in processes:
+            p.start()
+        for p in processes:
+            p.join()
+        failed = [i for i, p in enumerate(processes) if p.exitcode != 0]
+        assert not failed, 'shards {} failed'.format(failed)
+        # ordered merge
+        with open(out_fname, mode='wb') as fout:
+            for shard_fname in shard_fnames:
+                with open(shard_fname, mode='rb') as fshard:
+                    shutil.copyfileobj(fshard, fout)
+    finally:
+        for p in processes:
+            if p.is_alive():
+                p.terminate()
+        for shard_fname in shard_fnames:
+            if os.path.isfile(shard_fname):
+                os.remove(shard_fname)
+    if verbose:
+        print(' - Encoder: {:d} sentences'.format(nlines), end='')
+        EncodeTime(t)
+
 # Load existing embeddings
 def EmbedLoad(fname, dim=1024, verbose=False):
     x = np.fromfile(fname, dtype=np.float32, count=-1)
@@ -344,19 +469,25 @@ if __name__ == '__main__':
         help='Use CPU instead of GPU')
     parser.add_argument('--stable', action='store_true',
         help='Use stable merge sort instead of quick sort')
+    parser.add_argument('--shards', type=int, default=1,
+        help='Number of encoder processes (each encodes a range of lines)')
+    parser.add_argument('--shard-threads', type=int, default=None,
+        help='Number of torch threads per encoder process (default: cores / shards)')
     args = parser.parse_args()
 
     args.buffer_size = max(args.buffer_size, 1)
     assert not args.max_sentences or args.max_sentences <= args.buffer_size, \
         '--max-sentences/--batch-size cannot be larger than --buffer-size'
 
-    if args.verbose:
-        print(' - Encoder: loading {}'.format(args.encoder))
-    encoder = SentenceEncoder(args.encoder,
-                              max_sentences=args.max_sentences,
-                              max_tokens=args.max_tokens,
-                              sort_kind='mergesort' if args.stable else 'quicksort',
-                              cpu=args.cpu)
+    encoder_kwargs = dict(model_path=args.encoder,
+                          max_sentences=args.max_sentences,
+                          max_tokens=args.max_tokens,
+                          sort_kind='mergesort' if args.stable else 'quicksort',
+                          cpu=args.cpu)
+    if args.shards <= 1:
+        if args.verbose:
+            print(' - Encoder: loading {}'.format(args.encoder))
+        encoder = SentenceEncoder(**encoder_kwargs)
 
     with tempfile.TemporaryDirectory() as tmpdir:
         ifname = ''  # stdin will be used
@@ -378,8 +509,22 @@ if __name__ == '__main__':
                          verbose=args.verbose, over_write=False)
             ifname = bpe_fname
 
-        EncodeFile(encoder,
-                   ifname,
-                   args.output,
-                   verbose=args.verbose, over_write=False,
-                   buffer_size=args.buffer_size) 
+        if args.shards <= 1:
+            EncodeFile(encoder,
+                       ifname,
+                       args.output,
+                       verbose=args.verbose, over_write=False,
+                       buffer_size=args.buffer_size)
+        else:
+            if not ifname:
+                # the shards read line ranges of a file
+                ifname = os.path.join(tmpdir, 'stdin')
+                with open(ifname, mode='wb') as fout:
+                    shutil.copyfileobj(sys.stdin.buffer, fout)
+            EncodeFileSharded(encoder_kwargs,
+                              ifname,
+                              args.output,
+                              args.shards,
+                              verbose=args.verbose, over_write=False,
+                              buffer_size=args.buffer_size,
+                              num_threads=args.shard_threads)
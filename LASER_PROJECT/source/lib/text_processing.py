@@ -16,10 +16,16 @@
 
 import os
 import sys
+import time
+import queue
+import random
+import string
+import atexit
 import tempfile
+import threading
 import fastBPE
 import numpy as np
-from subprocess import run, check_output, DEVNULL
+from subprocess import run, DEVNULL, Popen, PIPE
 
 # get environment
 assert os.environ.get('LASER'), 'Please set the enviornment variable LASER'
@@ -39,6 +45,14 @@ ROMAN_LC = 'python3 ' + LASER + '/source/lib/romanize_lc.py -l '
 # Mecab tokenizer for Japanese
 MECAB = LASER + '/tools-external/mecab'
 
+# Runs a perl script with autoflush on, so that the persistent tokenizer
+# workers get every line back as soon as it is processed
+PERL_UNBUFFERED = "perl -e '$|=1; $0=shift; do $0; die $@ if $@' "
+
+# Persistent tokenizer workers
+TOKENIZER_WORKERS = int(os.environ.get('LASER_TOKENIZER_WORKERS', 2))
+TOKENIZER_TIMEOUT = float(os.environ.get('LASER_TOKENIZER_TIMEOUT', 60))
+
 
 ###############################################################################
 #
@@ -48,19 +62,202 @@ MECAB = LASER + '/tools-external/mecab'
 
 def TokenLine(line, lang='en', lower_case=True, romanize=False):
     assert lower_case, 'lower case is needed by all the models'
+    return TOKENIZER_POOL.tokenize([line], lang=lang, romanize=romanize,
+                                   descape=True)[0]
+
+
+###############################################################################
+#
+# Persistent tokenizer workers
+#
+# Every worker is one long-lived pipeline of processes (remove-non-printing-char,
+# normalize-punctuation, Moses, jieba/mecab, romanize_lc.py) in which each
+# stage flushes every line. A request writes its lines followed by an
+# end-of-batch marker and reads lines back until the marker comes out.
+#
+###############################################################################
+
+class TokenizerError(RuntimeError):
+    pass
+
+
+def TokenizerCommands(lang, romanize=False, descape=False):
     roman = lang if romanize else 'none'
-    tok = check_output(
-        REM_NON_PRINT_CHAR
-        + '|' + NORM_PUNC + lang
-        + '|' + DESCAPE
-        + '|' + MOSES_TOKENIZER + lang
-        + ('| python3 -m jieba -d ' if lang == 'zh' else '')
-        + ('|' + MECAB + '/bin/mecab -O wakati -b 50000 ' if lang == 'ja' else '')
-        + '|' + ROMAN_LC + roman,
-        input=line,
-        encoding='UTF-8',
-        shell=True)
-    return tok.strip()
+    # no -threads: the multi-threaded Moses tokenizer waits for whole batches
+    return ([PERL_UNBUFFERED + REM_NON_PRINT_CHAR,
+             PERL_UNBUFFERED + NORM_PUNC + lang]
+            + ([PERL_UNBUFFERED + DESCAPE] if descape else [])
+            + [PERL_UNBUFFERED + MOSES_BDIR + 'tokenizer.perl -q -no-escape -b -l ' + lang]
+            + (['python3 -u -m jieba -d '] if lang == 'zh' else [])
+            + (['stdbuf -oL ' + MECAB + '/bin/mecab -O wakati -b 50000 '] if lang == 'ja' else [])
+            + ['python3 -u ' + LASER + '/source/lib/romanize_lc.py -l ' + roman])
+
+
+class TokenizerWorker:
+    def __init__(self, commands):
+        # lower case letters only, so that no tokenizer splits or changes it
+        self.end_marker = ''.join(random.choice(string.ascii_lowercase) for _ in range(24))
+        # one process per stage (no shell in between): when a stage dies,
+        # the next ones see the end of their input and the reader notices
+        self.processes = []
+        env = dict(os.environ, LD_LIBRARY_PATH=MECAB + '/lib')
+        try:
+            for command in commands:
+                previous = self.processes[-1] if self.processes else None
+                self.processes.append(Popen(
+                    'exec ' + command, shell=True, stdout=PIPE, encoding='UTF-8', env=env,
+                    stdin=previous.stdout if previous else PIPE))
+                if previous:
+                    previous.stdout.close()
+        except Exception:
+            self.close()
+            raise
+        self.stdin = self.processes[0].stdin
+        self.stdout = self.processes[-1].stdout
+        self._lines = queue.Queue()
+        # set by the reader: the last stage may not be reaped yet
+        self._ended = False
+        self._reader = threading.Thread(target=self._read, daemon=True)
+        self._reader.start()
+
+    def _read(self):
+        for line in self.stdout:
+            self._lines.put(line)
+        self._ended = True
+        self._lines.put(None)
+
+    def _write(self, text):
+        try:
+            self.stdin.write(text)
+            self.stdin.flush()
+        except (BrokenPipeError, ValueError):
+            # the reader sees the end of the output
+            pass
+
+    def alive(self):
+        return not self._ended and all(p.poll() is None for p in self.processes)
+
+    def tokenize(self, lines, timeout=TOKENIZER_TIMEOUT):
+        text = ''.join(' '.join(line.split('\n')) + '\n' for line in lines)
+        # written from another thread: a large batch would fill the pipes
+        # before the first tokenized lines are read back
+        writer = threading.Thread(
+            target=self._write, args=(text + self.end_marker + '\n',), daemon=True)
+        writer.start()
+        deadline = time.time() + timeout
+        tokenized = []
+        while True:
+            try:
+                line = self._lines.get(timeout=max(deadline - time.time(), 0))
+            except queue.Empty:
+                raise TokenizerError('tokenizer timed out after {:g}s'.format(timeout))
+            if line is None:
+                raise TokenizerError('tokenizer exited with codes {}'
+                                     .format([p.poll() for p in self.processes]))
+            line = line.strip()
+            if line == self.end_marker:
+                break
+            tokenized.append(line)
+        writer.join()
+        if len(tokenized) != len(lines):
+            raise TokenizerError('the tokenizer changed the number of lines')
+        return tokenized
+
+    def close(self):
+        for p in self.processes:
+            if p.poll() is None:
+                p.kill()
+            p.wait()
+            for f in (p.stdin, p.stdout):
+                if f is None:
+                    continue
+                try:
+                    f.close()
+                except (BrokenPipeError, ValueError):
+                    pass
+
+
+class TokenizerPool:
+    """Up to `size` persistent workers per (language, romanize, descape).
+
+    A worker that crashes, times out or gets out of sync is killed and
+    replaced by a fresh one; a crashed request is retried once.
+    """
+
+    def __init__(self, size=TOKENIZER_WORKERS, timeout=TOKENIZER_TIMEOUT,
+                 commands=TokenizerCommands):
+        self.size = size
+        self.timeout = timeout
+        self.commands = commands
+        self._idle = {}
+        self._slots = {}
+        self._lock = threading.Lock()
+        self.started = 0
+        self.failures = 0
+
+    def _acquire(self, key):
+        with self._lock:
+            slots = self._slots.setdefault(key, threading.BoundedSemaphore(self.size))
+        slots.acquire()
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            while idle:
+                worker = idle.pop()
+                if worker.alive():
+                    return worker
+                worker.close()
+            self.started += 1
+        try:
+            return TokenizerWorker(self.commands(*key))
+        except Exception:
+            slots.release()
+            raise
+
+    def _release(self, key, worker, failed):
+        if failed:
+            worker.close()
+        with self._lock:
+            if failed:
+                self.failures += 1
+            else:
+                self._idle.setdefault(key, []).append(worker)
+        self._slots[key].release()
+
+    def tokenize(self, lines, lang='en', romanize=False, descape=False, retries=1):
+        # handle some iso3 langauge codes
+        if lang in ('cmn', 'wuu', 'yue'):
+            lang = 'zh'
+        if lang == 'jpn':
+            lang = 'ja'
+        if not lines:
+            return []
+        key = (lang, romanize, descape)
+        worker = self._acquire(key)
+        try:
+            tokenized = worker.tokenize(lines, self.timeout)
+        except TokenizerError:
+            # timeouts and out of sync output are not retried
+            crashed = not worker.alive()
+            self._release(key, worker, failed=True)
+            if crashed and retries > 0:
+                return self.tokenize(lines, lang, romanize, descape, retries - 1)
+            raise
+        except BaseException:
+            self._release(key, worker, failed=True)
+            raise
+        self._release(key, worker, failed=False)
+        return tokenized
+
+    def close(self):
+        with self._lock:
+            workers = [w for idle in self._idle.values() for w in idle]
+            self._idle = {}
+        for worker in workers:
+            worker.close()
+
+
+TOKENIZER_POOL = TokenizerPool()
+atexit.register(TOKENIZER_POOL.close)
 
 
 ###############################################################################
@@ -113,6 +310,9 @@ def Token(inp_fname, out_fname, lang='en',
 
 def BPEfastLoad(line, bpe_codes):
     bpe_vocab = bpe_codes.replace('fcodes', 'fvocab')
+    if not os.path.isfile(bpe_vocab):
+        # same fallback as BPEfastApply
+        bpe_vocab = ''
     return fastBPE.fastBPE(bpe_codes, bpe_vocab)
 
 def BPEfastApplyLine(line, bpe):
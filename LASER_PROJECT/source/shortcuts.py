@@ -1,4 +1,8 @@
 import tempfile
+import threading
+import time
+from collections import namedtuple
+from functools import lru_cache
 from pathlib import Path
 from typing import List
 
@@ -6,7 +10,72 @@ import numpy as np
 
 from .lib.indexing import IndexCreate
 from .embed import SentenceEncoder, EncodeFile
-from .lib.text_processing import Token, BPEfastApply
+from .lib.text_processing import Token, TOKENIZER_POOL, BPEfastApply, BPEfastLoad
+
+# cold: encoders loaded from disk, warm: calls served by an already loaded encoder
+EncoderCacheStats = namedtuple("EncoderCacheStats", ["cold", "warm", "load_seconds"])
+
+_ENCODERS = {}
+_ENCODERS_LOCK = threading.Lock()
+_ENCODER_COUNTERS = {"cold": 0, "warm": 0, "load_seconds": 0.}
+
+
+def get_encoder(model_path: str, cpu: bool = False, fp16: bool = False,
+                max_tokens: int = 10000) -> SentenceEncoder:
+    """Returns the process-wide encoder for these settings, loading it on first use.
+
+    The batch size is not part of the key: pass it to encode_sentences instead.
+    """
+    key = (model_path, cpu, fp16, max_tokens)
+    with _ENCODERS_LOCK:
+        encoder = _ENCODERS.get(key)
+        if encoder is not None:
+            _ENCODER_COUNTERS["warm"] += 1
+            return encoder
+        start = time.time()
+        encoder = _ENCODERS[key] = SentenceEncoder(
+            model_path, max_tokens=max_tokens, cpu=cpu, fp16=fp16)
+        _ENCODER_COUNTERS["cold"] += 1
+        _ENCODER_COUNTERS["load_seconds"] += time.time() - start
+        return encoder
+
+
+def encoder_cache_stats() -> EncoderCacheStats:
+    with _ENCODERS_LOCK:
+        return EncoderCacheStats(**_ENCODER_COUNTERS)
+
+
+@lru_cache(maxsize=None)
+def _load_bpe(bpe_code_path: str):
+    return BPEfastLoad(None, bpe_code_path)
+
+
+class LaserPipeline:
+    """Tokenization, BPE and encoding fully in memory (no temp files).
+
+    Meant for request-sized inputs; use text_file_pipeline for corpus-scale jobs.
+    """
+
+    def __init__(self, model_path: str, bpe_code_path: str, use_cpu: bool = False,
+                 batch_size: int = 32, max_tokens: int = 10000):
+        # The encoder and the BPE codes are loaded once per process
+        self.encoder = get_encoder(model_path, cpu=use_cpu, max_tokens=max_tokens)
+        self.batch_size = batch_size
+        self.bpe = _load_bpe(bpe_code_path)
+
+    def tokenize(self, lang: str, lines: List[str]) -> List[str]:
+        # persistent tokenizer workers: the Moses pipeline starts once per worker
+        return TOKENIZER_POOL.tokenize(lines, lang=lang, romanize=False)
+
+    def apply_bpe(self, lines: List[str]) -> List[str]:
+        return self.bpe.apply(lines)
+
+    def encode(self, lang: str, lines: List[str]) -> np.ndarray:
+        """Returns the (len(lines), dim) float32 embeddings of the lines."""
+        if not lines:
+            return np.zeros((0, self.encoder.encoder.output_units), dtype=np.float32)
+        return self.encoder.encode_sentences(
+            self.apply_bpe(self.tokenize(lang, lines)), max_sentences=self.batch_size)
 
 
 def lines_to_index(lang: str, lines: List, model_path: str, bpe_code_path: str, use_cpu: bool = False, batch_size: int = 32):
@@ -21,23 +90,14 @@ def lines_to_index(lang: str, lines: List, model_path: str, bpe_code_path: str,
 
 
 def lines_to_embeddings(lang: str, lines: List, model_path: str, bpe_code_path: str, use_cpu: bool = False, batch_size: int = 32):
-    """Suitable for small amounts of data."""
-    with tempfile.TemporaryDirectory() as tmpdirname:
-        target = str(Path(tmpdirname) / "source")
-        with open(target, "w") as fout:
-            fout.write("\n".join(lines))
-        return text_file_pipeline(
-            lang, target, model_path, bpe_code_path, use_cpu, returns="embeddings", batch_size=batch_size
-        )
+    """Suitable for small amounts of data. Runs in memory (see LaserPipeline)."""
+    pipeline = LaserPipeline(model_path, bpe_code_path, use_cpu=use_cpu, batch_size=batch_size)
+    return pipeline.encode(lang, lines)
 
 
 def text_file_pipeline(lang: str, input_path: str, model_path: str, bpe_code_path: str, use_cpu: bool, batch_size: int,  returns="index"):
     """Suitable for small amounts of data."""
-    encoder = SentenceEncoder(
-        model_path,
-        max_sentences=batch_size,
-        max_tokens=10000,
-        cpu=use_cpu)
+    encoder = get_encoder(model_path, cpu=use_cpu, max_tokens=10000)
     with tempfile.TemporaryDirectory() as tmpdirname:
         tmpdir = Path(tmpdirname)
         Token(
@@ -56,7 +116,7 @@ def text_file_pipeline(lang: str, input_path: str, model_path: str, bpe_code_pat
             encoder,
             str(tmpdir / "bpe"),
             str(tmpdir / "enc"),
-            verbose=True, over_write=True)
+            verbose=True, over_write=True, max_sentences=batch_size)
         if returns == "embeddings":
             return np.fromfile(str(tmpdir / "enc"), dtype=np.float32, count=-1)
         data, index = IndexCreate(
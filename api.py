@@ -2,6 +2,7 @@ from fastapi import FastAPI
 from pydantic import BaseModel
 from typing import List
 import functools
+import os
 
 import uvicorn
 from starlette.middleware.cors import CORSMiddleware
@@ -9,6 +10,15 @@ from starlette.middleware.cors import CORSMiddleware
 from summa_score_sentences import summarize as summarize_textrank
 from summa_score_sentences_xling import summarize_xling
 from summa_score_sentences_laser import summarize as summarize_laser
+from result_cache import ResultCache, make_key
+
+SUMMARIZERS = {
+    "textrank": summarize_textrank,
+    "use-xling": summarize_xling,
+    "laser": summarize_laser
+}
+# Set RESULT_CACHE_DIR to keep the cached results across restarts
+CACHE = ResultCache(directory=os.environ.get("RESULT_CACHE_DIR"))
 
 
 class HighlightRequest(BaseModel):
@@ -60,17 +70,17 @@ def sentence_sort_function(sent_1, sent_2) -> bool:
 
 @app.post("/highlight/", response_model=HighlightResults)
 def read_item(highlight_request: HighlightRequest):
-    if highlight_request.model == "textrank":
-        sentences, _, _ = summarize_textrank(highlight_request.text)
-    elif highlight_request.model == "use-xling":
-        sentences, _, _ = summarize_xling(highlight_request.text)
-    elif highlight_request.model == "laser":
-        sentences, _, _ = summarize_laser(highlight_request.text)
-    else:
+    if highlight_request.model not in SUMMARIZERS:
         return HighlightResults(
             success=False,
             message=f"'{highlight_request.model}' is not supported."
         )
+    key = make_key(highlight_request.text, highlight_request.model)
+    sentences = CACHE.get(key)
+    if sentences is None:
+        sentences, _, _ = SUMMARIZERS[highlight_request.model](
+            highlight_request.text)
+        CACHE.put(key, sentences)
     # Sort sentences
     sentences = sorted(
         sentences, key=functools.cmp_to_key(sentence_sort_function))
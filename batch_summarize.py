@@ -0,0 +1,147 @@
+"""Summarizes many documents in one call.
+
+Compared to calling the summarize functions in a loop:
+  * the English paragraphs of all the documents go through spaCy in one
+    NLP.pipe stream, and the text cleaner is initialized once;
+  * for USE and LASER, the sentences of all the documents are encoded in large
+    shared batches (grouped by language for LASER);
+  * the graph construction and ranking of the documents can be fanned out to
+    a process pool.
+"""
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from typing import List, Optional, Sequence
+
+import numpy as np
+
+from document_analysis import SUPPORTED_LANGUAGES, analyze_many
+from embedding_graph import score_embedded_sentences
+from summa_score_sentences import score_sentences as score_lexical_sentences
+
+BATCH_SIZE = 256
+
+
+def _rank_document(job):
+    sentences, embeddings, knn = job
+    if embeddings is None:
+        graph = score_lexical_sentences(sentences)
+    else:
+        graph = score_embedded_sentences(sentences, embeddings, knn=knn)
+    return sentences, graph
+
+
+def _encode_use(model_name, documents, batch_size):
+    if not any(documents):
+        # Nothing to encode: the model does not need to be loaded
+        return [None] * len(documents)
+    from summa_score_sentences_use import REGISTRY, encode_sentences
+    loaded = REGISTRY.get(model_name)
+    with loaded.session() as session:
+        return _encode_shared(
+            lambda sentences: encode_sentences(
+                session, sentences, loaded.model, batch_size=batch_size),
+            documents)
+
+
+def _encode_laser(analyses, documents, batch_size):
+    from summa_score_sentences_laser import encode_sentences
+    embeddings = [None] * len(documents)
+    for lang in set(analysis.lang for analysis in analyses):
+        positions = [i for i, (analysis, sentences) in enumerate(zip(analyses, documents))
+                     if analysis.lang == lang and sentences]
+        encoded = _encode_shared(
+            lambda sentences: encode_sentences(lang, sentences, batch_size=batch_size),
+            [documents[i] for i in positions])
+        for i, matrix in zip(positions, encoded):
+            embeddings[i] = matrix
+    return embeddings
+
+
+def _encode_shared(encode, documents):
+    """Encodes the sentences of all the documents at once, then splits the embeddings."""
+    flat = [sentence for sentences in documents if sentences for sentence in sentences]
+    if not flat:
+        return [None] * len(documents)
+    embeddings = encode(flat)
+    offsets = np.cumsum([0] + [len(sentences or ()) for sentences in documents])
+    return [embeddings[start:end] if sentences else None
+            for sentences, start, end in zip(documents, offsets[:-1], offsets[1:])]
+
+
+def _sentence_units(get_sentence_units, analysis):
+    """The sentence units of a document, None if the model does not support its language.
+
+    The single-document summarizers raise for some of these languages (ja with
+    LASER, zh and ja with the non-xling USE models); here one such document
+    must not abort the whole batch.
+    """
+    try:
+        return get_sentence_units(analysis)
+    except (ValueError, NotImplementedError):
+        return None
+
+
+def summarize_many(texts: Sequence[str], model: str = "textrank",
+                   additional_stopwords: Optional[List[str]] = None,
+                   knn: Optional[int] = None, batch_size: int = BATCH_SIZE,
+                   workers: Optional[int] = None) -> List[tuple]:
+    """Summarizes every text with the given model.
+
+    `model` is "textrank", "laser" or "use-<name>" (e.g. "use-large" or
+    "use-xling"), like the `metricInput` values of the demo. `knn` is passed
+    on to the embedding-based models. With `workers` > 1, the graph
+    construction and ranking run in that many processes.
+
+    Returns the same per-document results as the individual summarize
+    functions, in the order of `texts`.
+    """
+    analyses = analyze_many(texts, additional_stopwords)
+    if model == "textrank":
+        documents = [analysis.sentence_units() if analysis.lang in SUPPORTED_LANGUAGES
+                     else None for analysis in analyses]
+        embeddings = [None] * len(documents)
+        message = "Language not suppored! (supported languages: en, zh, ja)"
+    elif model.startswith("use-"):
+        from summa_score_sentences_use import get_sentence_units
+        documents = [_sentence_units(partial(get_sentence_units, model_name=model[4:]), analysis)
+                     for analysis in analyses]
+        embeddings = _encode_use(model[4:], documents, batch_size)
+        message = "Language not suppored! (supported languages: en, zh, ja)"
+    elif model == "laser":
+        from summa_score_sentences_laser import get_sentence_units
+        documents = [_sentence_units(get_sentence_units, analysis) for analysis in analyses]
+        embeddings = _encode_laser(analyses, documents, batch_size)
+        message = "Language not suppored! (supported languages: en, zh)"
+    else:
+        raise ValueError(f"'{model}' is not supported.")
+
+    jobs, job_positions = [], []
+    for i, (sentences, matrix) in enumerate(zip(documents, embeddings)):
+        if sentences is None:
+            continue
+        if model != "textrank":
+            for j, sent in enumerate(sentences):
+                # Hacky way to overwrite token
+                sent.token = j
+            if matrix is None:
+                matrix = np.zeros((0, 0), dtype=np.float32)
+        jobs.append((sentences, matrix, knn))
+        job_positions.append(i)
+    if workers and workers > 1:
+        with ProcessPoolExecutor(workers) as executor:
+            ranked = list(executor.map(
+                _rank_document, jobs, chunksize=max(1, len(jobs) // (workers * 4))))
+    else:
+        ranked = [_rank_document(job) for job in jobs]
+
+    results: List[tuple] = [
+        ([message], None, analysis.lang) for analysis in analyses]
+    for i, (sentences, graph) in zip(job_positions, ranked):
+        if graph is None:
+            # PageRank cannot be run in an empty graph.
+            results[i] = []
+            continue
+        # Sorts the sentences
+        sentences.sort(key=lambda s: s.score, reverse=True)
+        results[i] = (sentences, graph, analyses[i].lang)
+    return results
@@ -0,0 +1,30 @@
+"""Compares the sentence rankings at reduced precision with the float32 ones.
+
+Usage: python benchmark_precision.py embeddings.npy ...
+
+Reports, for every precision, the rank correlation and the top-10 overlap
+with float32, the size of the embeddings and the peak memory of the scoring
+(see precision.accuracy_report).
+"""
+import argparse
+
+import numpy as np
+
+from precision import accuracy_report
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("paths", nargs="+")
+    parser.add_argument("--knn", type=int, default=None)
+    args = parser.parse_args()
+
+    for path in args.paths:
+        print(path)
+        for report in accuracy_report(np.load(path), knn=args.knn):
+            print("  %-8s spearman %.4f, top-10 overlap %.2f, embeddings %d bytes, "
+                  "scoring peak %d bytes" % report)
+
+
+if __name__ == "__main__":
+    main()
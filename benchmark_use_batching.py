@@ -0,0 +1,101 @@
+"""Compares fixed-size and length-bucketed batching for the USE encoders.
+
+Usage: python benchmark_use_batching.py [--model large] [--padding-only] article.txt ...
+
+Reports the number of padded characters fed to the encoder and, unless
+--padding-only is given, the encoding throughput (sentences per second).
+"served" is the serving path: the micro-batches of up to USE_BATCH_MAX_SIZE
+sentences formed by the MicroBatcher (in arrival order), each bucketed by
+length in LoadedModel._run_batch; "unbucketed" sends every micro-batch whole.
+"""
+import argparse
+import time
+
+import numpy as np
+
+from document_analysis import DocumentAnalysis
+from length_batching import MAX_TOKENS, length_batches, padded_size
+
+# Default of USE_BATCH_MAX_SIZE
+MICRO_BATCH_SIZE = 64
+
+FIXED_BATCH_SIZE = 32
+
+
+def load_sentences(paths):
+    texts = []
+    for path in paths:
+        with open(path, encoding="utf-8") as fin:
+            analysis = DocumentAnalysis(fin.read())
+        texts += [x.text for x in analysis.sentence_units() if len(x.text) > 5]
+    return texts
+
+
+def fixed_batches(n_texts, batch_size=FIXED_BATCH_SIZE):
+    return [np.arange(i, min(i + batch_size, n_texts))
+            for i in range(0, n_texts, batch_size)]
+
+
+def served_batches(lengths, max_chars, micro_batch_size=MICRO_BATCH_SIZE):
+    """The batches that LoadedModel._run_batch sends for every micro-batch."""
+    batches = []
+    for micro_batch in fixed_batches(len(lengths), micro_batch_size):
+        batches += [micro_batch[batch] for batch in length_batches(
+            [lengths[i] for i in micro_batch.tolist()], max_chars, micro_batch_size)]
+    return batches
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("paths", nargs="+")
+    parser.add_argument("--model", default="large")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--max-chars", type=int, default=MAX_TOKENS,
+                        help="padded size budget of a bucketed batch (USE_MAX_BATCH_CHARS)")
+    parser.add_argument("--padding-only", action="store_true")
+    args = parser.parse_args()
+
+    texts = load_sentences(args.paths)
+    lengths = [len(text) for text in texts]
+    print("Sentences: %d (mean %d chars, max %d chars)" % (
+        len(texts), np.mean(lengths), max(lengths)))
+
+    strategies = {
+        "fixed": fixed_batches(len(texts)),
+        "bucketed": length_batches(lengths, args.max_chars, FIXED_BATCH_SIZE),
+        "unbucketed": fixed_batches(len(texts), MICRO_BATCH_SIZE),
+        "served": served_batches(lengths, args.max_chars)
+    }
+    for name, batches in strategies.items():
+        print("%-10s %4d batches, %8d padded chars (%.2fx the text)" % (
+            name, len(batches), padded_size(lengths, batches),
+            padded_size(lengths, batches) / sum(lengths)))
+    if args.padding_only:
+        return
+
+    from summa_score_sentences_use import REGISTRY
+    loaded = REGISTRY.get(args.model)
+    with loaded.session() as session:
+        for name, batches in strategies.items():
+            timings = []
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                for batch in batches:
+                    session.run(loaded.model["sentence_emb"], feed_dict={
+                        loaded.model["sentence_input"]: [texts[i] for i in batch.tolist()]})
+                timings.append(time.perf_counter() - start)
+            print("%-10s %.1f sentences/s (best of %d)" % (
+                name, len(texts) / min(timings), args.repeat))
+    # The serving path itself, one micro-batch at a time
+    timings = []
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        for micro_batch in strategies["unbucketed"]:
+            loaded._run_batch([texts[i] for i in micro_batch.tolist()])
+        timings.append(time.perf_counter() - start)
+    print("%-10s %.1f sentences/s (best of %d, through LoadedModel._run_batch)" % (
+        "served", len(texts) / min(timings), args.repeat))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,215 @@
+"""Array-backed undirected graph used in place of summa.graph.Graph in the hot path.
+
+Nodes are integer ids into a label table (the sentence tokens or lemmas), and
+edges live in a symmetric CSR adjacency matrix with int32 indices and float32
+weights (8 bytes per stored direction, instead of several dict entries per
+edge in summa.graph.Graph). Self-loops are stored on the diagonal.
+
+`DenseGraph` keeps a complete similarity graph as the (possibly float16)
+similarity matrix itself, where a CSR copy would take 8 bytes per edge.
+"""
+from typing import Hashable, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from scipy import sparse
+
+BLOCK_SIZE = 1024
+# Rows of a dense adjacency matrix read at once by DenseGraph
+DENSE_BLOCK_ROWS = 32
+
+
+class CompactGraph:
+    def __init__(self, labels: Sequence[Hashable], adjacency: sparse.spmatrix):
+        if adjacency.shape != (len(labels), len(labels)):
+            raise ValueError("The adjacency matrix does not match the number of labels.")
+        self.labels: List[Hashable] = list(labels)
+        self.adjacency: sparse.csr_matrix = sparse.csr_matrix(adjacency, dtype=np.float32)
+        self.adjacency.eliminate_zeros()
+        self.adjacency.sort_indices()
+        # Filled in by the pipelines that rank the graph
+        self.ranking_stats = None
+
+    @classmethod
+    def from_edges(cls, labels: Sequence[Hashable], rows: Iterable[int],
+                   cols: Iterable[int], weights: Optional[Iterable[float]] = None
+                   ) -> "CompactGraph":
+        """Builds the graph from one direction of each (deduplicated) edge."""
+        rows = np.asarray(rows, dtype=np.int32)
+        cols = np.asarray(cols, dtype=np.int32)
+        if weights is None:
+            weights = np.ones(len(rows), dtype=np.float32)
+        weights = np.asarray(weights, dtype=np.float32)
+        directed = sparse.coo_matrix(
+            (weights, (rows, cols)), shape=(len(labels), len(labels))).tocsr()
+        off_diagonal = sparse.triu(directed, k=1) + sparse.tril(directed, k=-1)
+        return cls(labels, directed + off_diagonal.T)
+
+    @classmethod
+    def from_similarity_matrix(cls, labels: Sequence[Hashable], similarities) -> "CompactGraph":
+        """Builds the graph from a (dense or sparse) symmetric similarity matrix.
+
+        The diagonal is ignored and zero similarities do not create edges.
+        Like summa.summarizer._set_graph_edge_weights, a graph whose similarities
+        are all zero becomes a complete graph with unit weights.
+        """
+        if sparse.issparse(similarities):
+            matrix = sparse.csr_matrix(similarities, dtype=np.float32, copy=True)
+        else:
+            similarities = np.asarray(similarities)
+            # Sparsifies block by block, so that no dense float32 copy of a
+            # reduced-precision (float16) matrix is made
+            blocks = [
+                sparse.csr_matrix(similarities[start:start + BLOCK_SIZE].astype(
+                    np.float32, copy=False))
+                for start in range(0, len(similarities), BLOCK_SIZE)]
+            matrix = sparse.vstack(blocks, format="csr") if blocks else \
+                sparse.csr_matrix(similarities.shape, dtype=np.float32)
+        matrix.setdiag(0)
+        matrix.eliminate_zeros()
+        if matrix.nnz == 0 and len(labels) > 1:
+            # Handles the case in which all similarities are zero.
+            # The resultant summary will consist of random sentences.
+            matrix = sparse.csr_matrix(
+                np.ones((len(labels), len(labels)), dtype=np.float32) -
+                np.eye(len(labels), dtype=np.float32))
+        return cls(labels, matrix)
+
+    def __len__(self) -> int:
+        return len(self.labels)
+
+    def nodes(self) -> List[Hashable]:
+        return list(self.labels)
+
+    @property
+    def n_edges(self) -> int:
+        """Number of undirected edges (self-loops included)."""
+        return (self.adjacency.nnz + self.adjacency.diagonal().astype(bool).sum()) // 2
+
+    def degrees(self) -> np.ndarray:
+        """Sum of the edge weights of every node."""
+        return np.asarray(self.adjacency.sum(axis=1)).ravel()
+
+    def edge_arrays(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Returns (rows, cols, weights) of every edge once, with rows <= cols."""
+        upper = sparse.triu(self.adjacency, k=0).tocoo()
+        return upper.row, upper.col, upper.data
+
+    def induced_edges(self, node_ids: Optional[Sequence[int]] = None
+                      ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Returns (rows, cols, weights) of the edges between the given node ids.
+
+        Reads the CSR adjacency lists once (no pairwise lookups). Self-loops are
+        left out and every edge appears once, with rows < cols, sorted by (row, col).
+        """
+        indptr, cols = self.adjacency.indptr, self.adjacency.indices
+        rows = np.repeat(np.arange(len(self.labels), dtype=np.int32), np.diff(indptr))
+        keep = rows < cols
+        if node_ids is not None:
+            included = np.zeros(len(self.labels), dtype=bool)
+            included[np.asarray(node_ids, dtype=np.int64)] = True
+            keep &= included[rows] & included[cols]
+        # The indices are sorted, so the edges already come in (row, col) order
+        return rows[keep], cols[keep], self.adjacency.data[keep]
+
+    def subgraph(self, node_ids: Sequence[int]) -> "CompactGraph":
+        """Returns the subgraph induced by the given node ids (in the given order)."""
+        node_ids = np.asarray(node_ids, dtype=np.int64)
+        return CompactGraph(
+            [self.labels[i] for i in node_ids.tolist()],
+            self.adjacency[node_ids][:, node_ids])
+
+    def remove_unreachable_nodes(self) -> None:
+        """Removes (in place) all nodes whose edge weights sum to zero."""
+        keep = np.flatnonzero(self.degrees() != 0)
+        if len(keep) == len(self.labels):
+            return
+        reduced = self.subgraph(keep)
+        self.labels, self.adjacency = reduced.labels, reduced.adjacency
+
+
+class DenseGraph:
+    """Undirected graph stored as a dense, symmetric adjacency matrix without self-loops.
+
+    The matrix keeps its dtype (float16 for reduced-precision similarities);
+    it is read a few rows at a time, in float32.
+    """
+
+    def __init__(self, labels: Sequence[Hashable], adjacency: np.ndarray):
+        if adjacency.shape != (len(labels), len(labels)):
+            raise ValueError("The adjacency matrix does not match the number of labels.")
+        self.labels: List[Hashable] = list(labels)
+        self.adjacency: np.ndarray = adjacency
+        # Filled in by the pipelines that rank the graph
+        self.ranking_stats = None
+
+    @classmethod
+    def from_similarity_matrix(cls, labels: Sequence[Hashable], similarities: np.ndarray
+                               ) -> "DenseGraph":
+        """Same graph as CompactGraph.from_similarity_matrix, without copying the matrix.
+
+        The matrix is used in place: its diagonal is set to zero.
+        """
+        similarities = np.asarray(similarities)
+        if not np.issubdtype(similarities.dtype, np.floating):
+            similarities = similarities.astype(np.float32)
+        np.fill_diagonal(similarities, 0)
+        # Checked a block at a time: any() would make an N x N boolean copy
+        if len(labels) > 1 and not any(
+                similarities[start:start + DENSE_BLOCK_ROWS].any()
+                for start in range(0, len(similarities), DENSE_BLOCK_ROWS)):
+            # Handles the case in which all similarities are zero.
+            similarities.fill(1)
+            np.fill_diagonal(similarities, 0)
+        return cls(labels, similarities)
+
+    def __len__(self) -> int:
+        return len(self.labels)
+
+    def nodes(self) -> List[Hashable]:
+        return list(self.labels)
+
+    def row_blocks(self, block_rows: int = DENSE_BLOCK_ROWS):
+        """Yields (start, float32 rows start:start + block_rows)."""
+        for start in range(0, len(self.labels), block_rows):
+            yield start, self.adjacency[start:start + block_rows].astype(np.float32)
+
+    @property
+    def n_edges(self) -> int:
+        return sum(int(np.count_nonzero(block)) for _, block in self.row_blocks()) // 2
+
+    def degrees(self) -> np.ndarray:
+        """Sum of the edge weights of every node."""
+        degrees = np.zeros(len(self.labels))
+        for start, block in self.row_blocks():
+            degrees[start:start + len(block)] = block.sum(axis=1, dtype=np.float64)
+        return degrees
+
+    def edge_arrays(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Returns (rows, cols, weights) of every edge once, with rows < cols."""
+        rows, cols, weights = [], [], []
+        for start, block in self.row_blocks():
+            block_rows, block_cols = np.nonzero(block)
+            block_rows += start
+            keep = block_rows < block_cols
+            rows.append(block_rows[keep].astype(np.int32))
+            cols.append(block_cols[keep].astype(np.int32))
+            weights.append(block[block_rows[keep] - start, block_cols[keep]])
+        if not rows:
+            return (np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.int32),
+                    np.zeros(0, dtype=np.float32))
+        return np.concatenate(rows), np.concatenate(cols), np.concatenate(weights)
+
+    def subgraph(self, node_ids: Sequence[int]) -> "DenseGraph":
+        """Returns the subgraph induced by the given node ids (in the given order)."""
+        node_ids = np.asarray(node_ids, dtype=np.int64)
+        return DenseGraph(
+            [self.labels[i] for i in node_ids.tolist()],
+            self.adjacency[np.ix_(node_ids, node_ids)])
+
+    def remove_unreachable_nodes(self) -> None:
+        """Removes (in place) all nodes whose edge weights sum to zero."""
+        keep = np.flatnonzero(self.degrees() != 0)
+        if len(keep) == len(self.labels):
+            return
+        reduced = self.subgraph(keep)
+        self.labels, self.adjacency = reduced.labels, reduced.adjacency
@@ -1,19 +1,28 @@
+import logging
 import math
-from typing import List, Dict
+import os
+from typing import List
 
+import numpy as np
 from starlette.applications import Starlette
 from starlette.responses import HTMLResponse
 from starlette.staticfiles import StaticFiles
 from starlette.templating import Jinja2Templates
 # from summa.keywords import keywords as _keywords
 import uvicorn
-import summa.graph
 
+from compact_graph import CompactGraph
+from document_analysis import DocumentAnalysis
+from embedding_cache import EMBEDDING_CACHE
+from ranking import top_k_indices
+from result_cache import ResultCache, make_key
 from summa_score_sentences import summarize as summarize_textrank
 from summa_score_words import keywords as _keywords
+from vocabulary import KeywordScores
 
 try:
     from summa_score_sentences_laser import summarize as summarize_laser
+    from laser.shortcuts import encoder_cache_stats
     LASER_ENABLED = True
 except Exception as e:
     print("Failed to import LASER:")
@@ -29,9 +38,13 @@ except Exception as e:
     USE_ENABLED = False
 
 
+logger = logging.getLogger(__name__)
+
 app = Starlette(debug=True)
 app.mount('/static', StaticFiles(directory='static'), name='static')
 templates = Jinja2Templates(directory='templates')
+# Set RESULT_CACHE_DIR to keep the cached results across restarts
+CACHE = ResultCache(directory=os.environ.get("RESULT_CACHE_DIR"))
 
 
 def add_alpha(sentences, n=3):
@@ -70,91 +83,91 @@ def find_node_in_texts(node_text, sentences, lang):
     return ["", -1, -1, -1]
 
 
-def reconstruct_graph(graph: summa.graph.Graph, sentences: List, lang: str):
+def reconstruct_graph(graph: CompactGraph, sentences: List, lang: str):
     raw_nodes = graph.nodes()
     node_mapping = {
         i: find_node_in_texts(name, sentences, lang)
         for i, name in enumerate(raw_nodes)
     }
-    edges = []
-    for i in range(len(raw_nodes)-1):
-        for j in range(i+1, len(raw_nodes)):
-            tmp = graph.get_edge_properties((raw_nodes[i], raw_nodes[j]))
-            if tmp["weight"] > 0:
-                edges.append((i, j, tmp["weight"]))
+    rows, cols, weights = graph.edge_arrays()
+    edges = [
+        (i, j, weight)
+        for i, j, weight in zip(rows.tolist(), cols.tolist(), weights.tolist())
+        if i != j and weight > 0
+    ]
     return node_mapping, edges
 
 
-def transform_word_scores(pagerank_scores: Dict[str, float]) -> Dict[str, float]:
+def transform_word_scores(scores: np.ndarray) -> np.ndarray:
     def transform(score):
         return (score * 10) ** 1.5
     SCALE = 20
-    scores = [transform(x) for x in pagerank_scores.values()]
-    new_scores = {}
-    min_score = min(scores)
-    max_score = max(scores)
+    transformed = transform(scores)
+    min_score = transformed.min()
+    max_score = transformed.max()
     span = max_score - min_score + 1
-    for key in pagerank_scores.keys():
-        new_scores[key] = round(
-            (transform(pagerank_scores[key]) - min_score + 1) / span, 4) * SCALE
-    return new_scores
-
-
-def trim_word_nodes(nodes: List[str], pagerank_scores: Dict[str, float], top_n: int):
-    kv_pairs = list(sorted(pagerank_scores.items(),
-                           key=lambda x: x[1], reverse=True))
-    picked = [x[0] for x in kv_pairs[:top_n]]
-    return set([i for i, key in enumerate(nodes) if key in picked])
+    return np.round((transformed - min_score + 1) / span, 4) * SCALE
 
 
-def reconstruct_word_graph(graph: summa.graph.Graph, pagerank_scores: Dict[str, float], top_n: int = None):
-    transformed_scores = transform_word_scores(pagerank_scores)
+def reconstruct_word_graph(graph: CompactGraph, pagerank_scores: KeywordScores, top_n: int = None):
+    if graph is None:
+        return {}, []
+    # The scores are aligned with the graph nodes
+    scores = pagerank_scores.array
+    transformed_scores = transform_word_scores(scores)
     raw_nodes = graph.nodes()
-    included = set(range(len(raw_nodes)))
+    included = None
     if top_n:
-        included = trim_word_nodes(raw_nodes, pagerank_scores, top_n)
-    edges = []
-    included_in_edges = []
-    for i in range(len(raw_nodes)-1):
-        if i not in included:
-            continue
-        for j in range(i+1, len(raw_nodes)):
-            if j not in included:
-                continue
-            tmp = graph.get_edge_properties((raw_nodes[i], raw_nodes[j]))
-            if tmp["weight"] > 0:
-                assert tmp["weight"] == 1
-                edges.append((i, j))
-                included_in_edges.append(i)
-                included_in_edges.append(j)
+        included = top_k_indices(scores, top_n)
+    rows, cols, weights = graph.induced_edges(included)
+    assert (weights == 1).all()
+    edges = list(zip(rows.tolist(), cols.tolist()))
     node_mapping = {
-        i: [name, "%.4f" % pagerank_scores[name], "%.2f" %
-            transformed_scores[name]]
-        for i, name in enumerate(raw_nodes) if i in included_in_edges
+        i: [raw_nodes[i], "%.4f" % scores[i], "%.2f" % transformed_scores[i]]
+        for i in np.unique(np.concatenate([rows, cols])).tolist()
     }
     return node_mapping, edges
 
 
+def analyze_text(text: str, metric: str):
+    """Runs the sentence and keyword pipelines (the cached part of a request).
+
+    Every sentence is fully ranked, so that the result does not depend on
+    n_sentences and n_keywords: changing them does not invalidate the cache.
+    """
+    # Detects the language and tokenizes the text once for both pipelines
+    analysis = DocumentAnalysis(text)
+    if metric.startswith("use-"):
+        if USE_ENABLED is False:
+            raise ValueError("USE not enabled.")
+        sentences, graph, lang = summarize_use(
+            analysis, model_name=metric[4:])
+        logger.info("Embedding cache: %s", EMBEDDING_CACHE.last_request)
+    elif metric.startswith("laser"):
+        if LASER_ENABLED is False:
+            raise ValueError("LASER not enabled.")
+        sentences, graph, lang = summarize_laser(analysis)
+        logger.info("Embedding cache: %s", EMBEDDING_CACHE.last_request)
+        logger.info("LASER encoders: %s", encoder_cache_stats())
+    else:
+        sentences, graph, lang = summarize_textrank(analysis)
+        if graph is not None:
+            logger.info("Ranking: %s", graph.ranking_stats)
+    print("Language dected:", lang)
+    return sentences, graph, lang, _keywords(analysis)
+
+
 @app.route('/', methods=["GET", "POST"])
 async def homepage(request):
     if request.method == "POST":
         values = await request.form()
         print("POST params:", values)
-        if values['metricInput'].startswith("use-"):
-            if USE_ENABLED is False:
-                raise ValueError("USE not enabled.")
-            sentences, graph, lang = summarize_use(
-                values['text'], model_name=values['metricInput'][4:])
-        elif values['metricInput'].startswith("laser"):
-            if LASER_ENABLED is False:
-                raise ValueError("LASER not enabled.")
-            sentences, graph, lang = summarize_laser(values['text'])
-        else:
-            sentences, graph, lang = summarize_textrank(
-                values['text'])
-        print("Language dected:", lang)
-        keywords, lemma2words, word_graph, pagerank_scores = _keywords(
-            values['text'])
+        # n_sentences and n_keywords are applied to the cached full ranking
+        cache_key = make_key(values['text'], values['metricInput'])
+        sentences, graph, lang, (keywords, lemma2words, word_graph, pagerank_scores) = (
+            CACHE.get_or_compute(
+                cache_key, lambda: analyze_text(values['text'], values['metricInput'])))
+        logger.info("Result cache: %s", CACHE.stats)
         if lang == "en":
             keyword_formatted = [
                 key + " %.2f (%s)" % (score, ", ".join(lemma2words[key]))
@@ -0,0 +1,163 @@
+"""Language detection and tokenization shared by the sentence and keyword pipelines.
+
+A `DocumentAnalysis` detects the language once and tokenizes/tags the text
+at most once (one Baidu lexer request for Chinese, one nagisa tagging pass
+for Japanese), then derives both the sentence units and the word units from
+that result. Pass the same object to `summa_score_sentences.summarize` and
+`summa_score_words.keywords` to pay for the front half only once.
+"""
+import copy
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from langdetect import detect
+from summa.preprocessing.textcleaner import tokenize_by_word as _tokenize_by_word
+from summa.syntactic_unit import SyntacticUnit
+
+from text_cleaning_en import clean_text_by_sentences as en_clean_text_by_sentences
+from text_cleaning_en import clean_paragraphs_by_sentences as en_clean_paragraphs_by_sentences
+from text_cleaning_en import clean_text_by_word as en_clean_text_by_word
+
+# Optional Dependencies
+try:
+    import text_cleaning_zh
+    ZH_SUPPORT = True
+except ImportError:
+    ZH_SUPPORT = False
+
+try:
+    import text_cleaning_ja
+    JA_SUPPORT = True
+except ImportError:
+    JA_SUPPORT = False
+
+# zh-Hant sometimes got misclassified into ko
+SUPPORTED_LANGUAGES = ("en", "zh", "ko", "ja")
+
+
+def cut_paragraph_sentences(paragraph: str, lang: str,
+                            additional_stopwords: Optional[List[str]] = None
+                            ) -> List[SyntacticUnit]:
+    """Cuts a single paragraph into sentence units (used by the streaming mode)."""
+    if lang == "en":
+        return en_clean_text_by_sentences(paragraph, additional_stopwords)
+    if lang == "zh" or lang == "ko":
+        if not ZH_SUPPORT:
+            raise ImportError("Missing dependencies for Chinese support.")
+        return text_cleaning_zh.cut_sentences(text_cleaning_zh.get_tokens(paragraph))
+    if lang == "ja":
+        if not JA_SUPPORT:
+            raise ImportError("Missing dependencies for Japanese support.")
+        return text_cleaning_ja.cut_sentences(text_cleaning_ja.get_paragraph_tokens(paragraph))
+    raise ValueError("Language not suppored! (supported languages: en, zh, ja)")
+
+
+def number_paragraphs(paragraph_units: List[List[SyntacticUnit]]) -> List[SyntacticUnit]:
+    """Flattens the sentence units of the paragraphs, skipping the empty paragraphs."""
+    sentences: List[SyntacticUnit] = []
+    paragraph_index = 0
+    for units in paragraph_units:
+        if units:
+            for sent in units:
+                sent.paragraph = paragraph_index
+            sentences += units
+            paragraph_index += 1
+    return sentences
+
+
+class DocumentAnalysis:
+    def __init__(self, text: str, additional_stopwords: Optional[List[str]] = None,
+                 deaccent: bool = False):
+        if not isinstance(text, str):
+            raise ValueError("Text parameter must be a Unicode object (str)!")
+        self.text = text
+        self.additional_stopwords = additional_stopwords
+        self.deaccent = deaccent
+        self.lang = detect(text)[:2]
+        self._tagged = None
+        self._sentences: Optional[List[SyntacticUnit]] = None
+        self._words: Optional[Tuple[Dict[str, SyntacticUnit], List[str]]] = None
+
+    @property
+    def is_chinese(self) -> bool:
+        # zh-Hant sometimes got misclassified into ko
+        return self.lang == "zh" or self.lang == "ko"
+
+    def _get_tagged(self):
+        """Runs the (expensive) tokenizer/tagger for zh and ja once."""
+        if self._tagged is None:
+            if self.is_chinese:
+                if not ZH_SUPPORT:
+                    raise ImportError("Missing dependencies for Chinese support.")
+                self._tagged = text_cleaning_zh.get_tokens(self.text)
+            elif self.lang == "ja":
+                if not JA_SUPPORT:
+                    raise ImportError("Missing dependencies for Japanese support.")
+                self._tagged = text_cleaning_ja.get_paragraph_tokens(self.text)
+            else:
+                raise ValueError("No tagger for language %s." % self.lang)
+        return self._tagged
+
+    def paragraphs(self) -> List[str]:
+        return [paragraph for paragraph in self.text.split("\n") if paragraph]
+
+    def _cut_sentences(self) -> List[SyntacticUnit]:
+        if self.lang == "en":
+            # Gets a list of processed sentences for every paragraph.
+            return number_paragraphs([
+                cut_paragraph_sentences(paragraph, "en", self.additional_stopwords)
+                for paragraph in self.paragraphs()])
+        if self.is_chinese:
+            return text_cleaning_zh.cut_sentences(self._get_tagged())
+        if self.lang == "ja":
+            return text_cleaning_ja.cut_sentences(self._get_tagged())
+        raise ValueError("Language not suppored! (supported languages: en, zh, ja)")
+
+    def _cut_words(self) -> Tuple[Dict[str, SyntacticUnit], List[str]]:
+        if self.lang == "en":
+            # Gets a dict of word -> lemma
+            tokens = en_clean_text_by_word(
+                self.text, deacc=self.deaccent,
+                additional_stopwords=self.additional_stopwords)
+            return tokens, list(_tokenize_by_word(self.text))
+        if self.is_chinese:
+            units = text_cleaning_zh.cut_words(self._get_tagged())
+        elif self.lang == "ja":
+            units = text_cleaning_ja.cut_words(self._get_tagged())
+        else:
+            raise ValueError("Language not suppored! (supported languages: en, zh, ja)")
+        return {x.text: x for x in units}, [x.text for x in units]
+
+    def sentence_units(self) -> List[SyntacticUnit]:
+        """Returns copies of the sentence units.
+
+        The scorers overwrite `token` and `score`, so every caller gets its own copies.
+        """
+        if self._sentences is None:
+            self._sentences = self._cut_sentences()
+        return [copy.copy(unit) for unit in self._sentences]
+
+    def word_units(self) -> Tuple[Dict[str, SyntacticUnit], List[str]]:
+        """Returns a dict of word -> unit and the text split into words."""
+        if self._words is None:
+            self._words = self._cut_words()
+        tokens, split_text = self._words
+        return dict(tokens), list(split_text)
+
+
+def analyze_many(texts: Sequence[str], additional_stopwords: Optional[List[str]] = None,
+                 batch_size: int = 64) -> List[DocumentAnalysis]:
+    """Analyzes many documents, cutting the English ones into sentences in bulk.
+
+    The paragraphs of all the English documents go through spaCy in a single
+    NLP.pipe stream instead of one call per paragraph.
+    """
+    analyses = [DocumentAnalysis(text, additional_stopwords) for text in texts]
+    english = [analysis for analysis in analyses if analysis.lang == "en"]
+    paragraphs = [analysis.paragraphs() for analysis in english]
+    units = iter(en_clean_paragraphs_by_sentences(
+        [paragraph for x in paragraphs for paragraph in x],
+        additional_stopwords, batch_size=batch_size))
+    for analysis, document_paragraphs in zip(english, paragraphs):
+        analysis._sentences = number_paragraphs(
+            [next(units) for _ in document_paragraphs])
+    return analyses
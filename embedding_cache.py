@@ -0,0 +1,209 @@
+"""Cross-request cache of sentence embeddings.
+
+Rows are keyed by (model name, hash of the whitespace-normalized sentence),
+so boilerplate sentences repeated across requests are only encoded once. The
+memory tier is bounded in bytes with least-recently-used eviction. An
+optional directory adds an append-only on-disk tier per model: the rows are
+stored as float32 or float16 and read back through a memory map, and they
+survive both eviction and restarts. The disk tier expects a single writing
+process.
+
+`encode` sends only the misses to the encoder. The hit counts of the last
+request of the calling thread are kept in `last_request`.
+"""
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict, namedtuple
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence, Union
+
+import numpy as np
+
+MAX_BYTES = 64 * 1024 * 1024
+
+RequestStats = namedtuple("RequestStats", ["n_sentences", "hits", "disk_hits", "hit_ratio"])
+EmbeddingCacheStats = namedtuple(
+    "EmbeddingCacheStats", ["hits", "misses", "disk_hits", "entries", "size_bytes"])
+
+
+def text_digest(text: str) -> str:
+    normalized = " ".join(text.split())
+    return hashlib.sha1(normalized.encode("utf-8")).hexdigest()
+
+
+class _DiskTier:
+    """Append-only rows of one model: keys.txt (one digest per row) and rows.bin."""
+
+    def __init__(self, directory: Path, dtype: str):
+        self.directory = directory
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.dtype = np.dtype(dtype)
+        self.dim: Optional[int] = None
+        self.rows: Dict[str, int] = {}
+        # Number of rows in rows.bin (a digest appended twice keeps its last row)
+        self.n_rows = 0
+        self._memmap: Optional[np.memmap] = None
+        meta_path = self.directory / "meta.json"
+        if meta_path.exists():
+            meta = json.loads(meta_path.read_text())
+            self.dim, self.dtype = meta["dim"], np.dtype(meta["dtype"])
+            self._recover()
+
+    def _recover(self) -> None:
+        """Loads the keys, dropping the rows and keys of an interrupted append.
+
+        The rows are written before their keys, so after a crash rows.bin can
+        hold rows without keys (or a partial row), and keys.txt a partial line.
+        Both files are truncated to the rows that have a key, so that the next
+        append starts right after them.
+        """
+        keys_path, rows_path = self.directory / "keys.txt", self.directory / "rows.bin"
+        row_bytes = self.dim * self.dtype.itemsize
+        keys = keys_path.read_text() if keys_path.exists() else ""
+        digests = keys.split("\n")
+        # The last element is the (possibly partial) line after the last newline
+        digests.pop()
+        rows_size = rows_path.stat().st_size if rows_path.exists() else 0
+        self.n_rows = min(len(digests), rows_size // row_bytes)
+        if rows_size != self.n_rows * row_bytes:
+            with open(str(rows_path), "r+b") as fout:
+                fout.truncate(self.n_rows * row_bytes)
+        if len(digests) != self.n_rows or (keys and not keys.endswith("\n")):
+            keys_path.write_text("".join(digest + "\n" for digest in digests[:self.n_rows]))
+        self.rows = {digest: i for i, digest in enumerate(digests[:self.n_rows])}
+
+    def get(self, digest: str) -> Optional[np.ndarray]:
+        row = self.rows.get(digest)
+        if row is None:
+            return None
+        if self._memmap is None or len(self._memmap) <= row:
+            # Maps the file again after it grew
+            self._memmap = np.memmap(
+                str(self.directory / "rows.bin"), dtype=self.dtype, mode="r",
+                shape=(self.n_rows, self.dim))
+        return np.asarray(self._memmap[row], dtype=np.float32)
+
+    def append(self, digests: List[str], embeddings: np.ndarray) -> None:
+        if self.dim is None:
+            self.dim = embeddings.shape[1]
+            (self.directory / "meta.json").write_text(
+                json.dumps({"dim": self.dim, "dtype": self.dtype.name}))
+        # The rows are written before their keys
+        with open(str(self.directory / "rows.bin"), "ab") as fout:
+            fout.write(np.ascontiguousarray(embeddings, dtype=self.dtype).tobytes())
+        with open(str(self.directory / "keys.txt"), "a") as fout:
+            fout.write("".join(digest + "\n" for digest in digests))
+        for digest in digests:
+            self.rows[digest] = self.n_rows
+            self.n_rows += 1
+
+
+class EmbeddingCache:
+    def __init__(self, max_bytes: int = MAX_BYTES,
+                 directory: Optional[Union[str, Path]] = None, disk_dtype: str = "float32"):
+        if disk_dtype not in ("float32", "float16"):
+            raise ValueError("disk_dtype must be float32 or float16.")
+        self.max_bytes = max_bytes
+        self.directory = Path(directory) if directory else None
+        self.disk_dtype = disk_dtype
+        self._entries: "OrderedDict[tuple, np.ndarray]" = OrderedDict()
+        self._disk: Dict[str, _DiskTier] = {}
+        self._size = 0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.hits = 0
+        self.misses = 0
+        self.disk_hits = 0
+
+    def _disk_tier(self, model: str) -> Optional[_DiskTier]:
+        if self.directory is None:
+            return None
+        if model not in self._disk:
+            self._disk[model] = _DiskTier(self.directory / model, self.disk_dtype)
+        return self._disk[model]
+
+    def _remember(self, key: tuple, row: np.ndarray) -> None:
+        """Inserts into the memory tier (under the lock) and evicts the LRU entries."""
+        if key in self._entries:
+            return
+        self._entries[key] = row
+        self._size += row.nbytes
+        while self._size > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._size -= evicted.nbytes
+
+    def encode(self, model: str, texts: Sequence[str],
+               encode: Callable[[List[str]], np.ndarray]) -> np.ndarray:
+        """Returns the float32 embeddings of the texts, encoding only the misses."""
+        if not texts:
+            return encode(list(texts))
+        digests = [text_digest(text) for text in texts]
+        rows: List[Optional[np.ndarray]] = [None] * len(texts)
+        hits = disk_hits = 0
+        with self._lock:
+            disk = self._disk_tier(model)
+            for i, digest in enumerate(digests):
+                row = self._entries.get((model, digest))
+                if row is not None:
+                    self._entries.move_to_end((model, digest))
+                elif disk is not None:
+                    row = disk.get(digest)
+                    if row is not None:
+                        self._remember((model, digest), row)
+                        disk_hits += 1
+                if row is not None:
+                    rows[i] = row
+                    hits += 1
+        # Duplicated sentences are encoded once
+        missing = list(dict.fromkeys(
+            digest for digest, row in zip(digests, rows) if row is None))
+        if missing:
+            first = {}
+            for i, digest in enumerate(digests):
+                first.setdefault(digest, i)
+            encoded = np.asarray(
+                encode([texts[first[digest]] for digest in missing]), dtype=np.float32)
+            computed = {digest: row.copy() for digest, row in zip(missing, encoded)}
+            for i, digest in enumerate(digests):
+                if rows[i] is None:
+                    rows[i] = computed[digest]
+            with self._lock:
+                for digest, row in computed.items():
+                    self._remember((model, digest), row)
+                if disk is not None:
+                    new = [digest for digest in missing if digest not in disk.rows]
+                    if new:
+                        disk.append(new, np.stack([computed[digest] for digest in new]))
+        with self._lock:
+            self.hits += hits
+            self.disk_hits += disk_hits
+            self.misses += len(texts) - hits
+        self._local.last_request = RequestStats(
+            len(texts), hits, disk_hits, hits / len(texts))
+        return np.stack(rows)
+
+    @property
+    def last_request(self) -> Optional[RequestStats]:
+        """Hit counts of the last `encode` call of the current thread."""
+        return getattr(self._local, "last_request", None)
+
+    def clear(self) -> None:
+        """Empties the memory tier (the disk tier is kept)."""
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    @property
+    def stats(self) -> EmbeddingCacheStats:
+        with self._lock:
+            return EmbeddingCacheStats(
+                self.hits, self.misses, self.disk_hits, len(self._entries), self._size)
+
+
+# Shared by the USE and LASER scorers
+EMBEDDING_CACHE = EmbeddingCache(
+    max_bytes=int(os.environ.get("EMBEDDING_CACHE_BYTES", MAX_BYTES)),
+    directory=os.environ.get("EMBEDDING_CACHE_DIR"),
+    disk_dtype=os.environ.get("EMBEDDING_CACHE_DTYPE", "float32"))
@@ -0,0 +1,69 @@
+"""Sentence graphs and rankings from (precomputed) sentence embeddings.
+
+Shared by the USE and LASER scorers, and used directly by the batch API,
+which encodes the sentences of many documents at once.
+"""
+import os
+from typing import List, Optional, Union
+
+import numpy as np
+from summa.summarizer import _add_scores_to_sentences
+from summa.syntactic_unit import SyntacticUnit
+
+from compact_graph import CompactGraph, DenseGraph
+from knn_graph import knn_similarity_matrix
+from precision import EmbeddingMatrix
+from ranking import pagerank_weighted as _pagerank
+
+# float32, float16 or int8 (see precision.py)
+PRECISION = os.environ.get("EMBEDDING_PRECISION", "float32")
+
+
+def similarity_matrix(embeddings: Union[np.ndarray, EmbeddingMatrix], knn: Optional[int] = None):
+    """Dense cosine similarities, or the sparse top-knn ones when `knn` is set."""
+    if knn:
+        return knn_similarity_matrix(embeddings, knn)
+    if isinstance(embeddings, EmbeddingMatrix):
+        return embeddings.similarities()
+    return embeddings @ embeddings.T
+
+
+def score_embedded_sentences(sentences: List[SyntacticUnit], embeddings: np.ndarray,
+                             knn: Optional[int] = None,
+                             precision: Optional[str] = None
+                             ) -> Optional[Union[CompactGraph, DenseGraph]]:
+    """Sets the `score` of the sentence units. Returns the ranked graph (None if empty).
+
+    The sentence tokens are the row numbers of their embeddings. With a
+    `precision` other than float32 (PRECISION by default), the embeddings and
+    the similarities are stored at reduced precision. Without `knn`, the graph
+    is the dense similarity matrix itself (a DenseGraph), and is ranked in place.
+    """
+    precision = precision or PRECISION
+    if precision != "float32":
+        embeddings = EmbeddingMatrix.from_float(embeddings, precision)
+    # Creates the graph and calculates the similarity coefficient for every pair of nodes.
+    labels = [x.token for x in sentences]
+    similarities = similarity_matrix(embeddings, knn)
+    del embeddings
+    if knn:
+        graph = CompactGraph.from_similarity_matrix(labels, similarities)
+    else:
+        graph = DenseGraph.from_similarity_matrix(labels, similarities)
+    del similarities
+
+    # Remove all nodes with all edges weights equal to zero.
+    graph.remove_unreachable_nodes()
+
+    # PageRank cannot be run in an empty graph.
+    if len(graph) == 0:
+        for sentence in sentences:
+            sentence.score = 0
+        return None
+
+    # Ranks the tokens using the PageRank algorithm. Returns dict of sentence -> score
+    pagerank_scores = _pagerank(graph)
+
+    # Adds the summa scores to the sentence objects.
+    _add_scores_to_sentences(sentences, pagerank_scores)
+    return graph
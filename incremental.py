@@ -0,0 +1,221 @@
+"""Incremental re-ranking of a document that is re-summarized after every edit.
+
+An `IncrementalSummarizer` keeps the state of the previous call:
+  * the sentence units of every paragraph, keyed by the paragraph text, so
+    only edited paragraphs are cut (and tagged) again;
+  * the token sets (lexical similarity) or the embeddings of every node,
+    keyed by content, so only new sentences are processed or encoded;
+  * the sparse similarity matrix, so only the rows and columns of the new
+    nodes are computed (the other entries are copied over);
+  * the scores, which warm-start the power iteration.
+
+With the default lexical similarity the nodes are the distinct sentence
+tokens, like `summa_score_sentences.summarize`. With an `encode` function the
+nodes are the sentences, keyed by a hash of their text (and occurrence).
+"""
+import copy
+import hashlib
+from collections import namedtuple
+from functools import partial
+from typing import Any, Callable, Dict, Hashable, List, Optional
+
+import numpy as np
+from langdetect import detect
+from scipy import sparse
+from summa.summarizer import _add_scores_to_sentences
+from summa.syntactic_unit import SyntacticUnit
+
+from compact_graph import CompactGraph
+from document_analysis import SUPPORTED_LANGUAGES, cut_paragraph_sentences, number_paragraphs
+from lexical_similarity import lexical_similarity_rows
+from ranking import power_iteration
+
+# n_recomputed: the number of similarity rows computed by the last update
+IncrementalStats = namedtuple(
+    "IncrementalStats", ["n_nodes", "n_recomputed", "n_cut_paragraphs", "ranking"])
+
+# The vocabulary is renumbered once this fraction of its words is unused
+VOCABULARY_COMPACT_RATIO = 0.5
+
+
+class IncrementalSummarizer:
+    def __init__(self, additional_stopwords: Optional[List[str]] = None,
+                 encode: Optional[Callable[[List[SyntacticUnit]], np.ndarray]] = None,
+                 lang: Optional[str] = None,
+                 cut_paragraph: Optional[Callable[[str, str], List[SyntacticUnit]]] = None):
+        """
+        Parameters
+        ----------
+        encode: returns the (L2-normalized) embeddings of a list of sentence
+            units, e.g. a partial of summa_score_sentences_use.encode_sentences.
+            The lexical TextRank similarity is used when it is None.
+        lang: the language of the document. Detected by the first update if None.
+        cut_paragraph: cuts a paragraph into sentence units, given the language.
+        """
+        self.encode = encode
+        self.lang = lang
+        if cut_paragraph is None:
+            cut_paragraph = partial(
+                cut_paragraph_sentences, additional_stopwords=additional_stopwords)
+        self._cut_paragraph = cut_paragraph
+        self._paragraphs: Dict[str, List[SyntacticUnit]] = {}
+        self._keys: List[Hashable] = []
+        self._similarities = sparse.csr_matrix((0, 0))
+        # key -> (word ids, number of words) or the embedding of the node
+        self._nodes: Dict[Hashable, Any] = {}
+        self._vocabulary: Dict[str, int] = {}
+        self._scores: Dict[Hashable, float] = {}
+        self.stats: Optional[IncrementalStats] = None
+
+    def _cut_sentences(self, text: str):
+        paragraphs: Dict[str, List[SyntacticUnit]] = {}
+        paragraph_units = []
+        n_cut = 0
+        for paragraph in text.split("\n"):
+            if not paragraph:
+                continue
+            if paragraph in paragraphs:
+                units = paragraphs[paragraph]
+            elif paragraph in self._paragraphs:
+                units = self._paragraphs[paragraph]
+            else:
+                units = self._cut_paragraph(paragraph, self.lang)
+                n_cut += 1
+            paragraphs[paragraph] = units
+            paragraph_units.append([copy.copy(unit) for unit in units])
+        # Only keeps the paragraphs of the current version
+        self._paragraphs = paragraphs
+        return number_paragraphs(paragraph_units), n_cut
+
+    def _node_keys(self, sentences: List[SyntacticUnit]) -> List[Hashable]:
+        if self.encode is None:
+            return list(dict.fromkeys(
+                sentence.token for sentence in sentences
+                if sentence.token and len(sentence.token) > 2))
+        occurrences: Dict[str, int] = {}
+        keys = []
+        for sentence in sentences:
+            digest = hashlib.sha1(sentence.text.encode("utf-8")).hexdigest()
+            occurrences[digest] = occurrences.get(digest, -1) + 1
+            keys.append((digest, occurrences[digest]))
+        return keys
+
+    def _add_nodes(self, keys: List[Hashable], sentences: List[SyntacticUnit]) -> None:
+        """Computes the token sets or the embeddings of the new nodes."""
+        new = [i for i, key in enumerate(keys) if key not in self._nodes]
+        if self.encode is None:
+            for i in new:
+                words = keys[i].split()
+                ids = np.unique(np.asarray(
+                    [self._vocabulary.setdefault(word, len(self._vocabulary))
+                     for word in words], dtype=np.int32))
+                self._nodes[keys[i]] = (ids, len(words))
+        elif new:
+            embeddings = self.encode([sentences[i] for i in new])
+            for i, embedding in zip(new, embeddings):
+                self._nodes[keys[i]] = embedding
+        self._nodes = {key: self._nodes[key] for key in keys}
+        if self.encode is None:
+            self._compact_vocabulary()
+
+    def _compact_vocabulary(self) -> None:
+        """Drops the words of no current node once there are enough of them."""
+        used = np.unique(np.concatenate(
+            [ids for ids, _ in self._nodes.values()] + [np.zeros(0, dtype=np.int32)]))
+        if len(self._vocabulary) - len(used) < \
+                VOCABULARY_COMPACT_RATIO * len(self._vocabulary):
+            return
+        new_ids = np.full(len(self._vocabulary), -1, dtype=np.int32)
+        new_ids[used] = np.arange(len(used), dtype=np.int32)
+        self._vocabulary = {word: int(new_ids[i]) for word, i in self._vocabulary.items()
+                            if new_ids[i] >= 0}
+        # The ids stay sorted, as the mapping keeps their order
+        self._nodes = {key: (new_ids[ids], length)
+                       for key, (ids, length) in self._nodes.items()}
+
+    def _similarity_rows(self, keys: List[Hashable], rows: np.ndarray) -> np.ndarray:
+        if self.encode is None:
+            word_ids = [self._nodes[key][0] for key in keys]
+            indptr = np.cumsum([0] + [len(ids) for ids in word_ids])
+            presence = sparse.csr_matrix(
+                (np.ones(indptr[-1]), np.concatenate(word_ids), indptr),
+                shape=(len(keys), len(self._vocabulary)))
+            lengths = np.asarray([self._nodes[key][1] for key in keys])
+            return lexical_similarity_rows(presence, lengths, rows)
+        embeddings = np.stack([self._nodes[key] for key in keys])
+        similarities = embeddings[rows] @ embeddings.T
+        similarities[np.arange(len(rows)), rows] = 0
+        return similarities
+
+    def _update_similarities(self, keys: List[Hashable]) -> int:
+        """Reuses the similarities between old nodes. Returns the number of rows computed."""
+        if keys == self._keys:
+            return 0
+        old_index = {key: i for i, key in enumerate(self._keys)}
+        old = np.asarray([old_index.get(key, -1) for key in keys], dtype=np.int64)
+        kept, changed = np.flatnonzero(old >= 0), np.flatnonzero(old < 0)
+        # The edges between kept nodes, renumbered
+        reused = self._similarities[old[kept]][:, old[kept]].tocoo()
+        rows, cols, data = [kept[reused.row]], [kept[reused.col]], [reused.data]
+        if len(changed):
+            similarities = self._similarity_rows(keys, changed)
+            row, col = np.nonzero(similarities)
+            rows.append(changed[row])
+            cols.append(col)
+            data.append(similarities[row, col])
+            # The symmetric entries, except those between two changed nodes
+            is_kept = old[col] >= 0
+            rows.append(col[is_kept])
+            cols.append(changed[row[is_kept]])
+            data.append(similarities[row[is_kept], col[is_kept]])
+        self._keys = keys
+        self._similarities = sparse.csr_matrix(
+            (np.concatenate(data), (np.concatenate(rows), np.concatenate(cols))),
+            shape=(len(keys), len(keys)))
+        return len(changed)
+
+    def update(self, text: str):
+        """Summarizes the current version of the text.
+
+        Returns the same (sentences, graph, lang) results as the summarize functions.
+        """
+        if self.lang is None:
+            self.lang = detect(text)[:2]
+        if self.lang not in SUPPORTED_LANGUAGES:
+            return ["Language not suppored! (supported languages: en, zh, ja)"], None, self.lang
+        sentences, n_cut = self._cut_sentences(text)
+        keys = self._node_keys(sentences)
+        self._add_nodes(keys, sentences)
+        n_recomputed = self._update_similarities(keys)
+
+        graph = CompactGraph.from_similarity_matrix(keys, self._similarities)
+        # Remove all nodes with all edges weights equal to zero.
+        graph.remove_unreachable_nodes()
+        # PageRank cannot be run in an empty graph.
+        if len(graph) == 0:
+            self._scores = {}
+            self.stats = IncrementalStats(0, n_recomputed, n_cut, None)
+            return []
+
+        # Warm-starts from the previous scores
+        initial = None
+        if self._scores:
+            fallback = np.mean(list(self._scores.values()))
+            initial = np.asarray([self._scores.get(key, fallback) for key in graph.labels])
+        scores, graph.ranking_stats = power_iteration(graph.adjacency, initial=initial)
+        self._scores = dict(zip(graph.labels, scores.tolist()))
+        self.stats = IncrementalStats(len(keys), n_recomputed, n_cut, graph.ranking_stats)
+
+        if self.encode is not None:
+            # Like the embedding scorers, sentence tokens are their positions
+            positions = {key: i for i, key in enumerate(keys)}
+            for i, sent in enumerate(sentences):
+                sent.token = i
+            graph.labels = [positions[key] for key in graph.labels]
+            _add_scores_to_sentences(sentences, dict(zip(graph.labels, scores.tolist())))
+        else:
+            _add_scores_to_sentences(sentences, self._scores)
+
+        # Sorts the sentences
+        sentences.sort(key=lambda s: s.score, reverse=True)
+        return sentences, graph, self.lang
@@ -0,0 +1,266 @@
+"""Corpus-level keyword index, e.g. for "the keywords of the last 24 hours of articles".
+
+Every added document contributes its (deduplicated) co-occurrence edges, as
+built by summa_score_words.build_word_graph, so an edge weight is the number
+of live documents in which the two lemmas co-occur. Adding a document costs
+time proportional to its length: its edges are mapped to global lemma ids and
+queued, and the sparse global counts are only updated when ranking or saving.
+Expired documents have their edges subtracted again.
+
+Lemmas that no live document uses any more are dropped (and the lemma ids
+compacted) once they make up a COMPACT_RATIO of the lemma table, so that a
+rolling index does not grow without bound.
+
+Ranking is warm-started from the previous scores. `save` writes the global
+counts, the lemma table and the per-document edges to a directory, and
+`KeywordIndex(directory)` loads them back. Every file is written to a
+temporary file first; index.json, which names the array files of the save,
+is replaced last, so a crash during `save` leaves the previous save intact.
+Loading a save of another FORMAT_VERSION raises a ValueError.
+"""
+import json
+import os
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple, Union
+
+import numpy as np
+from scipy import sparse
+
+from document_analysis import DocumentAnalysis, SUPPORTED_LANGUAGES
+from ranking import power_iteration
+from summa_score_words import build_word_graph
+from vocabulary import Vocabulary
+
+COMPACT_RATIO = 0.25
+# Bump whenever the layout of a save changes
+FORMAT_VERSION = 2
+
+
+def _write_atomically(path: Path, write: Callable) -> None:
+    """Writes through a temporary file and os.replace, so readers never see partial files."""
+    handle, tmp_path = tempfile.mkstemp(dir=str(path.parent))
+    try:
+        with os.fdopen(handle, "wb") as fout:
+            write(fout)
+        os.replace(tmp_path, str(path))
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+
+class KeywordIndex:
+    def __init__(self, directory: Optional[Union[str, Path]] = None):
+        self.directory = Path(directory) if directory else None
+        self.lemmas: List[str] = []
+        self._lemma_ids: Dict[str, int] = {}
+        # lemma id -> surface words (in order of appearance)
+        self._words: List[List[str]] = []
+        # lemma id -> number of live documents with an edge on the lemma
+        self._lemma_docs: List[int] = []
+        # doc id -> (timestamp, rows, cols) of the document edges (rows <= cols)
+        self._documents: "OrderedDict[str, Tuple[float, np.ndarray, np.ndarray]]" = OrderedDict()
+        self._counts = sparse.csr_matrix((0, 0), dtype=np.int32)
+        # (rows, cols, +1 or -1) not yet applied to the counts
+        self._pending: List[Tuple[np.ndarray, np.ndarray, int]] = []
+        self._scores = np.zeros(0)
+        self.ranking_stats = None
+        self._lock = threading.Lock()
+        if self.directory and (self.directory / "index.json").exists():
+            self._load()
+
+    def __len__(self) -> int:
+        return len(self._documents)
+
+    def _intern(self, lemma: str) -> int:
+        lemma_id = self._lemma_ids.get(lemma)
+        if lemma_id is None:
+            lemma_id = self._lemma_ids[lemma] = len(self.lemmas)
+            self.lemmas.append(lemma)
+            self._words.append([])
+            self._lemma_docs.append(0)
+        return lemma_id
+
+    def _count_lemmas(self, rows: np.ndarray, cols: np.ndarray, sign: int) -> None:
+        for lemma_id in np.unique(np.concatenate([rows, cols])).tolist():
+            self._lemma_docs[lemma_id] += sign
+
+    def add(self, text: Union[str, DocumentAnalysis], timestamp: Optional[float] = None,
+            doc_id: Optional[str] = None) -> Optional[str]:
+        """Adds a document. Returns its id (None if its language is not supported)."""
+        analysis = text if isinstance(text, DocumentAnalysis) else DocumentAnalysis(text)
+        if analysis.lang not in SUPPORTED_LANGUAGES:
+            return None
+        tokens, split_text = analysis.word_units()
+        return self.add_tokens(tokens, split_text, timestamp=timestamp, doc_id=doc_id)
+
+    def add_tokens(self, tokens, split_text, timestamp: Optional[float] = None,
+                   doc_id: Optional[str] = None) -> str:
+        """Adds a document given its word units (see DocumentAnalysis.word_units)."""
+        vocabulary = Vocabulary(tokens)
+        graph = build_word_graph(tokens, split_text, vocabulary=vocabulary)
+        rows, cols, _ = graph.edge_arrays()
+        with self._lock:
+            global_ids = np.asarray(
+                [self._intern(lemma) for lemma in graph.labels], dtype=np.int64)
+            for lemma, words in zip(vocabulary.lemmas, vocabulary.surface_words()):
+                known = self._words[self._intern(lemma)]
+                known.extend(word for word in words if word not in known)
+            rows, cols = global_ids[rows], global_ids[cols]
+            rows, cols = np.minimum(rows, cols), np.maximum(rows, cols)
+            doc_id = doc_id or uuid.uuid4().hex
+            if doc_id in self._documents:
+                self._remove(doc_id)
+            self._documents[doc_id] = (
+                time.time() if timestamp is None else timestamp, rows, cols)
+            self._pending.append((rows, cols, 1))
+            self._count_lemmas(rows, cols, 1)
+        return doc_id
+
+    def _remove(self, doc_id: str) -> None:
+        _, rows, cols = self._documents.pop(doc_id)
+        self._pending.append((rows, cols, -1))
+        self._count_lemmas(rows, cols, -1)
+
+    def remove(self, doc_id: str) -> None:
+        with self._lock:
+            self._remove(doc_id)
+            self._maybe_compact()
+
+    def _maybe_compact(self) -> None:
+        """Drops the unused lemmas once there are enough of them (under the lock)."""
+        unused = self._lemma_docs.count(0)
+        if unused and unused >= COMPACT_RATIO * len(self.lemmas):
+            self._compact()
+
+    def _compact(self) -> None:
+        """Drops the lemmas of no live document and renumbers the others (under the lock)."""
+        counts = self._apply_pending()
+        keep = np.flatnonzero(np.asarray(self._lemma_docs) > 0)
+        new_ids = np.full(len(self.lemmas), -1, dtype=np.int64)
+        new_ids[keep] = np.arange(len(keep))
+        keep_list = keep.tolist()
+        self.lemmas = [self.lemmas[i] for i in keep_list]
+        self._words = [self._words[i] for i in keep_list]
+        self._lemma_docs = [self._lemma_docs[i] for i in keep_list]
+        self._lemma_ids = {lemma: i for i, lemma in enumerate(self.lemmas)}
+        # The dropped lemmas have no counts left
+        self._counts = counts[keep][:, keep].tocsr()
+        previous = np.zeros(len(new_ids))
+        previous[:len(self._scores)] = self._scores[:len(new_ids)]
+        self._scores = previous[keep]
+        for doc_id, (timestamp, rows, cols) in self._documents.items():
+            self._documents[doc_id] = (timestamp, new_ids[rows], new_ids[cols])
+
+    def expire(self, max_age: float, now: Optional[float] = None) -> int:
+        """Removes the documents older than max_age seconds. Returns how many were removed."""
+        cutoff = (time.time() if now is None else now) - max_age
+        with self._lock:
+            expired = [doc_id for doc_id, (timestamp, _, _) in self._documents.items()
+                       if timestamp < cutoff]
+            for doc_id in expired:
+                self._remove(doc_id)
+            self._maybe_compact()
+        return len(expired)
+
+    def _apply_pending(self) -> sparse.csr_matrix:
+        """Applies the queued edges to the global counts (under the lock)."""
+        size = len(self.lemmas)
+        if self._counts.shape != (size, size):
+            self._counts.resize((size, size))
+        if self._pending:
+            rows = np.concatenate([x[0] for x in self._pending])
+            cols = np.concatenate([x[1] for x in self._pending])
+            signs = np.concatenate(
+                [np.full(len(x[0]), x[2], dtype=np.int32) for x in self._pending])
+            delta = sparse.csr_matrix((signs, (rows, cols)), shape=(size, size))
+            self._counts = (self._counts + delta).tocsr()
+            self._counts.eliminate_zeros()
+            self._pending = []
+        return self._counts
+
+    def keywords(self, top_n: Optional[int] = None) -> List[Tuple[float, str]]:
+        """Ranks the lemmas of the live documents. Returns (score, lemma), best first."""
+        with self._lock:
+            counts = self._apply_pending()
+            adjacency = counts + sparse.triu(counts, k=1).T
+            active = np.flatnonzero(np.asarray(adjacency.sum(axis=1)).ravel())
+            previous = np.zeros(len(self.lemmas))
+            previous[:len(self._scores)] = self._scores
+            initial = previous[active]
+            if initial.any():
+                # Warm start, with the new nodes at the mean of the known scores
+                initial[initial == 0] = initial[initial > 0].mean()
+            else:
+                initial = None
+            scores, self.ranking_stats = power_iteration(
+                adjacency[active][:, active], initial=initial)
+            self._scores = np.zeros(len(self.lemmas))
+            self._scores[active] = scores
+            order = np.lexsort((active, -scores))
+            if top_n is not None:
+                order = order[:top_n]
+            return [(score, self.lemmas[i]) for score, i in zip(
+                scores[order].tolist(), active[order].tolist())]
+
+    def lemmas_to_words(self) -> Dict[str, List[str]]:
+        with self._lock:
+            return {lemma: list(words) for lemma, words in zip(self.lemmas, self._words)}
+
+    def save(self) -> None:
+        if self.directory is None:
+            raise ValueError("The index has no directory.")
+        self.directory.mkdir(parents=True, exist_ok=True)
+        # New array files for every save: index.json keeps naming the previous
+        # ones until it is replaced
+        generation = uuid.uuid4().hex[:12]
+        files = {"counts": "counts-%s.npz" % generation,
+                 "documents": "documents-%s.npz" % generation}
+        with self._lock:
+            counts = self._apply_pending()
+            _write_atomically(self.directory / files["counts"],
+                              lambda fout: sparse.save_npz(fout, counts))
+            doc_ids = list(self._documents)
+            lengths = [len(self._documents[x][1]) for x in doc_ids]
+            _write_atomically(self.directory / files["documents"], lambda fout: np.savez(
+                fout,
+                rows=np.concatenate([self._documents[x][1] for x in doc_ids] or [[]]),
+                cols=np.concatenate([self._documents[x][2] for x in doc_ids] or [[]]),
+                lengths=np.asarray(lengths, dtype=np.int64),
+                timestamps=np.asarray([self._documents[x][0] for x in doc_ids]),
+                scores=self._scores))
+            meta = json.dumps(
+                {"version": FORMAT_VERSION, "lemmas": self.lemmas, "words": self._words, "doc_ids": doc_ids,
+                 "files": files}, ensure_ascii=False)
+            _write_atomically(self.directory / "index.json",
+                              lambda fout: fout.write(meta.encode("utf-8")))
+            for path in self.directory.glob("*.npz"):
+                if path.name not in files.values():
+                    path.unlink()
+
+    def _load(self) -> None:
+        with open(str(self.directory / "index.json"), encoding="utf-8") as fin:
+            meta = json.load(fin)
+        if meta.get("version") != FORMAT_VERSION:
+            raise ValueError("Unsupported keyword index version %s in %s (expected %s)." % (
+                meta.get("version"), self.directory, FORMAT_VERSION))
+        files = meta["files"]
+        self.lemmas = meta["lemmas"]
+        self._words = meta["words"]
+        self._lemma_ids = {lemma: i for i, lemma in enumerate(self.lemmas)}
+        self._lemma_docs = [0] * len(self.lemmas)
+        self._counts = sparse.load_npz(str(self.directory / files["counts"])).tocsr()
+        arrays = np.load(str(self.directory / files["documents"]))
+        offsets = np.cumsum(np.concatenate([[0], arrays["lengths"]]))
+        rows = arrays["rows"].astype(np.int64)
+        cols = arrays["cols"].astype(np.int64)
+        for i, doc_id in enumerate(meta["doc_ids"]):
+            start, end = offsets[i], offsets[i + 1]
+            self._documents[doc_id] = (
+                float(arrays["timestamps"][i]), rows[start:end], cols[start:end])
+            self._count_lemmas(rows[start:end], cols[start:end], 1)
+        self._scores = arrays["scores"]
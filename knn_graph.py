@@ -0,0 +1,93 @@
+"""Sparse k-nearest-neighbour similarity matrices for the embedding-based scorers.
+
+Instead of the dense N x N cosine similarity matrix, only the k most similar
+sentences of every sentence are kept (O(N * k) memory). The neighbours are
+found with a faiss inner-product index when faiss is installed (it is a LASER
+dependency), otherwise with blocked matrix products so that at most
+block_size x N similarities exist at a time.
+The result is symmetrized (an edge is kept if either end selected it) and
+can go straight into CompactGraph.from_similarity_matrix.
+"""
+from typing import Optional, Tuple, Union
+
+import numpy as np
+from scipy import sparse
+from scipy.stats import spearmanr
+
+from precision import EmbeddingMatrix
+
+# Optional Dependencies
+try:
+    import faiss
+    FAISS_SUPPORT = True
+except ImportError:
+    FAISS_SUPPORT = False
+
+BLOCK_SIZE = 1024
+
+
+def _blocked_neighbors(embeddings: EmbeddingMatrix, k: int, block_size: int
+                       ) -> Tuple[np.ndarray, np.ndarray]:
+    size = len(embeddings)
+    indices = np.empty((size, k), dtype=np.int64)
+    similarities = np.empty((size, k), dtype=np.float32)
+    for start in range(0, size, block_size):
+        end = min(start + block_size, size)
+        block = embeddings.similarity_rows(start, end, block_size)
+        # Excludes the sentence itself
+        block[np.arange(end - start), np.arange(start, end)] = -np.inf
+        candidates = np.argpartition(-block, k - 1, axis=1)[:, :k]
+        indices[start:end] = candidates
+        similarities[start:end] = np.take_along_axis(block, candidates, axis=1)
+    return indices, similarities
+
+
+def _faiss_neighbors(embeddings: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    index = faiss.IndexFlatIP(embeddings.shape[1])
+    index.add(embeddings)
+    # One extra neighbour, as the sentence itself is (usually) the first hit
+    similarities, indices = index.search(embeddings, k + 1)
+    is_self = indices == np.arange(embeddings.shape[0])[:, None]
+    # Drops the sentence itself, or the last hit when it was not found
+    is_self[~is_self.any(axis=1), -1] = True
+    keep = ~is_self
+    return (indices[keep].reshape(-1, k).astype(np.int64),
+            similarities[keep].reshape(-1, k))
+
+
+def knn_similarity_matrix(embeddings: Union[np.ndarray, EmbeddingMatrix], k: int,
+                          block_size: int = BLOCK_SIZE,
+                          use_faiss: Optional[bool] = None) -> sparse.csr_matrix:
+    """Returns the symmetric sparse matrix of the top-k (positive) similarities.
+
+    The embeddings are expected to be L2-normalized, so that inner products are
+    cosine similarities. `use_faiss` defaults to whether faiss is installed;
+    reduced-precision embeddings always use the blocked products.
+    """
+    if not isinstance(embeddings, EmbeddingMatrix):
+        embeddings = EmbeddingMatrix(np.ascontiguousarray(embeddings, dtype=np.float32))
+    size = len(embeddings)
+    k = min(k, size - 1)
+    if k <= 0:
+        return sparse.csr_matrix((size, size), dtype=np.float32)
+    if use_faiss is None:
+        use_faiss = FAISS_SUPPORT
+    if use_faiss and embeddings.precision == "float32":
+        indices, similarities = _faiss_neighbors(embeddings.values, k)
+    else:
+        indices, similarities = _blocked_neighbors(embeddings, k, block_size)
+    rows = np.repeat(np.arange(size), k)
+    indices, similarities = indices.ravel(), similarities.ravel()
+    # Unrelated (or empty, e.g. too short) sentences do not create edges
+    positive = similarities > 0
+    directed = sparse.csr_matrix(
+        (similarities[positive], (rows[positive], indices[positive])),
+        shape=(size, size))
+    return directed.maximum(directed.T).tocsr()
+
+
+def rank_correlation(scores: np.ndarray, reference: np.ndarray) -> float:
+    """Spearman rank correlation between two score vectors of the same sentences."""
+    if len(scores) < 2:
+        return 1.
+    return float(spearmanr(scores, reference).correlation)
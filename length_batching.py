@@ -0,0 +1,57 @@
+"""Length-bucketed batching for the sentence encoders.
+
+The sentences are sorted by length and cut into batches whose padded size
+(number of sentences times the longest length in the batch) stays under a
+budget, like the `max_tokens` option of LASER's embed.py. This way a single
+long sentence does not make a whole batch of short ones pay for its padding.
+`encode_by_length` returns the embeddings in the original order.
+"""
+from typing import Callable, List, Sequence
+
+import numpy as np
+
+MAX_TOKENS = 8000
+MAX_SENTENCES = 128
+
+
+def length_batches(lengths: Sequence[int], max_tokens: int = MAX_TOKENS,
+                   max_sentences: int = MAX_SENTENCES) -> List[np.ndarray]:
+    """Returns the batches as arrays of positions into `lengths`, shortest first.
+
+    A sentence longer than max_tokens gets a batch of its own.
+    """
+    lengths = np.asarray(lengths, dtype=np.int64)
+    order = np.argsort(lengths, kind="stable")
+    batches = []
+    start = 0
+    for end in range(1, len(order) + 1):
+        # The last sentence of a batch is its longest one
+        if end - start > max_sentences or (
+                end - start > 1 and lengths[order[end - 1]] * (end - start) > max_tokens):
+            batches.append(order[start:end - 1])
+            start = end - 1
+    if start < len(order):
+        batches.append(order[start:])
+    return batches
+
+
+def padded_size(lengths: Sequence[int], batches: List[np.ndarray]) -> int:
+    """Total number of (padded) tokens fed to the encoder by the batches."""
+    lengths = np.asarray(lengths, dtype=np.int64)
+    return int(sum(len(batch) * lengths[batch].max() for batch in batches if len(batch)))
+
+
+def encode_by_length(texts: Sequence[str], encode_batch: Callable[[List[str]], np.ndarray],
+                     length: Callable[[str], int] = len, max_tokens: int = MAX_TOKENS,
+                     max_sentences: int = MAX_SENTENCES) -> np.ndarray:
+    """Encodes the texts in length-bucketed batches; the rows follow the order of `texts`."""
+    batches = length_batches([length(text) for text in texts], max_tokens, max_sentences)
+    embeddings = None
+    for batch in batches:
+        rows = encode_batch([texts[i] for i in batch.tolist()])
+        if embeddings is None:
+            embeddings = np.zeros((len(texts), rows.shape[1]), dtype=rows.dtype)
+        embeddings[batch] = rows
+    if embeddings is None:
+        raise ValueError("Nothing to encode.")
+    return embeddings
@@ -0,0 +1,77 @@
+"""Vectorized version of the similarity function from the original TextRank algorithm.
+
+For every pair of sentences the similarity is
+    |S_i ∩ S_j| / (log10|S_i| + log10|S_j|)
+where |S| counts every (filtered) word of the sentence, and the overlap counts
+distinct common words. All pairs are computed with one sparse matrix product.
+"""
+from typing import Dict, List, Sequence
+
+import numpy as np
+from scipy import sparse
+
+from compact_graph import CompactGraph
+
+
+def build_term_matrix(tokens: Sequence[str]) -> sparse.csr_matrix:
+    """Returns a sentence x term count matrix."""
+    vocab: Dict[str, int] = {}
+    indices: List[int] = []
+    indptr = [0]
+    for token in tokens:
+        for word in token.split():
+            indices.append(vocab.setdefault(word, len(vocab)))
+        indptr.append(len(indices))
+    matrix = sparse.csr_matrix(
+        (np.ones(len(indices), dtype=np.float64),
+         np.asarray(indices, dtype=np.int32),
+         np.asarray(indptr, dtype=np.int32)),
+        shape=(len(tokens), len(vocab)))
+    matrix.sum_duplicates()
+    return matrix
+
+
+def lexical_similarity_matrix(tokens: Sequence[str]) -> sparse.csr_matrix:
+    """Returns the (symmetric, zero-diagonal) similarity matrix of the sentence tokens."""
+    counts = build_term_matrix(tokens)
+    lengths = np.asarray(counts.sum(axis=1)).ravel()
+    presence = counts.copy()
+    presence.data[:] = 1
+    overlap = sparse.coo_matrix(presence @ presence.T)
+    off_diagonal = overlap.row != overlap.col
+    row = overlap.row[off_diagonal]
+    col = overlap.col[off_diagonal]
+    common = overlap.data[off_diagonal]
+    with np.errstate(divide="ignore"):
+        log_lengths = np.log10(lengths)
+    denominator = log_lengths[row] + log_lengths[col]
+    # Two single-word sentences have a zero denominator (similarity 0)
+    valid = denominator != 0
+    return sparse.csr_matrix(
+        (common[valid] / denominator[valid], (row[valid], col[valid])),
+        shape=(len(tokens), len(tokens)))
+
+
+def build_sentence_graph(tokens: Sequence[str]) -> CompactGraph:
+    """Builds the weighted sentence graph, with one node per distinct token."""
+    labels = list(dict.fromkeys(tokens))
+    return CompactGraph.from_similarity_matrix(labels, lexical_similarity_matrix(labels))
+
+
+def lexical_similarity_rows(presence: sparse.csr_matrix, lengths: np.ndarray,
+                            rows: Sequence[int]) -> np.ndarray:
+    """Returns the similarities of the given sentences to all sentences, as dense rows.
+
+    `presence` is the binary sentence x term matrix and `lengths` the number of
+    (filtered) words of every sentence.
+    """
+    rows = np.asarray(rows, dtype=np.int64)
+    common = (presence[rows] @ presence.T).toarray()
+    with np.errstate(divide="ignore"):
+        log_lengths = np.log10(np.asarray(lengths, dtype=np.float64))
+    denominator = log_lengths[rows][:, None] + log_lengths[None, :]
+    similarities = np.zeros_like(common, dtype=np.float64)
+    np.divide(common, denominator, out=similarities,
+              where=(common != 0) & (denominator != 0))
+    similarities[np.arange(len(rows)), rows] = 0
+    return similarities
@@ -0,0 +1,167 @@
+"""Dynamic micro-batching of sentence encoding requests.
+
+A `MicroBatcher` owns worker threads that collect the sentences of all the
+in-flight requests and send them to the encoder in shared batches. A batch
+is flushed once it holds `max_batch_size` sentences, or `max_wait` seconds
+after its first sentence was queued, whichever comes first. Each request gets
+a future of its own embeddings (in request order).
+
+The workers take turns collecting batches, but encode them concurrently: with
+one worker per encoder session, a batch is collected while the previous ones
+are being encoded.
+
+The batch sizes and the queueing delays are recorded in histograms (see
+`stats`), to tune max_batch_size and max_wait under load.
+"""
+import queue
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import Future
+from typing import Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+
+MAX_BATCH_SIZE = 64
+MAX_WAIT = 0.005
+BATCH_SIZE_BOUNDS = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+# In milliseconds
+WAIT_BOUNDS = (0.5, 1, 2, 5, 10, 20, 50, 100)
+
+BatcherStats = namedtuple(
+    "BatcherStats", ["n_batches", "n_sentences", "batch_sizes", "wait_ms"])
+
+
+class Histogram:
+    """Counts of the values falling under every upper bound (plus one overflow bucket)."""
+
+    def __init__(self, bounds: Sequence[float]):
+        self.bounds = tuple(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+
+    def add(self, value: float) -> None:
+        self.counts[int(np.searchsorted(self.bounds, value))] += 1
+
+    def as_dict(self) -> Dict[str, int]:
+        labels = ["<=%g" % bound for bound in self.bounds] + [">%g" % self.bounds[-1]]
+        return dict(zip(labels, self.counts))
+
+
+class _Request:
+    def __init__(self, n_sentences: int):
+        self.future: Future = Future()
+        self.rows: List[Optional[np.ndarray]] = [None] * n_sentences
+        self.remaining = n_sentences
+        # The batches of a request may be encoded by several workers
+        self.lock = threading.Lock()
+
+
+class MicroBatcher:
+    def __init__(self, encode: Callable[[List[str]], np.ndarray],
+                 max_batch_size: int = MAX_BATCH_SIZE, max_wait: float = MAX_WAIT,
+                 workers: int = 1):
+        """`encode` returns one embedding row per text.
+
+        It only runs in the worker threads, and up to `workers` calls run at once.
+        """
+        self.encode_batch = encode
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        # (request, position in the request, text, enqueue time), or None to stop
+        self._queue: "queue.Queue" = queue.Queue()
+        self._lock = threading.Lock()
+        # One worker collects a batch at a time
+        self._collect_lock = threading.Lock()
+        self._batch_sizes = Histogram(BATCH_SIZE_BOUNDS)
+        self._wait_ms = Histogram(WAIT_BOUNDS)
+        self.n_batches = 0
+        self.n_sentences = 0
+        self._workers = [threading.Thread(target=self._run, daemon=True)
+                         for _ in range(max(workers, 1))]
+        for worker in self._workers:
+            worker.start()
+
+    def submit(self, texts: Sequence[str]) -> Future:
+        """Queues the texts. The future resolves to their embeddings (one row per text)."""
+        request = _Request(len(texts))
+        if not texts:
+            request.future.set_result(np.zeros((0, 0), dtype=np.float32))
+            return request.future
+        now = time.perf_counter()
+        for i, text in enumerate(texts):
+            self._queue.put((request, i, text, now))
+        return request.future
+
+    def encode(self, texts: Sequence[str]) -> np.ndarray:
+        return self.submit(texts).result()
+
+    def _collect(self, first) -> list:
+        batch = [first]
+        deadline = first[3] + self.max_wait
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - time.perf_counter()
+            try:
+                item = self._queue.get(timeout=timeout) if timeout > 0 else \
+                    self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                # Stops after this batch
+                self._queue.put(None)
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self) -> None:
+        while True:
+            with self._collect_lock:
+                first = self._queue.get()
+                if first is None:
+                    return
+                batch = self._collect(first)
+            flushed = time.perf_counter()
+            with self._lock:
+                self.n_batches += 1
+                self.n_sentences += len(batch)
+                self._batch_sizes.add(len(batch))
+                for item in batch:
+                    self._wait_ms.add((flushed - item[3]) * 1000)
+            try:
+                self._dispatch(batch)
+            except Exception as error:
+                # Whatever fails, the worker keeps running and the requests of
+                # the batch get the error instead of waiting forever
+                for request, *_ in batch:
+                    with request.lock:
+                        if not request.future.done():
+                            request.future.set_exception(error)
+
+    def _dispatch(self, batch: list) -> None:
+        """Encodes a batch and hands the rows to their requests."""
+        embeddings = self.encode_batch([item[2] for item in batch])
+        if len(embeddings) != len(batch):
+            raise ValueError("The encoder returned %d rows for %d sentences." % (
+                len(embeddings), len(batch)))
+        for (request, position, _, _), row in zip(batch, embeddings):
+            with request.lock:
+                if request.future.done():
+                    # Another batch of the request failed
+                    continue
+                request.rows[position] = row
+                request.remaining -= 1
+                if request.remaining == 0:
+                    request.future.set_result(np.stack(request.rows))
+
+    def close(self) -> None:
+        """Stops the workers once the queued sentences are encoded."""
+        for _ in self._workers:
+            self._queue.put(None)
+        for worker in self._workers:
+            worker.join()
+
+    @property
+    def stats(self) -> BatcherStats:
+        with self._lock:
+            return BatcherStats(
+                self.n_batches, self.n_sentences,
+                self._batch_sizes.as_dict(), self._wait_ms.as_dict())
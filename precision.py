@@ -0,0 +1,138 @@
+"""Reduced-precision storage and similarity products for sentence embeddings.
+
+An `EmbeddingMatrix` holds L2-normalized embeddings as float32, float16, or
+int8 with one float32 scale per row. The norms and the dot products are
+always accumulated in float32, one block of rows at a time, so no full
+float32 copy of the embeddings is made. With float16 and int8 the dense
+similarity matrix is stored as float16, which halves it (the sentence graph
+is ranked on that matrix directly, see compact_graph.DenseGraph); int8
+embeddings take a quarter of the memory of float32 ones.
+
+`accuracy_report` compares the rankings obtained at every precision with the
+float32 ones, and the peak memory of the scoring (benchmark_precision.py
+prints it for .npy embedding files).
+"""
+import tracemalloc
+from collections import namedtuple
+from typing import List, Optional
+
+import numpy as np
+
+PRECISIONS = ("float32", "float16", "int8")
+BLOCK_SIZE = 128
+
+PrecisionReport = namedtuple(
+    "PrecisionReport",
+    ["precision", "spearman", "top_k_overlap", "embedding_bytes", "peak_bytes"])
+
+
+def l2_normalize(embeddings: np.ndarray, copy: bool = False) -> np.ndarray:
+    """L2-normalizes the rows (in place unless `copy`), leaving zero rows as they are."""
+    if copy:
+        embeddings = np.array(embeddings, dtype=np.float32)
+    else:
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+    norms = np.sqrt(np.einsum("ij,ij->i", embeddings, embeddings))
+    norms[norms == 0] = 1
+    embeddings /= norms[:, None]
+    return embeddings
+
+
+class EmbeddingMatrix:
+    def __init__(self, values: np.ndarray, scales: Optional[np.ndarray] = None):
+        self.values = values
+        self.scales = scales
+
+    @classmethod
+    def from_float(cls, embeddings: np.ndarray, precision: str = "float32",
+                   normalize: bool = False) -> "EmbeddingMatrix":
+        if precision not in PRECISIONS:
+            raise ValueError("Valid precisions are: " + ", ".join(PRECISIONS))
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        if normalize:
+            embeddings = l2_normalize(embeddings, copy=True)
+        if precision != "int8":
+            return cls(embeddings.astype(precision, copy=False))
+        scales = np.abs(embeddings).max(axis=1) / 127
+        safe_scales = np.where(scales > 0, scales, 1)
+        values = np.rint(embeddings / safe_scales[:, None]).astype(np.int8)
+        return cls(values, scales.astype(np.float32))
+
+    @property
+    def precision(self) -> str:
+        return self.values.dtype.name
+
+    def __len__(self) -> int:
+        return self.values.shape[0]
+
+    @property
+    def nbytes(self) -> int:
+        return self.values.nbytes + (0 if self.scales is None else self.scales.nbytes)
+
+    def rows(self, start: int = 0, end: Optional[int] = None) -> np.ndarray:
+        """Returns rows start:end in float32."""
+        block = self.values[start:end].astype(np.float32)
+        if self.scales is not None:
+            block *= self.scales[start:end, None]
+        return block
+
+    def similarity_rows(self, start: int, end: int, block_size: int = BLOCK_SIZE) -> np.ndarray:
+        """Returns the float32 similarities between rows start:end and all the rows."""
+        if self.precision == "float32":
+            return self.values[start:end] @ self.values.T
+        block = self.rows(start, end)
+        similarities = np.empty((end - start, len(self)), dtype=np.float32)
+        for column in range(0, len(self), block_size):
+            similarities[:, column:column + block_size] = \
+                block @ self.rows(column, column + block_size).T
+        return similarities
+
+    def similarities(self, block_size: int = BLOCK_SIZE) -> np.ndarray:
+        """Dense similarity matrix: float32 for float32 embeddings, float16 otherwise."""
+        if self.precision == "float32":
+            return self.values @ self.values.T
+        similarities = np.empty((len(self), len(self)), dtype=np.float16)
+        for start in range(0, len(self), block_size):
+            end = min(start + block_size, len(self))
+            similarities[start:end] = self.similarity_rows(start, end, block_size)
+        return similarities
+
+
+def accuracy_report(embeddings: np.ndarray, knn: Optional[int] = None, top_k: int = 10,
+                    precisions=PRECISIONS) -> List[PrecisionReport]:
+    """Ranks the sentences at every precision and compares with float32.
+
+    `top_k_overlap` is the fraction of the float32 top_k sentences also found
+    in the top_k at the given precision. `peak_bytes` is the peak memory
+    allocated by the whole score_embedded_sentences call (traced with tracemalloc).
+    """
+    # Imported here: embedding_graph imports this module
+    from summa.syntactic_unit import SyntacticUnit
+    from embedding_graph import score_embedded_sentences
+    from knn_graph import rank_correlation
+    from ranking import top_k_indices
+
+    embeddings = l2_normalize(embeddings, copy=True)
+
+    def rank(dtype):
+        sentences = [SyntacticUnit(str(i), token=i) for i in range(len(embeddings))]
+        tracemalloc.start()
+        try:
+            score_embedded_sentences(sentences, embeddings, knn, dtype)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        return np.asarray([x.score for x in sentences]), peak
+
+    reference, _ = rank("float32")
+    reference_top = set(top_k_indices(reference, top_k).tolist())
+    reports = []
+    for dtype in precisions:
+        scores, peak = rank(dtype)
+        top = set(top_k_indices(scores, top_k).tolist())
+        reports.append(PrecisionReport(
+            dtype, rank_correlation(scores, reference),
+            len(top & reference_top) / max(len(reference_top), 1),
+            EmbeddingMatrix.from_float(embeddings, dtype).nbytes, peak))
+    return reports
+
@@ -0,0 +1,226 @@
+"""Damped power-iteration PageRank on sparse (CSR) adjacency matrices.
+
+A replacement for summa.pagerank_weighted.pagerank_weighted_scipy, which
+densifies the graph into an N x N matrix and runs a full eigen-decomposition.
+Scores are scaled to unit L2 norm, the same scale as the principal
+eigenvector returned by the summa implementation.
+"""
+from collections import namedtuple
+from typing import Callable, Dict, Hashable, List, Optional, Tuple, Union
+
+import numpy as np
+from scipy import sparse
+import summa.graph
+
+from compact_graph import DENSE_BLOCK_ROWS, CompactGraph, DenseGraph
+
+DAMPING = 0.85
+CONVERGENCE_THRESHOLD = 1e-8
+MAX_ITERATIONS = 200
+
+# iterations_saved is an estimate of how many more iterations reaching `tol`
+# would have taken when the top-k early exit kicked in.
+RankingStats = namedtuple(
+    "RankingStats", ["iterations", "residual", "stopped_early", "iterations_saved"])
+
+
+def graph_to_adjacency(graph: Union[summa.graph.Graph, CompactGraph, DenseGraph]
+                       ) -> Tuple[Union[sparse.csr_matrix, np.ndarray], List[Hashable]]:
+    """Converts a summa graph into a symmetric CSR matrix, in graph.nodes() order.
+
+    Compact and dense graphs return their own adjacency matrix.
+    """
+    if isinstance(graph, (CompactGraph, DenseGraph)):
+        return graph.adjacency, graph.labels
+    nodes = graph.nodes()
+    index = {node: i for i, node in enumerate(nodes)}
+    rows: List[int] = []
+    cols: List[int] = []
+    weights: List[float] = []
+    for i, node in enumerate(nodes):
+        for neighbor in graph.neighbors(node):
+            rows.append(i)
+            cols.append(index[neighbor])
+            weights.append(graph.edge_weight((node, neighbor)))
+    adjacency = sparse.csr_matrix(
+        (np.asarray(weights, dtype=np.float64), (rows, cols)),
+        shape=(len(nodes), len(nodes)))
+    return adjacency, nodes
+
+
+def transition_matrix(adjacency: sparse.spmatrix) -> Tuple[sparse.csr_matrix, np.ndarray]:
+    """Row-normalizes the adjacency matrix.
+
+    Self-loops count towards the degree of a node but are not followed, which
+    mirrors summa.pagerank_weighted.build_adjacency_matrix. Non-positive weights
+    (e.g. negative cosine similarities) are dropped, so that the degrees stay
+    positive; a node left without edges becomes dangling.
+    Returns the transition matrix and the indices of the dangling nodes.
+    """
+    adjacency = sparse.csr_matrix(adjacency, dtype=np.float64, copy=True)
+    np.maximum(adjacency.data, 0, out=adjacency.data)
+    adjacency.eliminate_zeros()
+    degrees = np.asarray(adjacency.sum(axis=1)).ravel()
+    dangling_nodes = np.flatnonzero(degrees == 0)
+    inverse_degrees = np.zeros_like(degrees)
+    np.divide(1., degrees, out=inverse_degrees, where=degrees != 0)
+    transition = sparse.diags(inverse_degrees) @ adjacency
+    transition.setdiag(0)
+    transition.eliminate_zeros()
+    return transition.tocsr(), dangling_nodes
+
+
+def dense_transition(adjacency: np.ndarray, block_rows: int = DENSE_BLOCK_ROWS
+                     ) -> Tuple[Callable[[np.ndarray], np.ndarray], np.ndarray]:
+    """Same as transition_matrix for a dense adjacency matrix, which is never copied whole.
+
+    Returns a function computing `transition.T @ x` (reading the matrix a few
+    rows at a time) and the indices of the dangling nodes.
+    """
+    size = adjacency.shape[0]
+
+    def blocks():
+        for start in range(0, size, block_rows):
+            block = adjacency[start:start + block_rows].astype(np.float64)
+            yield start, np.maximum(block, 0, out=block)
+
+    degrees = np.zeros(size)
+    for start, block in blocks():
+        degrees[start:start + len(block)] = block.sum(axis=1)
+    diagonal = np.maximum(np.diagonal(adjacency).astype(np.float64), 0)
+    dangling_nodes = np.flatnonzero(degrees == 0)
+    inverse_degrees = np.zeros_like(degrees)
+    np.divide(1., degrees, out=inverse_degrees, where=degrees != 0)
+
+    def transposed_product(vector):
+        weighted = vector * inverse_degrees
+        # Self-loops are not followed
+        result = -diagonal * weighted
+        for start, block in blocks():
+            result += block.T @ weighted[start:start + len(block)]
+        return result
+
+    return transposed_product, dangling_nodes
+
+
+def top_k_indices(scores: np.ndarray, k: int) -> np.ndarray:
+    """Returns the indices of the k highest scores, best first, using partial selection.
+
+    Ties are broken by the index, like a stable descending sort.
+    """
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.zeros(0, dtype=np.int64)
+    # The k-th highest score; every score tied with it stays a candidate, so
+    # that the lowest indices win the ties at the boundary
+    threshold = scores[np.argpartition(-scores, k - 1)[k - 1]]
+    candidates = np.flatnonzero(scores >= threshold)
+    return candidates[np.lexsort((candidates, -scores[candidates]))[:k]]
+
+
+def power_iteration(
+        adjacency: Union[sparse.spmatrix, np.ndarray], damping: float = DAMPING,
+        tol: float = CONVERGENCE_THRESHOLD, max_iter: int = MAX_ITERATIONS,
+        initial: Optional[np.ndarray] = None,
+        dangling: Optional[np.ndarray] = None,
+        top_k: Optional[int] = None,
+        patience: Optional[int] = None) -> Tuple[np.ndarray, RankingStats]:
+    """Runs damped power iteration on a (weighted) adjacency matrix.
+
+    Parameters
+    ----------
+    adjacency: a sparse matrix, or a dense array (e.g. float16 similarities)
+        that is read a few rows at a time.
+    tol: stops when the L1 change of the normalized score vector is below it.
+    max_iter: the iteration cap.
+    initial: optional warm-start vector (e.g. the scores of a previous run).
+    dangling: how the score of nodes without edges is redistributed.
+        Defaults to uniformly.
+    top_k, patience: when both are set, also stops once the identity and order
+        of the top_k nodes have not changed for `patience` iterations.
+
+    Returns the scores (unit L2 norm) and the RankingStats of the run.
+    """
+    size = adjacency.shape[0]
+    if size == 0:
+        return np.zeros(0), RankingStats(0, 0., False, 0)
+    if isinstance(adjacency, np.ndarray):
+        transposed_product, dangling_nodes = dense_transition(adjacency)
+    else:
+        transition, dangling_nodes = transition_matrix(adjacency)
+        transposed_product = transition.T.tocsr().__matmul__
+    if dangling is None:
+        dangling = np.full(size, 1. / size)
+    else:
+        dangling = np.asarray(dangling, dtype=np.float64) / np.sum(dangling)
+    if initial is None:
+        scores = np.full(size, 1. / size)
+    else:
+        scores = np.abs(np.asarray(initial, dtype=np.float64))
+        total = scores.sum()
+        if total > 0 and np.isfinite(total):
+            scores /= total
+        else:
+            scores = np.full(size, 1. / size)
+    early_exit = bool(top_k) and bool(patience)
+    leaders, stable_iterations = None, 0
+    iteration, residual, stopped_early = 0, 0., False
+    rate = damping
+    for iteration in range(1, max_iter + 1):
+        previous, previous_residual = scores, residual
+        scores = damping * (
+            transposed_product(previous) + previous[dangling_nodes].sum() * dangling
+        ) + (1 - damping) / size
+        # Positive as long as damping < 1: the teleport term is added to every node
+        scores /= max(scores.sum(), np.finfo(np.float64).tiny)
+        residual = np.abs(scores - previous).sum()
+        if residual < tol:
+            break
+        if 0 < residual < previous_residual:
+            rate = residual / previous_residual
+        if early_exit:
+            current = top_k_indices(scores, top_k)
+            if leaders is not None and np.array_equal(current, leaders):
+                stable_iterations += 1
+            else:
+                leaders, stable_iterations = current, 0
+            if stable_iterations >= patience:
+                stopped_early = True
+                break
+    iterations_saved = 0
+    if stopped_early:
+        # Extrapolates with the last observed contraction rate of the residual
+        iterations_saved = max(0, min(
+            max_iter - iteration,
+            int(np.ceil(np.log(tol / residual) / np.log(rate)))))
+    return scores / np.linalg.norm(scores), RankingStats(
+        iteration, residual, stopped_early, iterations_saved)
+
+
+def rank_nodes(graph: Union[summa.graph.Graph, CompactGraph, DenseGraph], damping: float = DAMPING,
+               tol: float = CONVERGENCE_THRESHOLD, max_iter: int = MAX_ITERATIONS,
+               initial: Optional[Dict[Hashable, float]] = None,
+               top_k: Optional[int] = None, patience: Optional[int] = None
+               ) -> Tuple[np.ndarray, Dict[Hashable, float], RankingStats]:
+    """Returns the score array (in graph.nodes() order), a dict of node -> score
+    and the RankingStats of the run.
+
+    `initial` can be the dict returned by a previous run. Nodes missing from it
+    start from the mean of the known scores.
+    """
+    adjacency, nodes = graph_to_adjacency(graph)
+    initial_vector = None
+    if initial:
+        fallback = np.mean(list(initial.values()))
+        initial_vector = np.asarray(
+            [initial.get(node, fallback) for node in nodes])
+    scores, stats = power_iteration(
+        adjacency, damping=damping, tol=tol, max_iter=max_iter,
+        initial=initial_vector, top_k=top_k, patience=patience)
+    return scores, dict(zip(nodes, scores.tolist())), stats
+
+
+def pagerank_weighted(graph: Union[summa.graph.Graph, CompactGraph, DenseGraph], damping: float = DAMPING,
+                      **kwargs) -> Dict[Hashable, float]:
+    """Drop-in replacement for summa.pagerank_weighted.pagerank_weighted_scipy."""
+    return rank_nodes(graph, damping=damping, **kwargs)[1]
@@ -0,0 +1,201 @@
+"""Content-addressed cache for summarization results.
+
+Entries are keyed by a hash of (text, model, stopwords, pipeline version) and
+stored pickled: every `get` returns fresh objects (callers are free to mutate
+the sentence units) and the memory tier is bounded by the pickled size, with
+least-recently-used eviction. An optional directory adds an on-disk tier that
+survives restarts; entries evicted from memory stay on disk. The disk tier is
+bounded too, evicting the files least recently used (by mtime). Every file
+starts with a header line holding the pipeline version and a digest of the
+pickle, and files that do not match are deleted instead of loaded.
+
+Bump PIPELINE_VERSION whenever a change to the pipelines changes their output.
+"""
+import hashlib
+import json
+import os
+import pickle
+import tempfile
+import threading
+from collections import OrderedDict, namedtuple
+from pathlib import Path
+from typing import Any, Callable, Optional, Sequence, Union
+
+PIPELINE_VERSION = "2"
+MAX_BYTES = 256 * 1024 * 1024
+MAX_DISK_BYTES = 4 * 1024 * 1024 * 1024
+
+CacheStats = namedtuple(
+    "CacheStats",
+    ["hits", "misses", "disk_hits", "entries", "size_bytes", "disk_entries", "disk_bytes"])
+
+
+def make_key(text: str, model: str, additional_stopwords: Optional[Sequence[str]] = None,
+             version: str = PIPELINE_VERSION) -> str:
+    payload = json.dumps(
+        [version, model, sorted(additional_stopwords) if additional_stopwords else None, text],
+        ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResultCache:
+    def __init__(self, max_bytes: int = MAX_BYTES,
+                 directory: Optional[Union[str, Path]] = None,
+                 max_disk_bytes: int = MAX_DISK_BYTES, version: str = PIPELINE_VERSION):
+        self.max_bytes = max_bytes
+        self.max_disk_bytes = max_disk_bytes
+        self.version = version
+        self.directory = Path(directory) if directory else None
+        self._entries: "OrderedDict[str, bytes]" = OrderedDict()
+        self._size = 0
+        # key -> file size, least recently used first
+        self._files: "OrderedDict[str, int]" = OrderedDict()
+        self._disk_size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.disk_hits = 0
+        if self.directory:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            self._scan()
+
+    def _path(self, key: str) -> Path:
+        return self.directory / key[:2] / (key + ".pkl")
+
+    def _scan(self) -> None:
+        """Indexes the files of the directory, oldest first."""
+        files = []
+        for path in self.directory.glob("*/*.pkl"):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            files.append((stat.st_mtime, path.stem, stat.st_size))
+        for _, key, size in sorted(files):
+            self._files[key] = size
+            self._disk_size += size
+        with self._lock:
+            self._evict_files()
+
+    def _evict_files(self) -> None:
+        """Deletes the least recently used files over max_disk_bytes (under the lock)."""
+        while self._disk_size > self.max_disk_bytes and self._files:
+            key, size = self._files.popitem(last=False)
+            self._disk_size -= size
+            self._unlink(key)
+
+    def _forget_file(self, key: str) -> None:
+        """Drops a file from the index and deletes it (under the lock)."""
+        self._disk_size -= self._files.pop(key, 0)
+        self._unlink(key)
+
+    def _unlink(self, key: str) -> None:
+        try:
+            self._path(key).unlink()
+        except OSError:
+            # Already deleted by another process sharing the directory
+            pass
+
+    def _header(self, data: bytes) -> bytes:
+        return ("%s %s\n" % (self.version, hashlib.sha256(data).hexdigest())).encode("ascii")
+
+    def _read_file(self, key: str) -> Optional[bytes]:
+        """Returns the pickle of a file, or None if it is missing or does not check out."""
+        path = self._path(key)
+        try:
+            contents = path.read_bytes()
+        except OSError:
+            with self._lock:
+                self._disk_size -= self._files.pop(key, 0)
+            return None
+        header, _, data = contents.partition(b"\n")
+        if header + b"\n" != self._header(data):
+            with self._lock:
+                self._forget_file(key)
+            return None
+        try:
+            # Marks the file as recently used for the next _scan
+            os.utime(str(path))
+        except OSError:
+            pass
+        with self._lock:
+            self._disk_size -= self._files.pop(key, 0)
+            self._files[key] = len(contents)
+            self._disk_size += len(contents)
+        return data
+
+    def _remember(self, key: str, data: bytes) -> None:
+        """Inserts into the memory tier (under the lock) and evicts the LRU entries."""
+        if key in self._entries:
+            self._size -= len(self._entries.pop(key))
+        if len(data) > self.max_bytes:
+            return
+        self._entries[key] = data
+        self._size += len(data)
+        while self._size > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._size -= len(evicted)
+
+    def get(self, key: str) -> Optional[Any]:
+        """Returns a fresh copy of the cached value, or None."""
+        with self._lock:
+            data = self._entries.get(key)
+            if data is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+        if data is None and self.directory:
+            data = self._read_file(key)
+            if data is not None:
+                with self._lock:
+                    self._remember(key, data)
+                    self.hits += 1
+                    self.disk_hits += 1
+        if data is None:
+            with self._lock:
+                self.misses += 1
+            return None
+        return pickle.loads(data)
+
+    def put(self, key: str, value: Any) -> None:
+        data = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        with self._lock:
+            self._remember(key, data)
+        if self.directory:
+            path = self._path(key)
+            path.parent.mkdir(exist_ok=True)
+            # Writes atomically, so that readers never see partial files
+            header = self._header(data)
+            handle, tmp_path = tempfile.mkstemp(dir=str(path.parent))
+            with os.fdopen(handle, "wb") as fout:
+                fout.write(header)
+                fout.write(data)
+            os.replace(tmp_path, str(path))
+            with self._lock:
+                self._disk_size -= self._files.pop(key, 0)
+                self._files[key] = len(header) + len(data)
+                self._disk_size += len(header) + len(data)
+                self._evict_files()
+
+    def get_or_compute(self, key: str, compute: Callable[[], Any]) -> Any:
+        value = self.get(key)
+        if value is None:
+            value = compute()
+            self.put(key, value)
+        return value
+
+    def clear(self, disk: bool = False) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+            if disk and self.directory:
+                for path in self.directory.glob("*/*.pkl"):
+                    path.unlink()
+                self._files.clear()
+                self._disk_size = 0
+
+    @property
+    def stats(self) -> CacheStats:
+        with self._lock:
+            return CacheStats(
+                self.hits, self.misses, self.disk_hits, len(self._entries), self._size,
+                len(self._files), self._disk_size)
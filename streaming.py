@@ -0,0 +1,156 @@
+"""Windowed summarization for inputs too long to rank as a single graph.
+
+The paragraphs are consumed lazily and cut into sentences, which are ranked
+inside windows of at most `window_size` sentences. Consecutive windows share
+`overlap` sentences, so the sentences at a window boundary are ranked with
+context from both sides (their scores are averaged). Window scores are divided
+by the window mean before they are merged, making scores from windows of
+different sizes and densities comparable.
+
+Only the current window and the global top_k candidates are kept in memory, so
+the peak memory (and the size of any similarity matrix built by a scorer) is
+bounded by `window_size`, not by the length of the document.
+"""
+import heapq
+import itertools
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+from langdetect import detect
+from summa.syntactic_unit import SyntacticUnit
+
+WINDOW_SIZE = 400
+OVERLAP = 100
+TOP_K = 10
+# Minimum number of characters buffered before detecting the language
+DETECTION_CHARS = 1000
+
+# Cuts one paragraph into sentence units, given the language
+ParagraphCutter = Callable[[str, str], List[SyntacticUnit]]
+# Sets the `score` attribute of every sentence unit of the window
+WindowScorer = Callable[[List[SyntacticUnit], str], None]
+
+
+def detect_language(paragraphs: Iterable[str], min_chars: int = DETECTION_CHARS
+                    ) -> Tuple[str, Iterator[str]]:
+    """Detects the language from the first paragraphs.
+
+    Returns the language and an iterator over all the paragraphs (the buffered
+    ones included).
+    """
+    paragraphs = iter(paragraphs)
+    buffered: List[str] = []
+    n_chars = 0
+    for paragraph in paragraphs:
+        buffered.append(paragraph)
+        n_chars += len(paragraph)
+        if n_chars >= min_chars:
+            break
+    if n_chars == 0:
+        raise ValueError("No text to summarize.")
+    return detect("\n".join(buffered))[:2], itertools.chain(buffered, paragraphs)
+
+
+def iter_sentences(paragraphs: Iterable[str], lang: str,
+                   cut_paragraph: ParagraphCutter) -> Iterator[SyntacticUnit]:
+    """Yields the sentence units of every paragraph, numbering the (non-empty) paragraphs."""
+    paragraph_index = 0
+    for text in paragraphs:
+        # Generators of whole documents are also accepted
+        for paragraph in text.split("\n"):
+            if not paragraph.strip():
+                continue
+            sentences = cut_paragraph(paragraph, lang)
+            if not sentences:
+                continue
+            for sentence in sentences:
+                sentence.paragraph = paragraph_index
+            paragraph_index += 1
+            yield from sentences
+
+
+def normalize_window_scores(scores: np.ndarray) -> np.ndarray:
+    """Divides the scores by the mean of the positive ones."""
+    positive = scores[scores > 0]
+    if len(positive) == 0:
+        return np.zeros_like(scores)
+    return np.maximum(scores, 0) / positive.mean()
+
+
+def rank_windows(sentences: Iterable[SyntacticUnit], lang: str, score_window: WindowScorer,
+                 window_size: int = WINDOW_SIZE, overlap: int = OVERLAP
+                 ) -> Iterator[List[SyntacticUnit]]:
+    """Ranks the sentences window by window.
+
+    After every window, yields the sentences that will not appear in any later
+    window, with their merged (normalized) scores.
+    """
+    if window_size < 2:
+        raise ValueError("window_size must be at least 2.")
+    if not 0 <= overlap < window_size:
+        raise ValueError("overlap must be in [0, window_size).")
+    window: List[SyntacticUnit] = []
+    # id(sentence) -> (score sum, count) of the sentences carried over
+    partial: Dict[int, Tuple[float, int]] = {}
+    n_new = 0
+
+    def score(final: bool) -> List[SyntacticUnit]:
+        score_window(window, lang)
+        scores = normalize_window_scores(
+            np.asarray([sentence.score for sentence in window], dtype=np.float64))
+        n_done = len(window) if final else len(window) - overlap
+        for i, (sentence, value) in enumerate(zip(window, scores.tolist())):
+            total, count = partial.pop(id(sentence), (0., 0))
+            total, count = total + value, count + 1
+            if i < n_done:
+                sentence.score = total / count
+            else:
+                partial[id(sentence)] = (total, count)
+        return window[:n_done]
+
+    for sentence in sentences:
+        window.append(sentence)
+        n_new += 1
+        if len(window) == window_size:
+            yield score(final=False)
+            window = window[len(window) - overlap:]
+            n_new = 0
+    if n_new:
+        yield score(final=True)
+    elif window:
+        # The overlap of the last full window has already been scored
+        for sentence in window:
+            total, count = partial.pop(id(sentence))
+            sentence.score = total / count
+        yield window
+
+
+def summarize_stream(paragraphs: Iterable[str], score_window: WindowScorer,
+                     cut_paragraph: ParagraphCutter, lang: Optional[str] = None,
+                     languages: Optional[Sequence[str]] = None,
+                     window_size: int = WINDOW_SIZE, overlap: int = OVERLAP,
+                     top_k: int = TOP_K) -> Iterator[List[SyntacticUnit]]:
+    """Yields the top_k sentences seen so far (best first) after every window.
+
+    The last list yielded is the final ranking. The language is detected from
+    the first paragraphs unless `lang` is given.
+    """
+    if lang is None:
+        lang, paragraphs = detect_language(paragraphs)
+    if languages is not None and lang not in languages:
+        raise ValueError("Language not suppored! (supported languages: %s)" % ", ".join(
+            x for x in languages if x != "ko"))
+    # Min-heap of (score, -position, sentence); earlier sentences win ties
+    heap: List[Tuple[float, int, SyntacticUnit]] = []
+    position = 0
+    for finished in rank_windows(
+            iter_sentences(paragraphs, lang, cut_paragraph), lang, score_window,
+            window_size=window_size, overlap=overlap):
+        for sentence in finished:
+            item = (sentence.score, -position, sentence)
+            position += 1
+            if len(heap) < top_k:
+                heapq.heappush(heap, item)
+            elif item[:2] > heap[0][:2]:
+                heapq.heapreplace(heap, item)
+        yield [item[2] for item in sorted(heap, key=lambda x: x[:2], reverse=True)]
@@ -1,81 +1,87 @@
 """Using similarity function from the original TextRank algorithm."""
-from langdetect import detect
-from summa.pagerank_weighted import pagerank_weighted_scipy as _pagerank
+from functools import partial
+
+import numpy as np
 # from summa.preprocessing.textcleaner import clean_text_by_sentences as _clean_text_by_sentences
-from text_cleaning_en import clean_text_by_sentences as en_clean_text_by_sentences
-from summa.commons import build_graph as _build_graph
-from summa.commons import remove_unreachable_nodes as _remove_unreachable_nodes
-from summa.summarizer import _set_graph_edge_weights, _add_scores_to_sentences
-
-# Optional Dependencies
-try:
-    from text_cleaning_zh import clean_and_cut_sentences as zh_clean_and_cut_sentences
-    ZH_SUPPORT = True
-except ImportError:
-    ZH_SUPPORT = False
-
-try:
-    from text_cleaning_ja import clean_and_cut_sentences as ja_clean_and_cut_sentences
-    JA_SUPPORT = True
-except ImportError:
-    JA_SUPPORT = False
-
-
-def summarize(text, additional_stopwords=None):
-    if not isinstance(text, str):
-        raise ValueError("Text parameter must be a Unicode object (str)!")
-
-    lang = detect(text)[:2]
-    if lang == "en":
-        paragraphs = text.split("\n")
-        sentences = []
-        paragraph_index = 0
-        for paragraph in paragraphs:
-            # Gets a list of processed sentences.
-            if paragraph:
-                tmp = en_clean_text_by_sentences(
-                    paragraph, additional_stopwords)
-                # tmp = _clean_text_by_sentences(
-                #     paragraph, "english")
-                if tmp:
-                    for sent in tmp:
-                        sent.paragraph = paragraph_index
-                    sentences += tmp
-                    paragraph_index += 1
-    elif lang == "zh" or lang == "ko":  # zh-Hant sometimes got misclassified into ko
-        if not ZH_SUPPORT:
-            raise ImportError("Missing dependencies for Chinese support.")
-        sentences = zh_clean_and_cut_sentences(text)
-    elif lang == "ja":
-        if not JA_SUPPORT:
-            raise ImportError("Missing dependencies for Japanese support.")
-        sentences = ja_clean_and_cut_sentences(text)
-    else:
-        return ["Language not suppored! (supported languages: en, zh, ja)"], None, lang
+from document_analysis import DocumentAnalysis, SUPPORTED_LANGUAGES, cut_paragraph_sentences
+from lexical_similarity import build_sentence_graph
+from ranking import rank_nodes as _rank_nodes, top_k_indices
+import streaming
+from summa.summarizer import _add_scores_to_sentences
 
+
+def score_sentences(sentences, top_k=None, patience=None):
+    """Sets the `score` of the sentence units. Returns the ranked graph (None if empty)."""
     # Creates the graph and calculates the similarity coefficient for every pair of nodes.
-    graph = _build_graph(
+    graph = build_sentence_graph(
         [sentence.token for sentence in sentences if sentence.token and len(sentence.token) > 2])
-    _set_graph_edge_weights(graph)
 
     # Remove all nodes with all edges weights equal to zero.
-    _remove_unreachable_nodes(graph)
+    graph.remove_unreachable_nodes()
 
     # PageRank cannot be run in an empty graph.
-    if len(graph.nodes()) == 0:
-        return []
+    if len(graph) == 0:
+        for sentence in sentences:
+            sentence.score = 0
+        return None
 
     # Ranks the tokens using the PageRank algorithm. Returns dict of sentence -> score
-    pagerank_scores = _pagerank(graph)
+    _, pagerank_scores, graph.ranking_stats = _rank_nodes(
+        graph, top_k=top_k, patience=patience)
 
     # Adds the summa scores to the sentence objects.
     _add_scores_to_sentences(sentences, pagerank_scores)
+    return graph
+
+
+def summarize(text, additional_stopwords=None, top_k=None, patience=None):
+    """Accepts either the raw text or a DocumentAnalysis of it.
+
+    With `top_k`, only the top_k sentences are sorted (by partial selection) and
+    placed first; the rest follow in document order. With `patience` as well,
+    PageRank stops once the top_k sentences have kept their order for that many
+    iterations. The ranking statistics are stored as `graph.ranking_stats`.
+    """
+    if isinstance(text, DocumentAnalysis):
+        analysis = text
+    else:
+        analysis = DocumentAnalysis(text, additional_stopwords)
+
+    lang = analysis.lang
+    if lang not in SUPPORTED_LANGUAGES:
+        return ["Language not suppored! (supported languages: en, zh, ja)"], None, lang
+    sentences = analysis.sentence_units()
+
+    graph = score_sentences(sentences, top_k=top_k, patience=patience)
+    if graph is None:
+        return []
 
     # Sorts the sentences
-    sentences.sort(key=lambda s: s.score, reverse=True)
+    if top_k:
+        top = top_k_indices(np.array([s.score for s in sentences]), top_k)
+        picked = set(top.tolist())
+        sentences = [sentences[i] for i in top] + [
+            s for i, s in enumerate(sentences) if i not in picked]
+    else:
+        sentences.sort(key=lambda s: s.score, reverse=True)
     return sentences, graph, lang
 
 
+def summarize_stream(paragraphs, additional_stopwords=None, lang=None, **kwargs):
+    """Streaming version of `summarize` for book-length inputs.
+
+    `paragraphs` is any iterable of paragraphs (or larger chunks of text).
+    Yields the best sentences so far after every window; see
+    `streaming.summarize_stream` for the window_size, overlap and top_k options.
+    """
+    return streaming.summarize_stream(
+        paragraphs,
+        score_window=lambda sentences, _: score_sentences(sentences),
+        cut_paragraph=partial(
+            cut_paragraph_sentences, additional_stopwords=additional_stopwords),
+        lang=lang, languages=SUPPORTED_LANGUAGES, **kwargs)
+
+
 if __name__ == "__main__":
     res, _, lang = summarize("""Of all of President Trump’s former associates who have come under scrutiny in the special counsel’s Russia investigation, his former personal lawyer, Michael D. Cohen, has undertaken perhaps the most surprising and risky legal strategy.
 
@@ -1,102 +1,124 @@
 import os
-from pathlib import Path
 from functools import partial
+from pathlib import Path
 
-from langdetect import detect
 import numpy as np
-from sklearn.preprocessing import normalize
-from summa.pagerank_weighted import pagerank_weighted_scipy as _pagerank
-from summa.commons import remove_unreachable_nodes as _remove_unreachable_nodes
-from summa.summarizer import _set_graph_edge_weights, _add_scores_to_sentences
-from summa.commons import build_graph as _build_graph
 
-from text_cleaning_en import clean_text_by_sentences as _clean_text_by_sentences
-from summa_score_sentences_use import cut_sentences_by_rule, cosine_similarity
+from document_analysis import DocumentAnalysis, cut_paragraph_sentences
+from embedding_cache import EMBEDDING_CACHE
+from embedding_graph import score_embedded_sentences, similarity_matrix
+from precision import l2_normalize
+import streaming
+from summa_score_sentences_use import cut_sentences_by_rule
 
 MODEL_PATH = Path(os.environ["LASER"]) / "models/"
 
 
-def attach_sentence_embeddings(lang, sentences, batch_size=32):
+def _encode_texts(lang, texts, batch_size=32):
     from laser.shortcuts import lines_to_embeddings
 
-    # don't use extremely short sentences
-    sentences_subset = [x for x in sentences if len(x.text) > 5]
-    sentence_embeddings_subset = lines_to_embeddings(
+    embeddings = lines_to_embeddings(
         lang,
-        [x.text for x in sentences_subset],
+        texts,
         str(MODEL_PATH / "bilstm.93langs.2018-12-26.pt"),
         str(MODEL_PATH / "93langs.fcodes"),
         use_cpu=False,
         batch_size=batch_size
-    ).reshape(len(sentences_subset), -1)
-    # print(len(sentences_subset))
-    # print(sentence_embeddings_subset.shape)
-    # l2 normalize
-    sentence_embeddings_subset = normalize(
-        sentence_embeddings_subset, norm="l2", axis=1, copy=False, return_norm=False
-    )
+    ).reshape(len(texts), -1)
+    # l2 normalize (in place, accumulating in float32)
+    return l2_normalize(embeddings)
+
+
+def encode_sentences(lang, sentences, batch_size=32):
+    """Returns one (L2-normalized) embedding per sentence unit, in the same order.
+
+    Extremely short sentences get a zero embedding. The embeddings go through
+    the shared EMBEDDING_CACHE, so only unseen sentences are encoded.
+    """
+    # don't use extremely short sentences
+    positions = [i for i, x in enumerate(sentences) if len(x.text) > 5]
+    sentence_embeddings_subset = EMBEDDING_CACHE.encode(
+        "laser-" + lang, [sentences[i].text for i in positions],
+        partial(_encode_texts, lang, batch_size=batch_size))
     sentence_embeddings = np.zeros(
         (len(sentences), sentence_embeddings_subset.shape[1]), dtype="float32")
-    # A rather hacky way to attach embeddings
-    for i, sentence in enumerate(sentences_subset):
-        sentence_embeddings[sentence.token, :] = (
-            sentence_embeddings_subset[i, :])
-    similarities = sentence_embeddings @ sentence_embeddings.T
-    # print(similarities[np.tril_indices(similarities.shape[0], k=-1)])
-    # print(np.where(np.tril(similarities, k=-1) > 0.95))
-    return similarities
+    sentence_embeddings[positions, :] = sentence_embeddings_subset
+    return sentence_embeddings
+
+
+def attach_sentence_embeddings(lang, sentences, batch_size=32, knn=None):
+    """Returns the similarity matrix of the sentences.
+
+    Dense by default; with `knn`, a sparse matrix keeping only the top-knn
+    neighbours of every sentence.
+    """
+    return similarity_matrix(encode_sentences(lang, sentences, batch_size=batch_size), knn)
+
+
+def score_sentences(lang, sentences, knn=None):
+    """Sets the `score` of the sentence units. Returns the ranked graph (None if empty).
 
+    With `knn`, every sentence is only linked to its knn most similar sentences.
+    """
+    for i, sent in enumerate(sentences):
+        # Hacky way to overwrite token
+        sent.token = i
+    return score_embedded_sentences(
+        sentences, encode_sentences(lang, sentences, batch_size=32), knn=knn)
 
-def summarize(text, additional_stopwords=None):
-    if not isinstance(text, str):
-        raise ValueError("Text parameter must be a Unicode object (str)!")
 
-    lang = detect(text)[:2]
+def get_sentence_units(analysis):
+    """Returns the sentence units to encode (None if the language is not supported)."""
+    lang = analysis.lang
     if lang == "en":
-        paragraphs = text.split("\n")
-        sentences = []
-        paragraph_index = 0
-        for paragraph in paragraphs:
-            # Gets a list of processed sentences.
-            if paragraph:
-                tmp = _clean_text_by_sentences(
-                    paragraph, additional_stopwords)
-                if tmp:
-                    for j, sent in enumerate(tmp):
-                        sent.paragraph = paragraph_index
-                        # Hacky way to overwrite token
-                        sent.token = len(sentences) + j
-                    sentences += tmp
-                    paragraph_index += 1
-    elif lang == "zh" or lang == "ko":  # zh-Hant sometimes got misclassified into ko
-        sentences = cut_sentences_by_rule(text)
-    elif lang == "ja":
+        return analysis.sentence_units()
+    if lang == "zh" or lang == "ko":  # zh-Hant sometimes got misclassified into ko
+        return cut_sentences_by_rule(analysis.text)
+    if lang == "ja":
         raise NotImplementedError("No ja support yet.")
-    else:
-        return ["Language not suppored! (supported languages: en, zh)"], None, lang
-    similarities = attach_sentence_embeddings(
-        lang, sentences,  batch_size=32)
-    graph = _build_graph([x.token for x in sentences])
-    _set_graph_edge_weights(graph, partial(cosine_similarity, similarities))
+    return None
 
-    # Remove all nodes with all edges weights equal to zero.
-    _remove_unreachable_nodes(graph)
 
-    # PageRank cannot be run in an empty graph.
-    if len(graph.nodes()) == 0:
-        return []
+def summarize(text, additional_stopwords=None, knn=None):
+    """Accepts either the raw text or a DocumentAnalysis of it."""
+    if isinstance(text, DocumentAnalysis):
+        analysis = text
+    else:
+        analysis = DocumentAnalysis(text, additional_stopwords)
 
-    # Ranks the tokens using the PageRank algorithm. Returns dict of sentence -> score
-    pagerank_scores = _pagerank(graph)
+    lang = analysis.lang
+    sentences = get_sentence_units(analysis)
+    if sentences is None:
+        return ["Language not suppored! (supported languages: en, zh)"], None, lang
 
-    # Adds the summa scores to the sentence objects.
-    _add_scores_to_sentences(sentences, pagerank_scores)
+    graph = score_sentences(lang, sentences, knn=knn)
+    if graph is None:
+        return []
 
     # Sorts the sentences
     sentences.sort(key=lambda s: s.score, reverse=True)
     return sentences, graph, lang
 
 
+def _cut_paragraph(paragraph, lang, additional_stopwords):
+    if lang == "zh" or lang == "ko":
+        return cut_sentences_by_rule(paragraph)
+    return cut_paragraph_sentences(paragraph, lang, additional_stopwords)
+
+
+def summarize_stream(paragraphs, additional_stopwords=None, lang=None, knn=None, **kwargs):
+    """Streaming version of `summarize` for book-length inputs.
+
+    Yields the best sentences so far after every window; see
+    `streaming.summarize_stream` for the window_size, overlap and top_k options.
+    """
+    return streaming.summarize_stream(
+        paragraphs,
+        score_window=lambda sentences, lang: score_sentences(lang, sentences, knn=knn),
+        cut_paragraph=partial(_cut_paragraph, additional_stopwords=additional_stopwords),
+        lang=lang, languages=("en", "zh", "ko"), **kwargs)
+
+
 if __name__ == "__main__":
     res, _, lang = summarize("""
 By Wednesday morning, he was trying to marry those two thoughts into a single message — both embracing the report and trashing it. “The Mueller Report, despite being written by Angry Democrats and Trump Haters, and with unlimited money behind it ($35,000,000), didn’t lay a glove on me,” he wrote. “I DID NOTHING WRONG.”
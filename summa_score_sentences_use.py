@@ -1,20 +1,23 @@
 """Using cosine similarity with sentence embeddings from Universal Sentence Encoder."""
 import os
 import logging
+import queue
+import threading
+from contextlib import contextmanager
 from functools import partial
-from typing import List
+from typing import Dict, Iterable, List, Optional
 
 import numpy as np
 import tensorflow as tf
 import tensorflow_hub as hub
-from langdetect import detect
-from summa.pagerank_weighted import pagerank_weighted_scipy as _pagerank
-from summa.commons import build_graph as _build_graph
-from summa.commons import remove_unreachable_nodes as _remove_unreachable_nodes
-from summa.summarizer import _set_graph_edge_weights, _add_scores_to_sentences
 from summa.syntactic_unit import SyntacticUnit
 
-from text_cleaning_en import clean_text_by_sentences as _clean_text_by_sentences
+from document_analysis import DocumentAnalysis, SUPPORTED_LANGUAGES, cut_paragraph_sentences
+from embedding_cache import EMBEDDING_CACHE
+from embedding_graph import score_embedded_sentences, similarity_matrix
+from length_batching import encode_by_length
+from micro_batcher import MicroBatcher
+import streaming
 
 # Optional Dependencies
 try:
@@ -23,12 +26,6 @@ try:
 except (ImportError, tf.errors.NotFoundError):
     pass
 
-try:
-    from text_cleaning_ja import clean_and_cut_sentences as ja_clean_and_cut_sentences
-    JA_SUPPORT = True
-except ImportError:
-    JA_SUPPORT = False
-
 
 tf.logging.set_verbosity(logging.WARNING)
 
@@ -38,6 +35,13 @@ MODELS = {
     # base does not work with GPU
     "base": "https://tfhub.dev/google/universal-sentence-encoder/2"
 }
+# Number of ready sessions per loaded model
+POOL_SIZE = 2
+# Micro-batching of the concurrent requests
+BATCH_MAX_SIZE = int(os.environ.get("USE_BATCH_MAX_SIZE", 64))
+BATCH_MAX_WAIT = float(os.environ.get("USE_BATCH_MAX_WAIT", 0.005))
+# Padded size budget of a batch, in characters (the sentences are bucketed by length)
+MAX_BATCH_CHARS = int(os.environ.get("USE_MAX_BATCH_CHARS", 8000))
 
 
 def cut_sentences_by_rule(text: str, sentence_delimiters: str = "。！？；"):
@@ -77,121 +81,269 @@ def cut_sentences_by_rule(text: str, sentence_delimiters: str = "。！？；"):
     return results
 
 
-def get_model(model_name="large"):
-    tf.reset_default_graph()
-    # Define graph
-    sentence_input = tf.placeholder(tf.string, shape=(None))
-    encoder = hub.Module(MODELS[model_name])
-    # For evaluation we use exactly normalized rather than
-    # approximately normalized.
-    sentence_emb = tf.nn.l2_normalize(encoder(sentence_input), axis=1)
-    return {"sentence_input": sentence_input, "sentence_emb": sentence_emb}
+class LoadedModel:
+    """A hub module loaded once into its own graph, with a pool of ready sessions."""
+
+    def __init__(self, model_name: str, pool_size: int = POOL_SIZE):
+        self.name = model_name
+        self.graph = tf.Graph()
+        with self.graph.as_default():
+            sentence_input = tf.placeholder(tf.string, shape=(None))
+            encoder = hub.Module(MODELS[model_name])
+            # For evaluation we use exactly normalized rather than
+            # approximately normalized.
+            sentence_emb = tf.nn.l2_normalize(encoder(sentence_input), axis=1)
+            init_op = tf.group(tf.global_variables_initializer(),
+                               tf.tables_initializer())
+        # Make the graph read-only
+        self.graph.finalize()
+        self.model = {"name": model_name, "sentence_input": sentence_input,
+                      "sentence_emb": sentence_emb}
+        self._sessions: "queue.Queue[tf.Session]" = queue.Queue()
+        self._all_sessions = []
+        for _ in range(pool_size):
+            session = tf.Session(graph=self.graph)
+            session.run(init_op)
+            self._sessions.put(session)
+            self._all_sessions.append(session)
+        self._batcher: Optional[MicroBatcher] = None
+        self._batcher_lock = threading.Lock()
+
+    @contextmanager
+    def session(self):
+        """Borrows a session from the pool (blocks while all of them are in use)."""
+        session = self._sessions.get()
+        try:
+            yield session
+        finally:
+            self._sessions.put(session)
+
+    def _run_batch(self, texts: List[str]) -> np.ndarray:
+        # A micro-batch mixes the sentences of several requests: bucketed by
+        # length, and only split further by the MAX_BATCH_CHARS budget
+        with self.session() as session:
+            return _encode_texts(session, self.model, texts, batch_size=BATCH_MAX_SIZE)
+
+    def batcher(self) -> MicroBatcher:
+        """The micro-batcher shared by the concurrent requests (started on first use).
+
+        It has one worker per pooled session, so that every session encodes batches.
+        """
+        with self._batcher_lock:
+            if self._batcher is None:
+                self._batcher = MicroBatcher(
+                    self._run_batch, max_batch_size=BATCH_MAX_SIZE, max_wait=BATCH_MAX_WAIT,
+                    workers=len(self._all_sessions))
+            return self._batcher
+
+    def close(self) -> None:
+        if self._batcher is not None:
+            self._batcher.close()
+        for session in self._all_sessions:
+            session.close()
+
+
+class ModelRegistry:
+    """Loads every model of MODELS once, lazily on first use or with `preload`."""
+
+    def __init__(self, pool_size: int = POOL_SIZE):
+        self.pool_size = pool_size
+        self._models: Dict[str, LoadedModel] = {}
+        self._lock = threading.Lock()
+        # One lock per model, so that loading a model does not block the others
+        self._load_locks: Dict[str, threading.Lock] = {}
+
+    def get(self, model_name: str) -> LoadedModel:
+        loaded = self._models.get(model_name)
+        if loaded is not None:
+            return loaded
+        if model_name not in MODELS:
+            raise ValueError(f"'{model_name}' is not supported.")
+        with self._lock:
+            load_lock = self._load_locks.setdefault(model_name, threading.Lock())
+        with load_lock:
+            if model_name not in self._models:
+                self._models[model_name] = LoadedModel(model_name, self.pool_size)
+        return self._models[model_name]
+
+    def preload(self, model_names: Optional[Iterable[str]] = None) -> None:
+        for model_name in model_names or MODELS:
+            self.get(model_name)
 
+    def close(self) -> None:
+        with self._lock:
+            for loaded in self._models.values():
+                loaded.close()
+            self._models.clear()
 
-def cosine_similarity(similarity_matrix, id_1, id_2):
-    return similarity_matrix[id_1, id_2]
 
+REGISTRY = ModelRegistry(pool_size=int(os.environ.get("USE_SESSION_POOL", POOL_SIZE)))
+# e.g. USE_PRELOAD=large,xling loads the models at startup
+if os.environ.get("USE_PRELOAD"):
+    REGISTRY.preload(os.environ["USE_PRELOAD"].split(","))
 
-def attach_sentence_embeddings(session, sentences, model, batch_size=32):
+
+def _encode_texts(session, model, texts, batch_size=32, max_chars=MAX_BATCH_CHARS):
+    """Encodes the texts in length-bucketed batches; the rows follow the order of `texts`.
+
+    A batch holds at most batch_size sentences and max_chars padded characters.
+    """
+    return encode_by_length(
+        texts,
+        lambda batch: session.run(
+            model["sentence_emb"], feed_dict={model["sentence_input"]: batch}),
+        max_tokens=max_chars, max_sentences=batch_size)
+
+
+def _encode_long_sentences(sentences, encode_texts, model_name=None):
+    """Encodes the sentence units with `encode_texts`; extremely short ones get zeros.
+
+    With a model name, the embeddings go through the shared EMBEDDING_CACHE.
+    """
     # don't use extremely short sentences
-    sentences_subset = [x for x in sentences if len(x.text) > 5]
-    sentence_embeddings_tmp = []
-    for i in range(0, len(sentences_subset), batch_size):
-        sentence_embeddings_tmp.append(
-            session.run(
-                model["sentence_emb"],
-                feed_dict={
-                    model["sentence_input"]: [
-                        x.text for x in sentences_subset[i:(i+batch_size)]
-                    ]
-                }
-            )
-        )
-    sentence_embeddings_subset = np.concatenate(
-        sentence_embeddings_tmp, axis=0)
+    positions = [i for i, x in enumerate(sentences) if len(x.text) > 5]
+    texts = [sentences[i].text for i in positions]
+    if model_name is None:
+        sentence_embeddings_subset = encode_texts(texts)
+    else:
+        sentence_embeddings_subset = EMBEDDING_CACHE.encode(
+            "use-" + model_name, texts, encode_texts)
     sentence_embeddings = np.zeros(
         (len(sentences), sentence_embeddings_subset.shape[1]), dtype="float32")
-    # A rather hacky way to attach embeddings
-    for i, sentence in enumerate(sentences_subset):
-        sentence_embeddings[sentence.token, :] = (
-            sentence_embeddings_subset[i, :])
-    similarities = sentence_embeddings @ sentence_embeddings.T
-    # print(similarities[np.tril_indices(similarities.shape[0], k=-1)])
-    # print(np.where(np.tril(similarities, k=-1) > 0.95))
-    return similarities
-
-
-def summarize(text, model_name="large", additional_stopwords=None):
-    model = get_model(model_name)
-    with tf.Session() as session:
-        session.run([tf.global_variables_initializer(),
-                     tf.tables_initializer()])
-        # Make the graph read-only
-        tf.get_default_graph().finalize()
-        return summarize_with_model(text, session, model, model_name, additional_stopwords)
+    sentence_embeddings[positions, :] = sentence_embeddings_subset
+    return sentence_embeddings
+
+
+def encode_sentences(session, sentences, model, batch_size=32):
+    """Returns one (L2-normalized) embedding per sentence unit, in the same order.
+
+    Extremely short sentences get a zero embedding.
+    """
+    return _encode_long_sentences(
+        sentences, partial(_encode_texts, session, model, batch_size=batch_size),
+        model.get("name"))
+
+
+def encode_sentences_batched(batcher, sentences, model_name=None):
+    """Same as encode_sentences, through a MicroBatcher shared with the other requests."""
+    return _encode_long_sentences(sentences, batcher.encode, model_name)
+
 
+def attach_sentence_embeddings(session, sentences, model, batch_size=32, knn=None):
+    """Returns the similarity matrix of the sentences.
 
-def summarize_with_model(text, session, model, model_name, additional_stopwords):
-    if not isinstance(text, str):
-        raise ValueError("Text parameter must be a Unicode object (str)!")
-    lang = detect(text)[:2]
+    Dense by default; with `knn`, a sparse matrix keeping only the top-knn
+    neighbours of every sentence.
+    """
+    return similarity_matrix(
+        encode_sentences(session, sentences, model, batch_size=batch_size), knn)
+
+
+def summarize(text, model_name="large", additional_stopwords=None, knn=None):
+    """Encodes the sentences through the micro-batcher of the model."""
+    return summarize_batched(
+        text, REGISTRY.get(model_name).batcher(), model_name, additional_stopwords, knn=knn)
+
+
+def _score_sentences(sentences, encode, knn=None):
+    for i, sent in enumerate(sentences):
+        # Hacky way to overwrite token
+        sent.token = i
+    return score_embedded_sentences(sentences, encode(sentences), knn=knn)
+
+
+def score_sentences(session, model, sentences, knn=None):
+    """Sets the `score` of the sentence units. Returns the ranked graph (None if empty).
+
+    With `knn`, every sentence is only linked to its knn most similar sentences.
+    """
+    return _score_sentences(
+        sentences, partial(encode_sentences, session, model=model, batch_size=32), knn=knn)
+
+
+def get_sentence_units(analysis, model_name):
+    """Returns the sentence units to encode (None if the language is not supported)."""
+    lang = analysis.lang
     if lang == "en":
-        paragraphs = text.split("\n")
-        sentences = []
-        paragraph_index = 0
-        for paragraph in paragraphs:
-            # Gets a list of processed sentences.
-            if paragraph:
-                tmp = _clean_text_by_sentences(
-                    paragraph, additional_stopwords)
-                if tmp:
-                    for j, sent in enumerate(tmp):
-                        sent.paragraph = paragraph_index
-                        # Hacky way to overwrite token
-                        sent.token = len(sentences) + j
-                    sentences += tmp
-                    paragraph_index += 1
-    elif lang == "zh" or lang == "ko":  # zh-Hant sometimes got misclassified into ko
+        return analysis.sentence_units()
+    if lang == "zh" or lang == "ko":  # zh-Hant sometimes got misclassified into ko
         if model_name != "xling":
             raise ValueError("Only 'xling' model supports zh.")
-        sentences = cut_sentences_by_rule(text)
-    elif lang == "ja":
+        return cut_sentences_by_rule(analysis.text)
+    if lang == "ja":
         if model_name != "xling":
             raise ValueError("Only 'xling' model supports ja.")
-        if not JA_SUPPORT:
-            raise ImportError("Missing dependencies for Japanese support.")
-        sentences = ja_clean_and_cut_sentences(text)
-        for i, sent in enumerate(sentences):
-            # Hacky way to overwrite token
-            sent.token = i
-    else:
-        return ["Language not suppored! (supported languages: en, zh, ja)"], None, lang
+        return analysis.sentence_units()
+    return None
 
-    # print([sentence.token for sentence in sentences if sentence.token])
-    # Creates the graph and calculates the similarity coefficient for every pair of nodes.
-    similarities = attach_sentence_embeddings(
-        session, sentences, model, batch_size=32)
-    graph = _build_graph([x.token for x in sentences])
-    _set_graph_edge_weights(graph, partial(cosine_similarity, similarities))
 
-    # Remove all nodes with all edges weights equal to zero.
-    _remove_unreachable_nodes(graph)
+def _summarize(text, model_name, additional_stopwords, encode, knn=None):
+    """Accepts either the raw text or a DocumentAnalysis of it."""
+    if isinstance(text, DocumentAnalysis):
+        analysis = text
+    else:
+        analysis = DocumentAnalysis(text, additional_stopwords)
+    lang = analysis.lang
+    sentences = get_sentence_units(analysis, model_name)
+    if sentences is None:
+        return ["Language not suppored! (supported languages: en, zh, ja)"], None, lang
 
-    # PageRank cannot be run in an empty graph.
-    if len(graph.nodes()) == 0:
+    graph = _score_sentences(sentences, encode, knn=knn)
+    if graph is None:
         return []
 
-    # Ranks the tokens using the PageRank algorithm. Returns dict of sentence -> score
-    pagerank_scores = _pagerank(graph)
-
-    # Adds the summa scores to the sentence objects.
-    _add_scores_to_sentences(sentences, pagerank_scores)
-
     # Sorts the sentences
     sentences.sort(key=lambda s: s.score, reverse=True)
     return sentences, graph, lang
 
 
+def summarize_with_model(text, session, model, model_name, additional_stopwords, knn=None):
+    """Accepts either the raw text or a DocumentAnalysis of it."""
+    return _summarize(
+        text, model_name, additional_stopwords,
+        partial(encode_sentences, session, model=model, batch_size=32), knn=knn)
+
+
+def summarize_batched(text, batcher, model_name, additional_stopwords=None, knn=None):
+    """Same as summarize_with_model, encoding through a MicroBatcher."""
+    return _summarize(
+        text, model_name, additional_stopwords,
+        partial(encode_sentences_batched, batcher, model_name=model_name), knn=knn)
+
+
+def _cut_paragraph(paragraph, lang, model_name, additional_stopwords):
+    if lang == "zh" or lang == "ko":
+        if model_name != "xling":
+            raise ValueError("Only 'xling' model supports zh.")
+        return cut_sentences_by_rule(paragraph)
+    if lang == "ja" and model_name != "xling":
+        raise ValueError("Only 'xling' model supports ja.")
+    return cut_paragraph_sentences(paragraph, lang, additional_stopwords)
+
+
+def summarize_stream(paragraphs, model_name="large", additional_stopwords=None,
+                     lang=None, knn=None, **kwargs):
+    """Streaming version of `summarize` for book-length inputs.
+
+    A session is borrowed from the model pool for every window. Yields the
+    best sentences so far after every window; see `streaming.summarize_stream`
+    for the window_size, overlap and top_k options.
+    """
+    loaded = REGISTRY.get(model_name)
+
+    def score_window(sentences, _):
+        with loaded.session() as session:
+            return score_sentences(session, loaded.model, sentences, knn=knn)
+
+    yield from streaming.summarize_stream(
+        paragraphs,
+        score_window=score_window,
+        cut_paragraph=partial(
+            _cut_paragraph, model_name=model_name,
+            additional_stopwords=additional_stopwords),
+        lang=lang, languages=SUPPORTED_LANGUAGES, **kwargs)
+
+
 if __name__ == "__main__":
     res, _, lang = summarize("""
 By Wednesday morning, he was trying to marry those two thoughts into a single message — both embracing the report and trashing it. “The Mueller Report, despite being written by Angry Democrats and Trump Haters, and with unlimited money behind it ($35,000,000), didn’t lay a glove on me,” he wrote. “I DID NOTHING WRONG.”
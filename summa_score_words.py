@@ -1,84 +1,89 @@
-from typing import List, Dict, Tuple, Optional
-
-from langdetect import detect
-from summa.pagerank_weighted import pagerank_weighted_scipy as _pagerank
-from summa.preprocessing.textcleaner import clean_text_by_word as _clean_text_by_word
-from summa.preprocessing.textcleaner import tokenize_by_word as _tokenize_by_word
-from summa.commons import build_graph as _build_graph
-from summa.commons import remove_unreachable_nodes as _remove_unreachable_nodes
-from summa.keywords import (
-    _get_words_for_graph, _set_graph_edges, _lemmas_to_words
-)
-import summa.graph
-
-# Optional Dependencies
-try:
-    from text_cleaning_zh import clean_and_cut_words as zh_clean_and_cut_words
-    ZH_SUPPORT = True
-except ImportError:
-    ZH_SUPPORT = False
-
-try:
-    from text_cleaning_ja import clean_and_cut_words as ja_clean_and_cut_words
-    JA_SUPPORT = True
-except ImportError:
-    JA_SUPPORT = False
-
-
-def _extract_tokens(lemmas, scores) -> List[Tuple[float, str]]:
-    lemmas.sort(key=lambda s: scores[s], reverse=True)
-    return [(scores[lemmas[i]], lemmas[i]) for i in range(len(lemmas))]
+from typing import List, Dict, Mapping, Tuple, Optional, Union
+
+import numpy as np
+from numpy.lib.stride_tricks import as_strided
+from summa.keywords import WINDOW_SIZE, _get_words_for_graph
+from summa.syntactic_unit import SyntacticUnit
+
+from compact_graph import CompactGraph
+from document_analysis import DocumentAnalysis, SUPPORTED_LANGUAGES
+from ranking import rank_nodes as _rank_nodes
+from vocabulary import KeywordScores, Vocabulary
+
+
+def build_word_graph(tokens: Dict[str, SyntacticUnit], split_text: List[str],
+                     window_size: int = WINDOW_SIZE,
+                     vocabulary: Optional[Vocabulary] = None) -> CompactGraph:
+    """Builds the co-occurrence graph of summa.keywords with array operations.
+
+    Equivalent to summa's _build_graph + _set_graph_edges: the nodes are the
+    lemmas of _get_words_for_graph (in that order), and two lemmas are linked
+    (with weight 1) when their words appear less than `window_size` words
+    apart. Two words sharing a lemma create a self-loop.
+    """
+    if vocabulary is None:
+        vocabulary = Vocabulary(tokens)
+    labels = list(dict.fromkeys(_get_words_for_graph(tokens)))
+    node_of_lemma = np.full(len(vocabulary), -1, dtype=np.int64)
+    node_of_lemma[vocabulary.lookup(labels)] = np.arange(len(labels))
+    # Interns every word of the text into its node id (-1 if not a node)
+    lemma_ids = vocabulary.encode_words(split_text)
+    sequence = np.where(lemma_ids >= 0, node_of_lemma[lemma_ids], -1)
+    # Every window as a (zero-copy) row of a strided view, padded with -1 so
+    # that short texts and the last window_size - 1 words need no special case
+    padded = np.concatenate([sequence, np.full(window_size - 1, -1, dtype=np.int64)])
+    stride = padded.strides[0]
+    windows = as_strided(padded, shape=(len(sequence), window_size), strides=(stride, stride))
+    first = np.repeat(windows[:, :1], window_size - 1, axis=1).ravel()
+    second = windows[:, 1:].ravel()
+    valid = (first >= 0) & (second >= 0)
+    rows = np.minimum(first[valid], second[valid])
+    cols = np.maximum(first[valid], second[valid])
+    # Deduplicates the pairs (every edge has weight 1)
+    pairs = np.unique(rows * len(labels) + cols)
+    return CompactGraph.from_edges(labels, pairs // len(labels), pairs % len(labels))
 
 
 def keywords(
-        text: str, deaccent: bool = False,
+        text: Union[str, DocumentAnalysis], deaccent: bool = False,
         additional_stopwords: List[str] = None) -> Tuple[
             List[Tuple[float, str]], Optional[Dict[str, List[str]]],
-            Optional[summa.graph.Graph], Dict[str, float]]:
-    if not isinstance(text, str):
-        raise ValueError("Text parameter must be a Unicode object (str)!")
+            Optional[CompactGraph], Mapping[str, float]]:
+    """Accepts either the raw text or a DocumentAnalysis of it.
 
-    lang = detect(text)[:2]
-    if lang == "en":
-        # Gets a dict of word -> lemma
-        tokens = _clean_text_by_word(
-            text, "english", deacc=deaccent,
-            additional_stopwords=additional_stopwords)
-        split_text = list(_tokenize_by_word(text))
-    elif lang == "zh" or lang == "ko":  # zh-Hant sometimes got misclassified into ko
-        if not ZH_SUPPORT:
-            raise ImportError("Missing dependencies for Chinese support.")
-        tokens = zh_clean_and_cut_words(text)
-        split_text = [x.text for x in tokens]
-        tokens = {x.text: x for x in tokens}
-    elif lang == "ja":
-        if not JA_SUPPORT:
-            raise ImportError("Missing dependencies for Japanese support.")
-        tokens = ja_clean_and_cut_words(text)
-        split_text = [x.text for x in tokens]
-        tokens = {x.text: x for x in tokens}
+    `deaccent` and `additional_stopwords` are ignored for a DocumentAnalysis.
+    """
+    if isinstance(text, DocumentAnalysis):
+        analysis = text
     else:
-        print("Language not suppored! (supported languages: en zh)")
-        return [], {}, None, {}
+        analysis = DocumentAnalysis(text, additional_stopwords, deaccent)
+
+    lang = analysis.lang
+    if lang not in SUPPORTED_LANGUAGES:
+        print("Language not suppored! (supported languages: en zh ja)")
+        return [], {}, None, KeywordScores(Vocabulary({}), [], np.zeros(0))
+    tokens, split_text = analysis.word_units()
+
+    vocabulary = Vocabulary(tokens)
 
     # Creates the graph and adds the edges
-    graph = _build_graph(_get_words_for_graph(tokens))
-    _set_graph_edges(graph, tokens, split_text)
+    graph = build_word_graph(tokens, split_text, vocabulary=vocabulary)
     del split_text  # It's no longer used
 
-    _remove_unreachable_nodes(graph)
+    graph.remove_unreachable_nodes()
 
     # PageRank cannot be run in an empty graph.
-    if not graph.nodes():
-        return [], {}, None, {}
+    if len(graph) == 0:
+        return [], {}, None, KeywordScores(vocabulary, [], np.zeros(0))
 
-    # Ranks the tokens using the PageRank algorithm. Returns dict of lemma -> score
-    pagerank_scores = _pagerank(graph)
+    # Ranks the tokens using the PageRank algorithm. The scores are aligned with the nodes.
+    scores, _, _ = _rank_nodes(graph)
+    pagerank_scores = KeywordScores(vocabulary, graph.labels, scores)
 
-    extracted_lemmas = _extract_tokens(graph.nodes(), pagerank_scores)
+    extracted_lemmas = pagerank_scores.ranked()
 
     lemmas_to_word = None
     if lang == "en":
-        lemmas_to_word = _lemmas_to_words(tokens)
+        lemmas_to_word = vocabulary.lemmas_to_words()
 
     return extracted_lemmas, lemmas_to_word, graph, pagerank_scores
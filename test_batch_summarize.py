@@ -0,0 +1,56 @@
+import sys
+import types
+
+import pytest
+
+from batch_summarize import summarize_many
+from summa_score_sentences import summarize
+
+TEXTS = [
+    """Of all of President Trump’s former associates who have come under scrutiny in the special counsel’s Russia investigation, his former personal lawyer, Michael D. Cohen, has undertaken perhaps the most surprising and risky legal strategy.
+
+Mr. Cohen has twice pleaded guilty in federal court in Manhattan to a litany of crimes, and he has volunteered information to the special counsel and other agencies investigating Mr. Trump and his inner circle. He did all this without first obtaining a traditional, ironclad deal under which the government would commit to seeking leniency on Mr. Cohen’s behalf when he is sentenced on Dec. 12.""",
+    """By Wednesday morning, he was trying to marry those two thoughts into a single message. The report, despite being written by his critics, did not lay a glove on him, he wrote.
+
+In subsequent tweets, he tried again to claim victory amid his victimhood, casting the investigation as a contest in which he prevailed. He asserted that he waited for the report and won the contest.""",
+    "Ceci est un texte écrit en français, une langue qui n'est pas prise en charge.",
+]
+
+
+@pytest.mark.parametrize("workers", [None, 2])
+def test_matches_individual_calls(workers):
+    results = summarize_many(TEXTS, workers=workers)
+    assert len(results) == len(TEXTS)
+    for text, (sentences, graph, lang) in zip(TEXTS, results):
+        expected, expected_graph, expected_lang = summarize(text)
+        assert lang == expected_lang
+        if expected_graph is None:
+            assert graph is None and sentences == expected
+            continue
+        assert graph.nodes() == expected_graph.nodes()
+        assert [(x.text, x.paragraph, x.index) for x in sentences] == [
+            (x.text, x.paragraph, x.index) for x in expected]
+        assert [x.score for x in sentences] == pytest.approx([x.score for x in expected])
+
+
+def test_unknown_model():
+    with pytest.raises(ValueError):
+        summarize_many(TEXTS[:1], model="bert")
+
+
+def test_unsupported_documents_do_not_abort_the_batch(monkeypatch):
+    # Stands in for the USE module (tensorflow is not needed for this path):
+    # like the non-xling models, it raises on zh and ja documents
+    def get_sentence_units(analysis, model_name):
+        if analysis.lang in ("zh", "ja"):
+            raise ValueError("Only 'xling' model supports %s." % analysis.lang)
+        return None
+
+    module = types.ModuleType("summa_score_sentences_use")
+    module.get_sentence_units = get_sentence_units
+    monkeypatch.setitem(sys.modules, "summa_score_sentences_use", module)
+    texts = ["这是一个中文句子。这是第二个句子。", TEXTS[2]]
+    results = summarize_many(texts, model="use-large")
+    assert [result[0] for result in results] == [
+        ["Language not suppored! (supported languages: en, zh, ja)"]] * 2
+    assert results[0][2] in ("zh", "ko") and results[1][2] == "fr"
@@ -0,0 +1,104 @@
+import pytest
+import numpy as np
+from summa.commons import build_graph, remove_unreachable_nodes
+from summa.pagerank_weighted import pagerank_weighted_scipy
+from summa.summarizer import _set_graph_edge_weights
+
+from compact_graph import CompactGraph, DenseGraph
+from lexical_similarity import build_sentence_graph
+from ranking import pagerank_weighted
+
+TOKENS = [
+    "trump cohen lawyer", "cohen plead guilti court", "trump counsel crime",
+    "deal sentenc", "friend legal process", "lawyer legal strategi",
+    "weather sunni", "cohen plead guilti court"
+]
+
+
+def edge_weights(graph):
+    """Both directions of every edge, like summa.graph.Graph.edges(), with their weights."""
+    coo = graph.adjacency.tocoo()
+    return {(graph.labels[i], graph.labels[j]): weight
+            for i, j, weight in zip(coo.row.tolist(), coo.col.tolist(), coo.data.tolist())}
+
+
+def test_from_edges():
+    graph = CompactGraph.from_edges(["a", "b", "c", "d"], [0, 1, 2], [1, 2, 2])
+    assert graph.n_edges == 3
+    assert graph.adjacency.dtype == np.float32
+    assert graph.adjacency.toarray().tolist() == [
+        [0, 1, 0, 0], [1, 0, 1, 0], [0, 1, 1, 0], [0, 0, 0, 0]]
+    rows, cols, weights = graph.edge_arrays()
+    assert list(zip(rows.tolist(), cols.tolist())) == [(0, 1), (1, 2), (2, 2)]
+    graph.remove_unreachable_nodes()
+    assert graph.nodes() == ["a", "b", "c"]
+    assert len(graph) == 3
+
+
+def test_sentence_graph_matches_summa():
+    expected = build_graph(TOKENS)
+    _set_graph_edge_weights(expected)
+    remove_unreachable_nodes(expected)
+    graph = build_sentence_graph(TOKENS)
+    graph.remove_unreachable_nodes()
+    assert graph.nodes() == expected.nodes()
+    weights = edge_weights(graph)
+    assert sorted(weights) == sorted(expected.edges())
+    for edge in expected.edges():
+        assert weights[edge] == pytest.approx(expected.edge_weight(edge), rel=1e-6)
+    expected_scores = pagerank_weighted_scipy(expected)
+    scores = pagerank_weighted(graph)
+    for node in expected.nodes():
+        assert scores[node] == pytest.approx(expected_scores[node], abs=1e-6)
+
+
+def test_similarity_matrix_fallback():
+    graph = CompactGraph.from_similarity_matrix(["a", "b", "c"], np.eye(3))
+    assert graph.n_edges == 3
+    assert graph.adjacency.diagonal().tolist() == [0, 0, 0]
+    graph = CompactGraph.from_similarity_matrix(
+        [0, 1, 2], np.array([[1, .5, 0], [.5, 1, 0], [0, 0, 1]]))
+    graph.remove_unreachable_nodes()
+    assert graph.nodes() == [0, 1]
+    assert list(edge_weights(graph)) == [(0, 1), (1, 0)]
+
+
+def test_induced_edges():
+    rng = np.random.RandomState(0)
+    pairs = np.sort(rng.randint(0, 50, size=(300, 2)), axis=1)
+    rows, cols = np.unique(pairs, axis=0).T
+    graph = CompactGraph.from_edges(list(range(50)), rows, cols)
+    node_ids = rng.choice(50, 20, replace=False)
+    weights = edge_weights(graph)
+    expected = [
+        (i, j) for i in range(50) for j in range(i + 1, 50)
+        if i in node_ids and j in node_ids and (i, j) in weights]
+    rows, cols, weights = graph.induced_edges(node_ids)
+    assert list(zip(rows.tolist(), cols.tolist())) == expected
+    assert weights.tolist() == [1] * len(expected)
+    rows, cols, _ = graph.induced_edges()
+    assert len(rows) == graph.n_edges - np.count_nonzero(graph.adjacency.diagonal())
+
+
+@pytest.mark.parametrize("dtype", [np.float32, np.float16])
+def test_dense_graph_matches_compact(dtype):
+    rng = np.random.RandomState(0)
+    similarities = rng.rand(50, 50)
+    similarities = (similarities + similarities.T) / 2 - 0.3
+    similarities[7] = similarities[:, 7] = 0
+    compact = CompactGraph.from_similarity_matrix(
+        list(range(50)), similarities.astype(dtype).astype(np.float32))
+    dense = DenseGraph.from_similarity_matrix(list(range(50)), similarities.astype(dtype))
+    assert dense.adjacency.dtype == dtype
+    assert dense.n_edges == compact.n_edges
+    np.testing.assert_allclose(dense.degrees(), compact.degrees(), rtol=1e-5)
+    for dense_array, compact_array in zip(dense.edge_arrays(), compact.edge_arrays()):
+        np.testing.assert_allclose(dense_array, compact_array)
+    dense.remove_unreachable_nodes()
+    compact.remove_unreachable_nodes()
+    assert dense.nodes() == compact.nodes() == [i for i in range(50) if i != 7]
+    scores, expected = pagerank_weighted(dense), pagerank_weighted(compact)
+    for node in expected:
+        assert scores[node] == pytest.approx(expected[node], abs=1e-9)
+    graph = DenseGraph.from_similarity_matrix(["a", "b", "c"], np.eye(3))
+    assert graph.n_edges == 3 and graph.adjacency.diagonal().tolist() == [0, 0, 0]
@@ -0,0 +1,118 @@
+import types
+
+import pytest
+from summa.syntactic_unit import SyntacticUnit
+
+import document_analysis
+from document_analysis import DocumentAnalysis, analyze_many
+from summa_score_sentences import summarize
+from summa_score_words import keywords
+
+TEXT = """Mr. Cohen has twice pleaded guilty in federal court in Manhattan to a litany of crimes, and he has volunteered information to the special counsel and other agencies investigating Mr. Trump and his inner circle. He did all this without first obtaining a traditional, ironclad deal under which the government would commit to seeking leniency on Mr. Cohen's behalf when he is sentenced on Dec. 12.
+
+Mr. Cohen has concluded that his life has been utterly destroyed by his relationship with Mr. Trump and his own actions, and to begin anew he needed to speed up the legal process by quickly confessing his crimes and serving any sentence he receives."""
+
+TEXTS = [
+    TEXT,
+    "The weather was sunny in Manhattan, and the federal holiday brought crowds to the parks.\n\n"
+    "The river was busy. Boats crossed it all day long, and the crowds watched them.",
+    "Le tribunal fédéral de Manhattan a entendu les avocats pendant toute la journée.",
+    TEXT.split("\n")[-1],
+]
+
+
+def counting(monkeypatch, name):
+    calls = []
+    function = getattr(document_analysis, name)
+
+    def wrapper(*args, **kwargs):
+        calls.append(args[0])
+        return function(*args, **kwargs)
+
+    monkeypatch.setattr(document_analysis, name, wrapper)
+    return calls
+
+
+def as_tuples(units):
+    return [(x.text, x.token, x.index, x.paragraph) for x in units]
+
+
+def word_tuples(word_units):
+    tokens, split_text = word_units
+    return {word: (x.text, x.token) for word, x in tokens.items()}, split_text
+
+
+def test_english_is_cut_once(monkeypatch):
+    sentence_calls = counting(monkeypatch, "en_clean_text_by_sentences")
+    word_calls = counting(monkeypatch, "en_clean_text_by_word")
+    analysis = DocumentAnalysis(TEXT)
+    summarize(analysis)
+    keywords(analysis)
+    summarize(analysis)
+    keywords(analysis)
+    assert sentence_calls == analysis.paragraphs()
+    assert word_calls == [TEXT]
+
+
+def test_tagger_runs_once(monkeypatch):
+    tagged = [["华为", "高管", "创办人"], ["高管", "华为", "公司"], ["公司", "创办人", "华为"]]
+    calls = []
+
+    def get_tokens(text):
+        calls.append(text)
+        return tagged
+
+    def cut_sentences(sentences):
+        units = []
+        for i, words in enumerate(sentences):
+            unit = SyntacticUnit("".join(words) + "。", " ".join(words))
+            unit.index, unit.paragraph = i, 0
+            units.append(unit)
+        return units
+
+    def cut_words(sentences):
+        return [SyntacticUnit(word, word) for words in sentences for word in words]
+
+    fake_zh = types.SimpleNamespace(
+        get_tokens=get_tokens, cut_sentences=cut_sentences, cut_words=cut_words)
+    monkeypatch.setattr(document_analysis, "ZH_SUPPORT", True)
+    monkeypatch.setattr(document_analysis, "text_cleaning_zh", fake_zh, raising=False)
+    analysis = DocumentAnalysis(TEXT)
+    analysis.lang = "zh"
+    sentences, graph, lang = summarize(analysis)
+    assert lang == "zh" and len(graph) == 3
+    extracted, _, _, _ = keywords(analysis)
+    assert {lemma for _, lemma in extracted} == {"华为", "高管", "创办人", "公司"}
+    summarize(analysis)
+    assert calls == [TEXT]
+
+
+def test_sentence_units_are_copies():
+    analysis = DocumentAnalysis(TEXT)
+    units = analysis.sentence_units()
+    expected = as_tuples(units)
+    for unit in units:
+        unit.score = 1.0
+        unit.token = 0
+    fresh = analysis.sentence_units()
+    assert as_tuples(fresh) == expected
+    assert all(unit.score == -1 for unit in fresh)
+    assert not any(a is b for a, b in zip(units, fresh))
+    # Same for the word units
+    tokens, split_text = analysis.word_units()
+    tokens.clear()
+    split_text.clear()
+    assert analysis.word_units()[0] and analysis.word_units()[1]
+
+
+def test_analyze_many_matches_single_documents():
+    analyses = analyze_many(TEXTS, batch_size=2)
+    assert [x.lang for x in analyses] == [DocumentAnalysis(text).lang for text in TEXTS]
+    for text, analysis in zip(TEXTS, analyses):
+        single = DocumentAnalysis(text)
+        if single.lang != "en":
+            with pytest.raises(ValueError):
+                analysis.sentence_units()
+            continue
+        assert as_tuples(analysis.sentence_units()) == as_tuples(single.sentence_units())
+        assert word_tuples(analysis.word_units()) == word_tuples(single.word_units())
@@ -0,0 +1,87 @@
+import numpy as np
+import pytest
+
+from embedding_cache import EmbeddingCache
+
+
+class FakeEncoder:
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, texts):
+        self.calls.append(list(texts))
+        return np.asarray(
+            [[len(text), text.count("a"), 1 / 3] for text in texts], dtype=np.float32)
+
+
+def test_only_misses_are_encoded():
+    cache = EmbeddingCache()
+    encoder = FakeEncoder()
+    texts = ["All rights reserved.", "A new sentence.", "All  rights reserved. "]
+    embeddings = cache.encode("use-large", texts, encoder)
+    # The last sentence only differs by whitespace
+    assert encoder.calls == [["All rights reserved.", "A new sentence."]]
+    np.testing.assert_array_equal(embeddings[2], embeddings[0])
+    assert cache.last_request.hits == 0
+    embeddings = cache.encode("use-large", ["Another one.", "A new sentence."], encoder)
+    assert encoder.calls[-1] == ["Another one."]
+    np.testing.assert_array_equal(embeddings, encoder(["Another one.", "A new sentence."]))
+    assert cache.last_request.hit_ratio == 0.5
+    # The models do not share entries
+    cache.encode("laser-en", ["A new sentence."], encoder)
+    assert cache.last_request.hits == 0
+    assert cache.stats.entries == 4
+
+
+def test_memory_budget():
+    cache = EmbeddingCache(max_bytes=3 * 12)
+    encoder = FakeEncoder()
+    cache.encode("m", ["one", "two", "three", "four"], encoder)
+    assert cache.stats.entries == 3 and cache.stats.size_bytes == 36
+    cache.encode("m", ["one"], encoder)
+    assert cache.last_request.hits == 0
+    cache.encode("m", ["four"], encoder)
+    assert cache.last_request.hits == 1
+
+
+@pytest.mark.parametrize("dtype", ["float32", "float16"])
+def test_disk_tier(tmp_path, dtype):
+    encoder = FakeEncoder()
+    cache = EmbeddingCache(max_bytes=12, directory=tmp_path, disk_dtype=dtype)
+    expected = cache.encode("m", ["one", "two", "banana"], encoder)
+    cache.encode("m", ["four"], encoder)
+    # A fresh cache reads the rows back from the memory map
+    cache = EmbeddingCache(directory=tmp_path, disk_dtype=dtype)
+    embeddings = cache.encode("m", ["banana", "one", "four", "five"], encoder)
+    assert encoder.calls[-1] == ["five"]
+    assert cache.last_request.disk_hits == 3
+    assert embeddings.dtype == np.float32
+    np.testing.assert_allclose(embeddings[:2], expected[[2, 0]], rtol=1e-3)
+    # The row appended last is read from disk without reopening the cache
+    cache.clear()
+    cache.encode("m", ["five"], encoder)
+    assert cache.last_request.disk_hits == 1
+
+
+def test_disk_tier_recovers_interrupted_append(tmp_path):
+    encoder = FakeEncoder()
+    cache = EmbeddingCache(directory=tmp_path)
+    cache.encode("m", ["a", "bb"], encoder)
+    # A crash after writing a row (and half of another) but before its key
+    model_dir = tmp_path / "m"
+    with open(str(model_dir / "rows.bin"), "ab") as fout:
+        fout.write(np.full(3, 99, dtype=np.float32).tobytes() + b"\0\0")
+    with open(str(model_dir / "keys.txt"), "a") as fout:
+        fout.write("0123")
+    cache = EmbeddingCache(directory=tmp_path)
+    embeddings = cache.encode("m", ["ccc", "a"], encoder)
+    assert cache.last_request.disk_hits == 1
+    # The orphan rows and the partial key were dropped before appending
+    assert (model_dir / "rows.bin").stat().st_size == 3 * 12
+    assert len((model_dir / "keys.txt").read_text().split("\n")) == 4
+    # The new row is read back, not the orphan one
+    cache = EmbeddingCache(directory=tmp_path)
+    np.testing.assert_array_equal(cache.encode("m", ["ccc", "bb"], encoder),
+                                  encoder(["ccc", "bb"]))
+    assert cache.last_request.disk_hits == 2
+    np.testing.assert_array_equal(embeddings[0], encoder(["ccc"])[0])
@@ -0,0 +1,116 @@
+import random
+import zlib
+
+import numpy as np
+import pytest
+from summa.syntactic_unit import SyntacticUnit
+
+from incremental import IncrementalSummarizer
+from lexical_similarity import build_sentence_graph
+from ranking import rank_nodes
+
+WORDS = ["trump", "cohen", "lawyer", "court", "counsel", "crime", "deal", "friend",
+         "legal", "process", "strategi", "weather", "sunni", "report", "investig"]
+
+
+def make_text(seed, n_paragraphs=20, n_sentences=5):
+    rng = random.Random(seed)
+    return "\n".join(". ".join(" ".join(rng.sample(WORDS, rng.randint(2, 6)))
+                               for _ in range(n_sentences)) for _ in range(n_paragraphs))
+
+
+def cut_paragraph(paragraph, lang):
+    units = []
+    for i, text in enumerate(paragraph.split(". ")):
+        unit = SyntacticUnit(text, text)
+        unit.index = i
+        units.append(unit)
+    return units
+
+
+def encode(sentences):
+    vectors = np.stack([np.random.RandomState(zlib.crc32(x.text.encode())).rand(16)
+                        for x in sentences])
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def edit(text, seed):
+    paragraphs = text.split("\n")
+    rng = random.Random(seed)
+    i = rng.randrange(len(paragraphs))
+    sentences = paragraphs[i].split(". ")
+    sentences[rng.randrange(len(sentences))] = " ".join(rng.sample(WORDS, 4))
+    paragraphs[i] = ". ".join(sentences)
+    return "\n".join(paragraphs)
+
+
+def test_lexical_edits_match_full_ranking():
+    summarizer = IncrementalSummarizer(lang="en", cut_paragraph=cut_paragraph)
+    text = make_text(0)
+    summarizer.update(text)
+    assert summarizer.stats.n_cut_paragraphs == 20
+    cold_iterations = summarizer.stats.ranking.iterations
+    for seed in range(5):
+        text = edit(text, seed)
+        sentences, graph, lang = summarizer.update(text)
+        assert summarizer.stats.n_recomputed <= 1
+        assert summarizer.stats.n_cut_paragraphs == 1
+        assert summarizer.stats.ranking.iterations < cold_iterations
+        expected = build_sentence_graph([x.token for x in sentences if len(x.token) > 2])
+        expected.remove_unreachable_nodes()
+        _, expected_scores, _ = rank_nodes(expected)
+        assert sorted(graph.nodes()) == sorted(expected.nodes())
+        for sentence in sentences:
+            assert sentence.score == pytest.approx(
+                expected_scores.get(sentence.token, 0), abs=1e-6)
+    assert summarizer.update(text)[1].nodes() == graph.nodes()
+    assert summarizer.stats.n_recomputed == 0
+
+
+def test_embedding_edits_match_fresh_summarizer():
+    calls = []
+
+    def counting_encode(sentences):
+        calls.append(len(sentences))
+        return encode(sentences)
+
+    summarizer = IncrementalSummarizer(
+        encode=counting_encode, lang="en", cut_paragraph=cut_paragraph)
+    text = make_text(1)
+    summarizer.update(text)
+    text = edit(text, 1)
+    sentences, graph, _ = summarizer.update(text)
+    assert calls == [100, 1]
+    assert summarizer.stats.n_recomputed == 1
+    fresh, fresh_graph, _ = IncrementalSummarizer(
+        encode=encode, lang="en", cut_paragraph=cut_paragraph).update(text)
+    assert graph.nodes() == fresh_graph.nodes()
+    assert [x.token for x in sentences] == [x.token for x in fresh]
+    assert [x.score for x in sentences] == pytest.approx([x.score for x in fresh], abs=1e-6)
+    # Removing a paragraph computes no new rows
+    summarizer.update(text[text.index("\n") + 1:])
+    assert summarizer.stats.n_recomputed == 0
+    assert calls == [100, 1]
+
+
+def test_vocabulary_and_similarities_follow_the_text():
+    summarizer = IncrementalSummarizer(lang="en", cut_paragraph=cut_paragraph)
+    text = make_text(2)
+    summarizer.update(text)
+    for seed in range(3):
+        text = edit(text, seed)
+        summarizer.update(text)
+    fresh = IncrementalSummarizer(lang="en", cut_paragraph=cut_paragraph)
+    fresh.update(text)
+    assert summarizer._keys == fresh._keys
+    assert abs(summarizer._similarities - fresh._similarities).max() < 1e-12
+
+    # Replacing every word drops the old words from the vocabulary
+    renamed = text
+    for word in WORDS:
+        renamed = renamed.replace(word, word.upper())
+    summarizer.update(renamed)
+    assert sorted(summarizer._vocabulary) == sorted(x.upper() for x in WORDS)
+    fresh = IncrementalSummarizer(lang="en", cut_paragraph=cut_paragraph)
+    assert [x.score for x in summarizer.update(renamed)[0]] == pytest.approx(
+        [x.score for x in fresh.update(renamed)[0]], abs=1e-6)
@@ -0,0 +1,108 @@
+import json
+
+import pytest
+from summa.preprocessing.textcleaner import clean_text_by_word, tokenize_by_word
+
+from keyword_index import FORMAT_VERSION, KeywordIndex
+from ranking import rank_nodes
+from summa_score_words import build_word_graph
+
+TEXTS = [
+    """Mr. Cohen has twice pleaded guilty in federal court in Manhattan to a litany of crimes, and he has volunteered information to the special counsel and other agencies investigating Mr. Trump and his inner circle.""",
+    """Mr. Cohen has concluded that his life has been utterly destroyed by his relationship with Mr. Trump and his own actions, and to begin anew he needed to speed up the legal process by quickly confessing his crimes.""",
+    """The weather was sunny in Manhattan, and the federal holiday brought crowds to the parks and the river.""",
+]
+
+
+def word_units(text):
+    return clean_text_by_word(text, "english"), list(tokenize_by_word(text))
+
+
+def as_dict(ranked):
+    return {lemma: score for score, lemma in ranked}
+
+
+def build_index(texts, **kwargs):
+    index = KeywordIndex(**kwargs)
+    for i, text in enumerate(texts):
+        index.add_tokens(*word_units(text), timestamp=float(i), doc_id=str(i))
+    return index
+
+
+def test_single_document_matches_keywords():
+    index = build_index(TEXTS[:1])
+    graph = build_word_graph(*word_units(TEXTS[0]))
+    graph.remove_unreachable_nodes()
+    _, expected, _ = rank_nodes(graph)
+    ranked = index.keywords()
+    assert [lemma for _, lemma in ranked] == sorted(
+        expected, key=lambda x: expected[x], reverse=True)
+    assert as_dict(ranked) == pytest.approx(expected)
+    assert len(index.keywords(top_n=3)) == 3
+    assert "cohen" in index.lemmas_to_words()["cohen"][0].lower()
+
+
+def test_expiry_and_warm_start():
+    index = build_index(TEXTS)
+    index.keywords()
+    assert index.expire(max_age=1.5, now=3.0) == 2
+    assert len(index) == 1
+    expected = build_index(TEXTS[2:]).keywords()
+    assert as_dict(index.keywords()) == pytest.approx(as_dict(expected), abs=1e-6)
+
+    # Adding a document warm-starts from the previous scores
+    index = build_index(TEXTS)
+    index.keywords()
+    index.add_tokens(*word_units(TEXTS[1]), doc_id="3")
+    warm_ranked = index.keywords()
+    cold = build_index(TEXTS + TEXTS[1:2])
+    cold_ranked = cold.keywords()
+    assert index.ranking_stats.iterations < cold.ranking_stats.iterations
+    assert as_dict(warm_ranked) == pytest.approx(as_dict(cold_ranked), abs=1e-6)
+
+
+def test_counts_and_persistence(tmp_path):
+    index = build_index(TEXTS, directory=tmp_path)
+    cohen, mr = index._lemma_ids["cohen"], index._lemma_ids["mr"]
+    index.save()
+    counts = index._counts
+    assert counts[min(cohen, mr), max(cohen, mr)] == 2
+    index.add_tokens(*word_units(TEXTS[0]), doc_id="0")
+    index.save()
+    loaded = KeywordIndex(tmp_path)
+    assert len(loaded) == 3
+    assert loaded.keywords() == index.keywords()
+    loaded.remove("1")
+    assert as_dict(loaded.keywords()) == pytest.approx(
+        as_dict(build_index([TEXTS[0], TEXTS[2]]).keywords()), abs=1e-6)
+
+
+def test_expiry_compacts_lemmas(tmp_path):
+    index = build_index(TEXTS, directory=tmp_path)
+    index.keywords()
+    assert index.expire(max_age=1.5, now=3.0) == 2
+    fresh = build_index(TEXTS[2:])
+    assert len(index.lemmas) < len(build_index(TEXTS).lemmas)
+    assert set(index.lemmas) <= set(fresh.lemmas)
+    assert "cohen" not in index._lemma_ids
+    assert as_dict(index.keywords()) == pytest.approx(as_dict(fresh.keywords()), abs=1e-6)
+
+    # The compacted ids survive a save, which leaves no stale or temporary files
+    index.save()
+    index.save()
+    assert len(list(tmp_path.iterdir())) == 3
+    loaded = KeywordIndex(tmp_path)
+    loaded.add_tokens(*word_units(TEXTS[0]), doc_id="0")
+    assert as_dict(loaded.keywords()) == pytest.approx(
+        as_dict(build_index([TEXTS[2], TEXTS[0]]).keywords()), abs=1e-6)
+
+
+def test_unknown_version(tmp_path):
+    index = build_index(TEXTS[:1], directory=tmp_path)
+    index.save()
+    meta = json.loads((tmp_path / "index.json").read_text(encoding="utf-8"))
+    assert meta["version"] == FORMAT_VERSION
+    del meta["version"]
+    (tmp_path / "index.json").write_text(json.dumps(meta), encoding="utf-8")
+    with pytest.raises(ValueError, match="version"):
+        KeywordIndex(tmp_path)
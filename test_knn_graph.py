@@ -0,0 +1,51 @@
+import numpy as np
+import pytest
+
+from compact_graph import CompactGraph
+from knn_graph import FAISS_SUPPORT, knn_similarity_matrix, rank_correlation
+from ranking import rank_nodes
+
+
+def clustered_embeddings(seed, n_sentences=300, n_topics=8, dim=64):
+    rng = np.random.RandomState(seed)
+    topics = rng.randn(n_topics, dim)
+    # Sentences closer to their topic are more central
+    noise = rng.uniform(0.5, 3, size=(n_sentences, 1))
+    embeddings = (topics[rng.randint(n_topics, size=n_sentences)] +
+                  noise * rng.randn(n_sentences, dim))
+    embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True)
+    return embeddings.astype(np.float32)
+
+
+def test_knn_matrix():
+    embeddings = clustered_embeddings(0, n_sentences=50)
+    dense = embeddings @ embeddings.T
+    np.fill_diagonal(dense, -np.inf)
+    matrix = knn_similarity_matrix(embeddings, 5, block_size=7, use_faiss=False)
+    assert (matrix != matrix.T).nnz == 0
+    assert matrix.diagonal().tolist() == [0] * 50
+    for i in range(50):
+        expected = set(np.argsort(-dense[i])[:5][dense[i][np.argsort(-dense[i])[:5]] > 0])
+        assert expected <= set(matrix[i].indices.tolist())
+        assert np.allclose(matrix[i].data, dense[i, matrix[i].indices], atol=1e-5)
+    assert knn_similarity_matrix(embeddings[:1], 5).nnz == 0
+
+
+@pytest.mark.skipif(not FAISS_SUPPORT, reason="faiss is not installed")
+def test_faiss_matches_blocked():
+    embeddings = clustered_embeddings(1, n_sentences=80)
+    blocked = knn_similarity_matrix(embeddings, 6, use_faiss=False)
+    indexed = knn_similarity_matrix(embeddings, 6, use_faiss=True)
+    assert abs(blocked - indexed).max() < 1e-5
+
+
+def test_knn_ranking_close_to_dense():
+    embeddings = clustered_embeddings(2)
+    labels = list(range(len(embeddings)))
+    dense_scores, _, _ = rank_nodes(
+        CompactGraph.from_similarity_matrix(labels, np.maximum(embeddings @ embeddings.T, 0)))
+    knn = CompactGraph.from_similarity_matrix(
+        labels, knn_similarity_matrix(embeddings, 60, use_faiss=False))
+    assert knn.n_edges < 300 * 60
+    knn_scores, _, _ = rank_nodes(knn)
+    assert rank_correlation(knn_scores, dense_scores) > 0.85
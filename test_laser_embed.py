@@ -0,0 +1,157 @@
+import os
+import random
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+torch = pytest.importorskip("torch")
+pytest.importorskip("fastBPE")
+os.environ.setdefault("LASER", str(Path(__file__).parent / "LASER_PROJECT"))
+from laser.embed import (  # noqa: E402
+    SPACE_NORMALIZER, Encoder, EncodeFile, EncodeFileSharded, LineOffsets, SentenceEncoder,
+    ShardRanges)
+
+WORDS = ["w%d" % i for i in range(50)]
+
+
+@pytest.fixture(scope="module")
+def model_path(tmp_path_factory):
+    """A small randomly initialized encoder, saved like the LASER models."""
+    torch.manual_seed(0)
+    dictionary = {"<pad>": 1, "</s>": 2, "<unk>": 3}
+    dictionary.update((word, i + 4) for i, word in enumerate(WORDS))
+    params = dict(num_embeddings=len(WORDS) + 4, padding_idx=1, embed_dim=8, hidden_size=8)
+    path = tmp_path_factory.mktemp("model") / "encoder.pt"
+    torch.save({"params": params, "model": Encoder(**params).state_dict(),
+                "dictionary": dictionary}, str(path))
+    return str(path)
+
+
+def random_lines(n, seed=0):
+    rng = random.Random(seed)
+    return [" ".join(rng.choice(WORDS + ["oov"]) for _ in range(rng.randint(0, 30)))
+            + rng.choice(["", "  ", "\t"]) for _ in range(n)]
+
+
+def reference_batches(encoder, lines, max_sentences):
+    """The per-row batches of the original _make_batches."""
+    tokens = []
+    for line in lines:
+        words = SPACE_NORMALIZER.sub(" ", line).strip().split()
+        ids = torch.LongTensor(len(words) + 1)
+        for i, word in enumerate(words):
+            ids[i] = encoder.dictionary.get(word, encoder.unk_index)
+        ids[len(words)] = encoder.eos_index
+        tokens.append(ids)
+    lengths = np.array([t.numel() for t in tokens])
+    indices = np.argsort(-lengths, kind=encoder.sort_kind)
+    batches, batch = [], []
+    ntokens = 0
+
+    def flush():
+        toks = batch[0].new_full((len(batch), batch[0].shape[0]), encoder.pad_index)
+        for i, row in enumerate(batch):
+            toks[i, -row.shape[0]:] = row
+        batches.append((toks, [row.shape[0] for row in batch], list(batch_indices)))
+
+    batch_indices = []
+    for i in indices:
+        if batch and ((encoder.max_tokens is not None and ntokens + lengths[i] > encoder.max_tokens)
+                      or (max_sentences is not None and len(batch) == max_sentences)):
+            flush()
+            batch, batch_indices, ntokens = [], [], 0
+        batch.append(tokens[i])
+        batch_indices.append(int(i))
+        ntokens += tokens[i].shape[0]
+    if batch:
+        flush()
+    return batches
+
+
+@pytest.mark.parametrize("max_tokens, max_sentences", [(100, 16), (None, 7), (1000, None)])
+def test_batches_match_per_row_padding(model_path, max_tokens, max_sentences):
+    encoder = SentenceEncoder(model_path, max_tokens=max_tokens, cpu=True, sort_kind="mergesort")
+    lines = random_lines(500)
+    expected = reference_batches(encoder, lines, max_sentences)
+    # The batches share one buffer: copies are kept before the next one is made
+    batches = [(batch.tokens.clone(), batch.lengths.tolist(), indices)
+               for batch, indices in encoder._make_batches(lines, max_sentences)]
+    assert len(batches) == len(expected)
+    for (tokens, lengths, indices), (expected_tokens, expected_lengths, expected_indices) \
+            in zip(batches, expected):
+        assert torch.equal(tokens, expected_tokens)
+        assert lengths == expected_lengths
+        assert indices == expected_indices
+
+
+def test_encode_sentences_keeps_the_input_order(model_path):
+    encoder = SentenceEncoder(model_path, max_sentences=8, cpu=True)
+    lines = random_lines(50, seed=1)
+    embeddings = encoder.encode_sentences(lines)
+    single = np.vstack([encoder.encode_sentences([line]) for line in lines])
+    np.testing.assert_allclose(embeddings, single, atol=1e-5)
+
+
+@pytest.mark.parametrize("nlines, num_shards, buffer_size", [
+    (0, 3, 10), (1, 3, 10), (5, 3, 10), (25, 4, 10), (99, 3, 10), (100, 3, 10),
+    (101, 3, 10), (1234, 7, 100)])
+def test_shard_ranges(nlines, num_shards, buffer_size):
+    ranges = ShardRanges(nlines, num_shards, buffer_size)
+    assert len(ranges) <= num_shards
+    assert sum(end - start for start, end in ranges) == nlines
+    assert all(start % buffer_size == 0 and end > start for start, end in ranges)
+    assert all(a[1] == b[0] for a, b in zip(ranges, ranges[1:]))
+    if ranges:
+        assert ranges[0][0] == 0 and ranges[-1][1] == nlines
+        # uneven splits differ by at most one buffer
+        nbuffers = [(end - start + buffer_size - 1) // buffer_size for start, end in ranges]
+        assert max(nbuffers) - min(nbuffers) <= 1
+
+
+def test_line_offsets(tmp_path):
+    path = tmp_path / "lines"
+    lines = ["l%d\r\n" % i if i % 3 else "a\rb%d\n" % i for i in range(20)]
+    path.write_bytes("".join(lines).encode("utf-8") + "é last".encode("utf-8"))
+    with open(str(path), encoding="utf-8") as fin:
+        text_lines = fin.readlines()
+    nlines, offsets = LineOffsets(str(path), buffer_size=4)
+    assert nlines == len(text_lines) == 28
+    assert len(offsets) == 7
+    contents = path.read_bytes()
+    for i, (offset, first) in enumerate(offsets):
+        assert first <= 4 * i
+        assert offset == 0 or contents[offset - 1:offset] == b"\n"
+        # seeking to the offset and skipping the lines before the boundary
+        with open(str(path), "rb") as fin:
+            fin.seek(offset)
+            rest = fin.read().decode("utf-8")
+        with open(str(tmp_path / "rest"), "w", encoding="utf-8", newline="") as fout:
+            fout.write(rest)
+        with open(str(tmp_path / "rest"), encoding="utf-8") as fin:
+            assert fin.readlines()[4 * i - first:] == text_lines[4 * i:]
+
+
+def test_sharded_output_matches_encode_file(model_path, tmp_path):
+    inp = tmp_path / "input"
+    lines = random_lines(35, seed=2)
+    inp.write_bytes("".join(
+        line + ("\r\n" if i % 4 == 1 else "\n") for i, line in enumerate(lines)).encode("utf-8"))
+    encoder_kwargs = dict(model_path=model_path, max_sentences=4, cpu=True)
+    threads = torch.get_num_threads()
+    torch.set_num_threads(1)
+    try:
+        EncodeFile(SentenceEncoder(**encoder_kwargs), str(inp), str(tmp_path / "single"),
+                   buffer_size=10)
+    finally:
+        torch.set_num_threads(threads)
+    expected = (tmp_path / "single").read_bytes()
+    assert len(expected) == 35 * 8 * 4
+    # uneven splits (4 buffers in 3 shards), and more shards than buffers
+    for num_shards in [3, 6]:
+        out = tmp_path / ("sharded%d" % num_shards)
+        EncodeFileSharded(encoder_kwargs, str(inp), str(out), num_shards,
+                          buffer_size=10, num_threads=1)
+        assert out.read_bytes() == expected
+    assert sorted(x.name for x in tmp_path.iterdir()) == [
+        "input", "sharded3", "sharded6", "single"]
@@ -0,0 +1,29 @@
+import numpy as np
+
+from length_batching import encode_by_length, length_batches, padded_size
+
+
+def test_length_batches():
+    lengths = [5, 100, 7, 6, 90, 8, 1000]
+    batches = length_batches(lengths, max_tokens=200, max_sentences=3)
+    assert [batch.tolist() for batch in batches] == [[0, 3, 2], [5, 4], [1], [6]]
+    assert sorted(np.concatenate(batches).tolist()) == list(range(len(lengths)))
+    for batch in batches:
+        assert len(batch) == 1 or len(batch) * max(lengths[i] for i in batch) <= 200
+    # Fixed batches in document order pay for the long sentences
+    fixed = [np.arange(i, min(i + 3, len(lengths))) for i in range(0, len(lengths), 3)]
+    assert padded_size(lengths, batches) < padded_size(lengths, fixed)
+    assert length_batches([]) == []
+
+
+def test_encode_by_length_restores_order():
+    texts = ["a" * n for n in (30, 3, 12, 7, 50, 1)]
+    calls = []
+
+    def encode_batch(batch):
+        calls.append(batch)
+        return np.asarray([[len(text), 1] for text in batch], dtype=np.float32)
+
+    embeddings = encode_by_length(texts, encode_batch, max_tokens=60, max_sentences=4)
+    assert embeddings[:, 0].tolist() == [30, 3, 12, 7, 50, 1]
+    assert [len(x) for x in calls[0]] == [1, 3, 7, 12]
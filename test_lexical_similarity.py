@@ -0,0 +1,57 @@
+import random
+
+import pytest
+import numpy as np
+from summa.commons import build_graph
+from summa.pagerank_weighted import pagerank_weighted_scipy
+from summa.summarizer import _get_similarity, _set_graph_edge_weights
+
+from lexical_similarity import build_sentence_graph, build_term_matrix, lexical_similarity_matrix
+from ranking import pagerank_weighted
+
+
+@pytest.fixture
+def sample_tokens():
+    rng = random.Random(42)
+    vocab = ["trump", "cohen", "lawyer", "counsel", "plead", "guilti",
+             "court", "crime", "deal", "sentenc", "friend", "legal"]
+    tokens = []
+    for _ in range(60):
+        tokens.append(" ".join(
+            rng.choice(vocab) for _ in range(rng.randint(1, 8))))
+    # Single-word sentences share a zero denominator
+    tokens += ["trump", "court"]
+    return list(dict.fromkeys(tokens))
+
+
+def test_build_term_matrix():
+    matrix = build_term_matrix(["a b a", "c", "b c d"])
+    assert matrix.shape == (3, 4)
+    assert matrix.toarray().tolist() == [
+        [2, 1, 0, 0], [0, 0, 1, 0], [0, 1, 1, 1]]
+
+
+def test_similarity_matches_summa(sample_tokens):
+    similarities = lexical_similarity_matrix(sample_tokens).toarray()
+    for i, token_1 in enumerate(sample_tokens):
+        for j, token_2 in enumerate(sample_tokens):
+            expected = 0 if i == j else _get_similarity(token_1, token_2)
+            assert similarities[i, j] == pytest.approx(expected, abs=1e-9)
+
+
+def test_graph_scores_match_summa(sample_tokens):
+    expected_graph = build_graph(sample_tokens)
+    _set_graph_edge_weights(expected_graph)
+    graph = build_sentence_graph(sample_tokens)
+    assert graph.n_edges == len(expected_graph.edges()) // 2
+    expected = pagerank_weighted_scipy(expected_graph)
+    scores = pagerank_weighted(graph)
+    for node in sample_tokens:
+        assert scores[node] == pytest.approx(expected[node], abs=1e-6)
+
+
+def test_all_zero_similarities():
+    graph = build_sentence_graph(["a b", "c d", "e f"])
+    assert graph.n_edges == 3
+    assert graph.adjacency.toarray().tolist() == [[0, 1, 1], [1, 0, 1], [1, 1, 0]]
+    assert np.allclose(lexical_similarity_matrix(["a b", "c d"]).toarray(), 0)
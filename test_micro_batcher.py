@@ -0,0 +1,94 @@
+import threading
+
+import numpy as np
+import pytest
+
+from micro_batcher import Histogram, MicroBatcher
+
+
+def fake_encode(texts):
+    return np.asarray([[len(text), float(text[-1])] for text in texts], dtype=np.float32)
+
+
+def test_concurrent_requests_share_batches():
+    batcher = MicroBatcher(fake_encode, max_batch_size=16, max_wait=0.05)
+    results = {}
+
+    def run(i):
+        texts = ["sentence %d" % j for j in range(i, i + 5)]
+        results[i] = (texts, batcher.encode(texts))
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(10)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    for texts, embeddings in results.values():
+        np.testing.assert_array_equal(embeddings, fake_encode(texts))
+    stats = batcher.stats
+    assert stats.n_sentences == 50
+    # 50 sentences in batches of at most 16, instead of one batch per request
+    assert 4 <= stats.n_batches < 10
+    assert sum(stats.batch_sizes.values()) == stats.n_batches
+    assert sum(stats.wait_ms.values()) == 50
+    batcher.close()
+
+
+def test_large_request_and_errors():
+    batcher = MicroBatcher(fake_encode, max_batch_size=4, max_wait=0.001)
+    texts = ["text %d" % i for i in range(10)]
+    np.testing.assert_array_equal(batcher.encode(texts), fake_encode(texts))
+    assert batcher.encode([]).shape == (0, 0)
+    with pytest.raises(ValueError):
+        # float("x") fails
+        batcher.encode(["x"])
+    # The worker survives the failure
+    np.testing.assert_array_equal(batcher.encode(["a 1"]), fake_encode(["a 1"]))
+    batcher.close()
+
+
+def test_malformed_encoder_output():
+    def encode(texts):
+        if texts[0] == "short":
+            return fake_encode(texts)[:-1]
+        if texts[0] == "ragged":
+            # np.stack fails when the request completes
+            return [np.zeros(len(text)) for text in texts]
+        return fake_encode(texts)
+
+    batcher = MicroBatcher(encode, max_batch_size=4, max_wait=0.001)
+    with pytest.raises(ValueError):
+        batcher.submit(["short", "text 1"]).result(timeout=5)
+    with pytest.raises(ValueError):
+        batcher.submit(["ragged", "longer text 2"]).result(timeout=5)
+    # The worker survives both failures
+    np.testing.assert_array_equal(
+        batcher.submit(["a 1"]).result(timeout=5), fake_encode(["a 1"]))
+    batcher.close()
+
+
+def test_workers_encode_concurrently():
+    # Every batch waits for another one to be encoded at the same time
+    barrier = threading.Barrier(2, timeout=5)
+
+    def encode(texts):
+        barrier.wait()
+        return fake_encode(texts)
+
+    batcher = MicroBatcher(encode, max_batch_size=4, max_wait=0.05, workers=2)
+    futures = [batcher.submit(["text %d" % i for i in range(j, j + 4)]) for j in range(0, 16, 4)]
+    for j, future in zip(range(0, 16, 4), futures):
+        np.testing.assert_array_equal(
+            future.result(timeout=10), fake_encode(["text %d" % i for i in range(j, j + 4)]))
+    # The batches of one request are spread over both workers
+    texts = ["text %d" % i for i in range(8)]
+    np.testing.assert_array_equal(batcher.encode(texts), fake_encode(texts))
+    assert batcher.stats.n_batches == 6
+    batcher.close()
+
+
+def test_histogram():
+    histogram = Histogram((1, 2, 4))
+    for value in (0.5, 1, 3, 10):
+        histogram.add(value)
+    assert histogram.as_dict() == {"<=1": 2, "<=2": 0, "<=4": 1, ">4": 1}
@@ -0,0 +1,68 @@
+import numpy as np
+import pytest
+from summa.syntactic_unit import SyntacticUnit
+
+from embedding_graph import score_embedded_sentences
+from knn_graph import knn_similarity_matrix
+from precision import EmbeddingMatrix, accuracy_report, l2_normalize
+
+
+def positive_embeddings(n_sentences=200, dim=128, seed=0):
+    # Non-negative, so that the dense similarity graphs have no negative weights
+    rng = np.random.RandomState(seed)
+    return l2_normalize(rng.rand(n_sentences, dim) ** 3)
+
+
+def test_l2_normalize():
+    embeddings = np.random.RandomState(0).randn(5, 8).astype(np.float32)
+    embeddings[2] = 0
+    normalized = l2_normalize(embeddings, copy=True)
+    norms = np.linalg.norm(embeddings, axis=1)
+    norms[2] = 1
+    np.testing.assert_allclose(normalized, embeddings / norms[:, None], rtol=1e-6)
+    assert l2_normalize(embeddings) is embeddings
+
+
+@pytest.mark.parametrize("precision,ratio", [("float16", 2), ("int8", 4)])
+def test_reduced_precision(precision, ratio):
+    embeddings = positive_embeddings()
+    full = EmbeddingMatrix.from_float(embeddings)
+    reduced = EmbeddingMatrix.from_float(embeddings, precision)
+    assert reduced.nbytes <= full.nbytes / ratio + 4 * len(embeddings)
+    np.testing.assert_allclose(reduced.rows(), embeddings, atol=5e-3)
+    similarities = reduced.similarities(block_size=64)
+    assert similarities.dtype == np.float16
+    assert similarities.nbytes == full.similarities().nbytes / 2
+    np.testing.assert_allclose(similarities, embeddings @ embeddings.T, atol=1e-2)
+    # The sparse top-k neighbours barely change
+    expected = knn_similarity_matrix(embeddings, 10, use_faiss=False)
+    matrix = knn_similarity_matrix(reduced, 10, block_size=64)
+    overlap = expected.multiply(matrix).nnz / expected.nnz
+    assert overlap > 0.9
+
+
+def test_accuracy_report():
+    embeddings = positive_embeddings(n_sentences=1000)
+    reports = accuracy_report(embeddings)
+    assert [report.precision for report in reports] == ["float32", "float16", "int8"]
+    assert reports[0].spearman == pytest.approx(1)
+    for report in reports[1:]:
+        assert report.spearman > 0.99
+        assert report.top_k_overlap >= 0.8
+        # The whole scoring takes less than a dense float32 similarity matrix
+        assert report.peak_bytes < 1000 * 1000 * 4
+    # No sparse or float64 copy of the dense similarities is made
+    assert reports[0].peak_bytes < 1.5 * 1000 * 1000 * 4
+    embeddings = embeddings[:200]
+    reports = accuracy_report(embeddings, knn=20)
+    assert all(report.spearman > 0.95 for report in reports)
+
+
+def test_score_embedded_sentences_precision():
+    embeddings = positive_embeddings(n_sentences=50)
+    scores = {}
+    for precision in ("float32", "int8"):
+        sentences = [SyntacticUnit("s%d" % i, i) for i in range(50)]
+        score_embedded_sentences(sentences, embeddings, precision=precision)
+        scores[precision] = np.asarray([x.score for x in sentences])
+    np.testing.assert_allclose(scores["int8"], scores["float32"], rtol=1e-2)
@@ -0,0 +1,139 @@
+import random
+
+import pytest
+import numpy as np
+from scipy import sparse
+from scipy.linalg import eig
+from summa.graph import Graph
+from summa.pagerank_weighted import (
+    pagerank_weighted_scipy, build_adjacency_matrix, build_probability_matrix
+)
+
+from compact_graph import CompactGraph
+from ranking import (
+    graph_to_adjacency, power_iteration, rank_nodes, pagerank_weighted, top_k_indices
+)
+
+
+def random_graph(seed, n_nodes=40, density=0.2, weighted=True, self_loops=False):
+    rng = random.Random(seed)
+    graph = Graph()
+    for i in range(n_nodes):
+        graph.add_node("n%d" % i)
+    for i in range(n_nodes):
+        for j in range(i if self_loops else i + 1, n_nodes):
+            if rng.random() < density:
+                graph.add_edge(("n%d" % i, "n%d" % j),
+                               rng.random() + 0.1 if weighted else 1)
+    for node in graph.nodes():
+        if not graph.neighbors(node):
+            graph.del_node(node)
+    return graph
+
+
+def dominant_eigenvector(graph, damping=0.85):
+    matrix = (damping * build_adjacency_matrix(graph).toarray() +
+              (1 - damping) * build_probability_matrix(graph))
+    vals, vecs = eig(matrix, left=True, right=False)
+    vec = np.abs(vecs[:, np.argmax(vals.real)].real)
+    return vec / np.linalg.norm(vec)
+
+
+def test_matches_summa_on_dense_graph():
+    graph = random_graph(0, n_nodes=30, density=0.9)
+    expected = pagerank_weighted_scipy(graph)
+    scores = pagerank_weighted(graph)
+    assert scores.keys() == expected.keys()
+    for node in expected:
+        assert scores[node] == pytest.approx(expected[node], abs=1e-6)
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_matches_dominant_eigenvector(seed):
+    graph = random_graph(seed, weighted=seed % 2 == 0, self_loops=True)
+    scores, score_dict, _ = rank_nodes(graph)
+    assert np.allclose(scores, dominant_eigenvector(graph), atol=1e-6)
+    assert list(score_dict.keys()) == graph.nodes()
+
+
+def test_graph_to_adjacency():
+    graph = random_graph(3, self_loops=True)
+    adjacency, nodes = graph_to_adjacency(graph)
+    assert nodes == graph.nodes()
+    assert (adjacency != adjacency.T).nnz == 0
+    assert adjacency.sum() == pytest.approx(
+        sum(graph.edge_weight(edge) for edge in graph.edges()))
+
+
+def test_dangling_nodes():
+    adjacency = sparse.csr_matrix(np.array([
+        [0, 1, 0], [1, 0, 0], [0, 0, 0]], dtype=float))
+    scores, _ = power_iteration(adjacency)
+    assert scores[0] == pytest.approx(scores[1])
+    assert scores[2] < scores[0]
+    assert np.linalg.norm(scores) == pytest.approx(1)
+    # Redistribute the dangling score to the first node only
+    scores, _ = power_iteration(adjacency, dangling=np.array([1., 0., 0.]))
+    assert scores[0] > scores[1]
+
+
+def test_warm_start_and_iteration_cap():
+    graph = random_graph(7, n_nodes=200, density=0.05)
+    adjacency, _ = graph_to_adjacency(graph)
+    scores, cold_stats = power_iteration(adjacency)
+    warm_scores, warm_stats = power_iteration(adjacency, initial=scores)
+    assert warm_stats.iterations < cold_stats.iterations
+    assert np.allclose(scores, warm_scores, atol=1e-7)
+    _, stats = power_iteration(adjacency, max_iter=3)
+    assert stats.iterations == 3
+    assert power_iteration(sparse.csr_matrix((0, 0)))[0].shape == (0,)
+
+
+def test_top_k_indices():
+    scores = np.array([0.1, 0.5, 0.3, 0.5, 0.2])
+    assert top_k_indices(scores, 3).tolist() == [1, 3, 2]
+    assert top_k_indices(scores, 10).tolist() == [1, 3, 2, 4, 0]
+    assert top_k_indices(scores, 0).tolist() == []
+    # Ties at the k boundary go to the lowest indices
+    assert top_k_indices(np.array([1.] * 20 + [2.]), 3).tolist() == [20, 0, 1]
+    rng = np.random.RandomState(0)
+    for _ in range(20):
+        scores = rng.randint(0, 4, size=50).astype(float)
+        assert top_k_indices(scores, 7).tolist() == \
+            np.argsort(-scores, kind="stable")[:7].tolist()
+
+
+def test_top_k_early_exit():
+    graph = random_graph(11, n_nodes=300, density=0.03)
+    adjacency, _ = graph_to_adjacency(graph)
+    scores, stats = power_iteration(adjacency, tol=1e-12)
+    assert not stats.stopped_early
+    assert stats.iterations_saved == 0
+    approx_scores, approx_stats = power_iteration(
+        adjacency, tol=1e-12, top_k=5, patience=3)
+    assert approx_stats.stopped_early
+    assert approx_stats.iterations < stats.iterations
+    assert approx_stats.iterations_saved > 0
+    assert top_k_indices(approx_scores, 5).tolist() == top_k_indices(scores, 5).tolist()
+
+
+@pytest.mark.parametrize("n_sentences", [12, 30, 2000])
+def test_negative_similarities(n_sentences):
+    rng = np.random.RandomState(n_sentences)
+    embeddings = rng.randn(n_sentences, 16)
+    embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True)
+    similarities = embeddings @ embeddings.T
+    assert (similarities < 0).mean() > 0.3
+    graph = CompactGraph.from_similarity_matrix(list(range(n_sentences)), similarities)
+    scores, _ = power_iteration(graph.adjacency)
+    assert np.isfinite(scores).all() and (scores > 0).all()
+    # Same ranking as with the negative similarities removed beforehand
+    positive = np.maximum(similarities, 0)
+    np.fill_diagonal(positive, 0)
+    expected, _ = power_iteration(sparse.csr_matrix(positive))
+    assert np.allclose(scores, expected, atol=1e-6)
+    # A node whose edges are all negative becomes dangling
+    adjacency = sparse.csr_matrix(np.array([
+        [0, 1, -1], [1, 0, -1], [-1, -1, 0]], dtype=float))
+    scores, _ = power_iteration(adjacency)
+    assert np.isfinite(scores).all() and scores[2] < scores[0]
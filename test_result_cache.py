@@ -0,0 +1,89 @@
+import pickle
+
+from summa.syntactic_unit import SyntacticUnit
+
+from compact_graph import CompactGraph
+from result_cache import ResultCache, make_key
+
+
+def test_make_key():
+    key = make_key("some text", "textrank")
+    assert key == make_key("some text", "textrank", [])
+    assert key != make_key("some text", "laser")
+    assert key != make_key("some text", "textrank", ["text"])
+    assert key != make_key("some text", "textrank", version="0")
+    assert make_key("t", "m", ["a", "b"]) == make_key("t", "m", ["b", "a"])
+
+
+def test_copies_and_counters():
+    cache = ResultCache()
+    sentences = [SyntacticUnit("A sentence.", "sentenc")]
+    graph = CompactGraph.from_edges(["a", "b"], [0], [1])
+    assert cache.get("k") is None
+    cache.put("k", (sentences, graph))
+    cached_sentences, cached_graph = cache.get("k")
+    cached_sentences[0].score = 1
+    assert cache.get("k")[0][0].score == -1
+    assert cached_graph.nodes() == ["a", "b"]
+    assert cache.get_or_compute("k", lambda: 1 / 0)[1].n_edges == 1
+    stats = cache.stats
+    assert (stats.hits, stats.misses, stats.disk_hits, stats.entries) == (3, 1, 0, 1)
+
+
+def test_lru_eviction():
+    size = len(pickle.dumps("x" * 100, protocol=pickle.HIGHEST_PROTOCOL))
+    cache = ResultCache(max_bytes=3 * size)
+    for key in "abc":
+        cache.put(key, "x" * 100)
+    cache.get("a")
+    cache.put("d", "x" * 100)
+    assert cache.get("b") is None
+    assert all(cache.get(key) is not None for key in "acd")
+    assert cache.stats.size_bytes == 3 * size
+    # Too large for the memory tier
+    cache.put("e", "x" * 1000)
+    assert cache.get("e") is None
+
+
+def test_disk_tier(tmp_path):
+    cache = ResultCache(directory=tmp_path)
+    cache.put("0123abcd", {"scores": [1, 2, 3]})
+    restarted = ResultCache(directory=tmp_path)
+    assert restarted.get("0123abcd") == {"scores": [1, 2, 3]}
+    assert restarted.stats.disk_hits == 1
+    assert restarted.get("0123abcd") == {"scores": [1, 2, 3]}
+    assert restarted.stats.disk_hits == 1
+    restarted.clear(disk=True)
+    assert ResultCache(directory=tmp_path).get("0123abcd") is None
+
+
+def test_disk_tier_is_bounded(tmp_path):
+    probe = ResultCache(directory=tmp_path / "probe")
+    probe.put("00", "x" * 100)
+    size = probe.stats.disk_bytes
+    cache = ResultCache(max_bytes=0, directory=tmp_path / "cache", max_disk_bytes=3 * size)
+    for key in ["aa", "bb", "cc"]:
+        cache.put(key, "x" * 100)
+    assert cache.get("aa") is not None
+    cache.put("dd", "x" * 100)
+    assert cache.get("bb") is None
+    assert all(cache.get(key) is not None for key in ["aa", "cc", "dd"])
+    assert (cache.stats.disk_entries, cache.stats.disk_bytes) == (3, 3 * size)
+    assert len(list((tmp_path / "cache").glob("*/*.pkl"))) == 3
+    # Restarting indexes the files and applies a smaller bound
+    restarted = ResultCache(directory=tmp_path / "cache", max_disk_bytes=2 * size)
+    assert restarted.stats.disk_entries == 2
+
+
+def test_disk_entries_are_checked(tmp_path):
+    cache = ResultCache(max_bytes=0, directory=tmp_path)
+    cache.put("aa", [1, 2, 3])
+    cache.put("bb", [4, 5, 6])
+    assert ResultCache(directory=tmp_path, version="other").get("aa") is None
+    assert not cache._path("aa").exists()
+    path = cache._path("bb")
+    path.write_bytes(path.read_bytes()[:-1] + b"!")
+    assert cache.get("bb") is None
+    assert not path.exists()
+    assert cache.get("aa") is None
+    assert cache.stats.disk_entries == 0
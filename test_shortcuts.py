@@ -0,0 +1,123 @@
+import os
+import re
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+pytest.importorskip("fastBPE")
+pytest.importorskip("faiss")
+pytest.importorskip("torch")
+os.environ.setdefault("LASER", str(Path(__file__).parent / "LASER_PROJECT"))
+from laser import shortcuts  # noqa: E402
+from laser.lib import text_processing  # noqa: E402
+from laser.lib.text_processing import TokenizerCommands, TokenizerPool  # noqa: E402
+
+
+class StubEncoder:
+    loaded = []
+
+    def __init__(self, model_path, max_tokens, cpu, fp16):
+        self.loaded.append((model_path, max_tokens, cpu, fp16))
+        self.encoder = type("Model", (), {"output_units": 4})()
+        self.calls = []
+
+    def encode_sentences(self, sentences, max_sentences=None):
+        self.calls.append((list(sentences), max_sentences))
+        return np.asarray([[len(x), 0, 0, 1] for x in sentences], dtype=np.float32)
+
+
+class StubBPE:
+    loaded = []
+
+    def __init__(self, codes):
+        self.loaded.append(codes)
+
+    def apply(self, lines):
+        return [line + "@@" for line in lines]
+
+
+@pytest.fixture(autouse=True)
+def stubs(monkeypatch):
+    StubEncoder.loaded.clear()
+    StubBPE.loaded.clear()
+    monkeypatch.setattr(shortcuts, "SentenceEncoder", StubEncoder)
+    monkeypatch.setattr(shortcuts, "BPEfastLoad", lambda inp, codes: StubBPE(codes))
+    monkeypatch.setattr(shortcuts, "_ENCODERS", {})
+    monkeypatch.setattr(shortcuts, "_ENCODER_COUNTERS", {"cold": 0, "warm": 0, "load_seconds": 0.})
+    shortcuts._load_bpe.cache_clear()
+    yield
+    shortcuts._load_bpe.cache_clear()
+
+
+def test_get_encoder_is_reused():
+    first = shortcuts.get_encoder("model.pt", cpu=True)
+    assert shortcuts.get_encoder("model.pt", cpu=True) is first
+    assert shortcuts.get_encoder("model.pt", cpu=True, max_tokens=10000) is first
+    assert shortcuts.get_encoder("model.pt", cpu=False) is not first
+    assert StubEncoder.loaded == [("model.pt", 10000, True, False), ("model.pt", 10000, False, False)]
+    stats = shortcuts.encoder_cache_stats()
+    assert (stats.cold, stats.warm) == (2, 2)
+    assert stats.load_seconds >= 0
+
+
+def test_pipeline_loads_once(monkeypatch):
+    pool = TokenizerPool(size=1, timeout=10, commands=lambda *key: ["cat"])
+    monkeypatch.setattr(shortcuts, "TOKENIZER_POOL", pool)
+    try:
+        first = shortcuts.LaserPipeline("model.pt", "codes", use_cpu=True, batch_size=5)
+        second = shortcuts.LaserPipeline("model.pt", "codes", use_cpu=True)
+        assert first.encoder is second.encoder and first.bpe is second.bpe
+        assert StubBPE.loaded == ["codes"] and len(StubEncoder.loaded) == 1
+        embeddings = first.encode("en", ["a b", "c"])
+        assert embeddings.shape == (2, 4)
+        assert first.encoder.calls == [(["a b@@", "c@@"], 5)]
+        assert first.encode("en", []).shape == (0, 4)
+        assert shortcuts.encoder_cache_stats()[:2] == (1, 1)
+    finally:
+        pool.close()
+
+
+class Stop(Exception):
+    pass
+
+
+def stages(commands):
+    """The pipeline stages, without the flags that only change the buffering."""
+    stages = []
+    for command in commands:
+        command = command.replace(text_processing.PERL_UNBUFFERED, "").replace("stdbuf -oL ", "")
+        command = re.sub(r" -(u|b|threads \d+)(?= (?!\d))", "", " %s " % command)
+        stages.append(" ".join(command.split()))
+    return stages
+
+
+@pytest.mark.parametrize("lang", ["en", "de", "el", "zh", "cmn", "ja"])
+def test_pipeline_tokenizes_like_the_file_pipeline(monkeypatch, tmp_path, lang):
+    keys = []
+
+    def commands(*key):
+        keys.append(key)
+        return ["cat"]
+
+    pool = TokenizerPool(size=1, timeout=10, commands=commands)
+    monkeypatch.setattr(shortcuts, "TOKENIZER_POOL", pool)
+    try:
+        shortcuts.LaserPipeline("model.pt", "codes", use_cpu=True).tokenize(lang, ["a line"])
+    finally:
+        pool.close()
+
+    # the shell pipeline run by the temp file path
+    def run(command, **kwargs):
+        shell_commands.append(command)
+        raise Stop
+
+    shell_commands = []
+    monkeypatch.setattr(text_processing, "run", run)
+    source = tmp_path / "source"
+    source.write_text("a line\n")
+    with pytest.raises(Stop):
+        shortcuts.text_file_pipeline(lang, str(source), "model.pt", "codes", True, 32)
+    command = shell_commands[0].split(">")[0]
+    assert command.startswith("cat %s|" % source)
+    assert stages(TokenizerCommands(*keys[0])) == stages(command.split("|")[1:])
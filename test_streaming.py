@@ -0,0 +1,84 @@
+import random
+
+import pytest
+from summa.summarizer import _add_scores_to_sentences
+from summa.syntactic_unit import SyntacticUnit
+
+from lexical_similarity import build_sentence_graph
+from ranking import pagerank_weighted
+from streaming import detect_language, rank_windows, summarize_stream
+
+WORDS = ["trump", "cohen", "lawyer", "court", "counsel", "crime", "deal", "friend",
+         "legal", "process", "strategi", "weather", "sunni", "report", "investig"]
+
+
+def make_paragraphs(seed, n_paragraphs=30, n_sentences=5):
+    rng = random.Random(seed)
+    return [". ".join(" ".join(rng.sample(WORDS, rng.randint(3, 6)))
+                      for _ in range(n_sentences)) for _ in range(n_paragraphs)]
+
+
+def cut_paragraph(paragraph, lang):
+    return [SyntacticUnit(text, text) for text in paragraph.split(". ")]
+
+
+class Scorer:
+    def __init__(self):
+        self.window_sizes = []
+
+    def __call__(self, sentences, lang):
+        self.window_sizes.append(len(sentences))
+        graph = build_sentence_graph([x.token for x in sentences])
+        graph.remove_unreachable_nodes()
+        _add_scores_to_sentences(sentences, pagerank_weighted(graph))
+
+
+def test_single_window_matches_full_ranking():
+    paragraphs = make_paragraphs(0)
+    sentences = [x for p in paragraphs for x in cut_paragraph(p, "en")]
+    Scorer()(sentences, "en")
+    expected = sorted(sentences, key=lambda s: s.score, reverse=True)[:5]
+    results = list(summarize_stream(
+        paragraphs, Scorer(), cut_paragraph, lang="en", window_size=1000, top_k=5))
+    assert len(results) == 1
+    assert [x.text for x in results[0]] == [x.text for x in expected]
+    assert [x.paragraph for x in results[0]] == [
+        next(i for i, p in enumerate(paragraphs) if x.text in p.split(". "))
+        for x in results[0]]
+
+
+def test_windows_are_bounded():
+    scorer = Scorer()
+    results = list(summarize_stream(
+        iter(make_paragraphs(1)), scorer, cut_paragraph, lang="en",
+        window_size=40, overlap=10, top_k=8))
+    # 150 sentences: windows start at 0, 30, 60, 90, 120
+    assert scorer.window_sizes == [40, 40, 40, 40, 30]
+    assert len(results) == 5
+    assert all(len(x) == 8 for x in results)
+    final = results[-1]
+    assert [x.score for x in final] == sorted((x.score for x in final), reverse=True)
+    # Intermediate rankings only get better
+    for previous, current in zip(results, results[1:]):
+        assert current[-1].score >= previous[-1].score
+
+
+def test_overlapping_sentences_are_merged():
+    sentences = [SyntacticUnit(text, text) for p in make_paragraphs(2, 10)
+                 for text in p.split(". ")]
+    finished = list(rank_windows(sentences, "en", Scorer(), window_size=20, overlap=5))
+    flat = [x for window in finished for x in window]
+    assert [x.text for x in flat] == [x.text for x in sentences]
+    assert sum(x.score for x in flat) == pytest.approx(len(sentences), rel=0.2)
+    with pytest.raises(ValueError):
+        list(rank_windows(sentences, "en", Scorer(), window_size=10, overlap=10))
+
+
+def test_detect_language():
+    paragraphs = ["This is the first paragraph of an English document.",
+                  "The second paragraph is also written in plain English."]
+    lang, replay = detect_language(iter(paragraphs), min_chars=20)
+    assert lang == "en"
+    assert list(replay) == paragraphs
+    with pytest.raises(ValueError):
+        list(summarize_stream(paragraphs, Scorer(), cut_paragraph, languages=("zh",)))
@@ -0,0 +1,69 @@
+import pytest
+from summa.commons import build_graph, remove_unreachable_nodes
+from summa.keywords import _get_words_for_graph, _lemmas_to_words, _set_graph_edges
+import summa.keywords
+from summa.preprocessing.textcleaner import clean_text_by_word, tokenize_by_word
+
+from document_analysis import DocumentAnalysis
+from ranking import pagerank_weighted
+from summa_score_words import build_word_graph, keywords
+
+TEXT = """Mr. Cohen has twice pleaded guilty in federal court in Manhattan to a litany of crimes, and he has volunteered information to the special counsel and other agencies investigating Mr. Trump and his inner circle. He did all this without first obtaining a traditional, ironclad deal under which the government would commit to seeking leniency on Mr. Cohen’s behalf when he is sentenced on Dec. 12.
+
+Mr. Cohen has concluded that his life has been utterly destroyed by his relationship with Mr. Trump and his own actions, and to begin anew he needed to speed up the legal process by quickly confessing his crimes and serving any sentence he receives. Crimes, crime, criminal."""
+
+
+@pytest.mark.parametrize("window_size", [2, 3, 6])
+def test_word_graph_matches_summa(window_size, monkeypatch):
+    monkeypatch.setattr(summa.keywords, "WINDOW_SIZE", window_size)
+    tokens = clean_text_by_word(TEXT, "english")
+    split_text = list(tokenize_by_word(TEXT))
+    expected = build_graph(_get_words_for_graph(tokens))
+    _set_graph_edges(expected, tokens, split_text)
+    remove_unreachable_nodes(expected)
+    graph = build_word_graph(tokens, split_text, window_size)
+    graph.remove_unreachable_nodes()
+    assert graph.nodes() == expected.nodes()
+    coo = graph.adjacency.tocoo()
+    edges = [(graph.labels[i], graph.labels[j])
+             for i, j in zip(coo.row.tolist(), coo.col.tolist())]
+    assert sorted(edges) == sorted(expected.edges())
+    expected_scores = pagerank_weighted(expected)
+    scores = pagerank_weighted(graph)
+    assert list(scores) == list(expected_scores)
+    for lemma in expected_scores:
+        assert scores[lemma] == pytest.approx(expected_scores[lemma], abs=1e-12)
+
+
+def test_short_texts():
+    tokens = clean_text_by_word("court", "english")
+    assert build_word_graph(tokens, ["court"]).n_edges == 0
+    assert build_word_graph({}, []).nodes() == []
+
+
+def test_keywords_match_summa_pipeline():
+    tokens = clean_text_by_word(TEXT, "english")
+    expected_graph = build_graph(_get_words_for_graph(tokens))
+    _set_graph_edges(expected_graph, tokens, list(tokenize_by_word(TEXT)))
+    remove_unreachable_nodes(expected_graph)
+    expected_scores = pagerank_weighted(expected_graph)
+    lemmas = expected_graph.nodes()
+    lemmas.sort(key=lambda s: expected_scores[s], reverse=True)
+
+    extracted, lemmas_to_word, graph, scores = keywords(TEXT)
+    assert [lemma for _, lemma in extracted] == lemmas
+    assert [score for score, _ in extracted] == pytest.approx(
+        [expected_scores[x] for x in lemmas], abs=1e-12)
+    assert lemmas_to_word == _lemmas_to_words(tokens)
+    assert dict(scores) == pytest.approx(expected_scores, abs=1e-12)
+    assert scores.array.tolist() == [scores[x] for x in graph.nodes()]
+
+
+@pytest.mark.parametrize("text, lang", [(TEXT, "de"), ("court", "en")])
+def test_keywords_without_graph(text, lang):
+    analysis = DocumentAnalysis(text)
+    analysis.lang = lang
+    extracted, lemmas_to_word, graph, scores = keywords(analysis)
+    assert (extracted, lemmas_to_word, graph) == ([], {}, None)
+    assert len(scores) == 0 and scores.array.shape == (0,)
+    assert scores.ranked() == []
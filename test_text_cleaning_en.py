@@ -0,0 +1,71 @@
+import threading
+
+from summa.preprocessing import textcleaner
+
+from text_cleaning_en import WordCache, clean_text_by_word
+
+TEXT = ("Cohen pleaded guilty to 8 crimes. The crime was serious, and criminal courts "
+        "heard the pleading lawyers' arguments in U.S. court. Lawyer Cohen pleads again!")
+SENTENCES = [
+    "Cohen pleaded guilty to 8 crimes.", "The crime was serious, and criminal courts heard it.",
+    "Lawyer-client privilege; the courts (again) heard 2 pleas."]
+
+
+def summa_filter_words(texts, additional_stopwords=None):
+    textcleaner.init_textcleanner("english", additional_stopwords)
+    return textcleaner.filter_words(texts)
+
+
+def test_filter_words_matches_summa():
+    cache = WordCache()
+    assert cache.filter_words(SENTENCES) == summa_filter_words(SENTENCES)
+    assert cache.stats.misses > 0 and cache.stats.hits > 0
+    misses = cache.stats.misses
+    assert cache.filter_words(SENTENCES) == summa_filter_words(SENTENCES)
+    assert cache.stats.misses == misses
+    # Requests with other stopwords reuse the cached stems
+    assert cache.filter_words(SENTENCES, ["cohen", "court"]) == summa_filter_words(
+        SENTENCES, ["cohen", "court"])
+    assert "cohen" not in cache.filter_words(SENTENCES, ["cohen", "court"])[0]
+    assert cache.filter_words(SENTENCES) == summa_filter_words(SENTENCES)
+    assert cache.stats.misses == misses
+
+
+def test_clean_text_by_word_matches_summa():
+    for stopwords in (None, ["crime", "cohen"]):
+        expected = textcleaner.clean_text_by_word(TEXT, "english", additional_stopwords=stopwords)
+        tokens = clean_text_by_word(TEXT, additional_stopwords=stopwords)
+        assert list(tokens) == list(expected)
+        assert [(x.text, x.token) for x in tokens.values()] == [
+            (x.text, x.token) for x in expected.values()]
+
+
+def test_bounded_size_and_table(tmp_path):
+    cache = WordCache(max_size=3)
+    cache.filter_words(SENTENCES)
+    assert cache.stats.entries == 3
+    path = str(tmp_path / "stems.tsv")
+    cache.save_table(path, ["Pleaded", "courts", "the"])
+    cache = WordCache(max_size=3, table_path=path)
+    assert cache.stats.table_size == 3
+    assert cache.filter_words(["the courts pleaded"]) == summa_filter_words(["the courts pleaded"])
+    # "the" is a stopword: it is dropped before stemming
+    assert cache.stats.hits == 2 and cache.stats.entries == 0
+    assert cache.stats.hit_rate == 1.
+
+
+def test_thread_safety():
+    cache = WordCache(max_size=5)
+    expected = summa_filter_words(SENTENCES)
+    results = []
+
+    def run():
+        for _ in range(50):
+            results.append(cache.filter_words(SENTENCES))
+
+    threads = [threading.Thread(target=run) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(results) == 200 and all(result == expected for result in results)
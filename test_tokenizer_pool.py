@@ -0,0 +1,66 @@
+import os
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("fastBPE")
+os.environ.setdefault("LASER", str(Path(__file__).parent / "LASER_PROJECT"))
+from laser.lib.text_processing import TokenizerError, TokenizerPool, TokenizerWorker  # noqa: E402
+
+LINES = ["first line", "second\nline", "third line"]
+
+
+def stand_in(*commands):
+    return lambda lang, romanize, descape: list(commands)
+
+
+def test_worker_is_reused():
+    pool = TokenizerPool(size=1, timeout=10, commands=stand_in("cat", "cat"))
+    try:
+        assert pool.tokenize(LINES) == ["first line", "second line", "third line"]
+        assert pool.tokenize(LINES[:1]) == ["first line"]
+        assert pool.tokenize([]) == []
+        assert (pool.started, pool.failures) == (1, 0)
+    finally:
+        pool.close()
+
+
+def test_crashed_worker_is_restarted():
+    commands = [["head -n 1"], ["cat"]]
+    pool = TokenizerPool(size=1, timeout=10, commands=lambda *key: commands.pop(0))
+    try:
+        assert pool.tokenize(LINES) == ["first line", "second line", "third line"]
+        assert (pool.started, pool.failures) == (2, 1)
+    finally:
+        pool.close()
+
+    # Retried once only
+    pool = TokenizerPool(size=1, timeout=10, commands=stand_in("head -n 1"))
+    try:
+        with pytest.raises(TokenizerError, match="exited"):
+            pool.tokenize(LINES)
+        assert (pool.started, pool.failures) == (2, 2)
+    finally:
+        pool.close()
+
+
+def test_timeout():
+    pool = TokenizerPool(size=1, timeout=0.5, commands=stand_in("sleep 30"))
+    try:
+        with pytest.raises(TokenizerError, match=r"timed out after 0\.5s"):
+            pool.tokenize(LINES)
+        # Timeouts are not retried, and the worker is killed
+        assert (pool.started, pool.failures) == (1, 1)
+    finally:
+        pool.close()
+
+
+def test_line_count_check():
+    # drops the first line
+    worker = TokenizerWorker(["grep --line-buffered -v first"])
+    try:
+        with pytest.raises(TokenizerError, match="number of lines"):
+            worker.tokenize(LINES, timeout=10)
+    finally:
+        worker.close()
+    assert not worker.alive()
@@ -0,0 +1,42 @@
+import pytest
+from summa.keywords import _lemmas_to_words
+from summa.preprocessing.textcleaner import clean_text_by_word, tokenize_by_word
+
+from vocabulary import KeywordScores, Vocabulary
+
+TEXT = ("Cohen pleaded guilty to crimes. The crime was serious, and criminal courts "
+        "heard the pleading lawyers. Lawyer Cohen pleads again.")
+
+
+def test_vocabulary():
+    tokens = clean_text_by_word(TEXT, "english")
+    vocabulary = Vocabulary(tokens)
+    assert len(vocabulary) == len(set(unit.token for unit in tokens.values()))
+    assert vocabulary.lemmas_to_words() == _lemmas_to_words(tokens)
+    assert list(vocabulary.lemmas_to_words()) == list(_lemmas_to_words(tokens))
+    split_text = list(tokenize_by_word(TEXT))
+    lemma_ids = vocabulary.encode_words(split_text + ["unknownword"])
+    assert lemma_ids[-1] == -1
+    for word, lemma_id in zip(split_text, lemma_ids.tolist()):
+        if word in tokens:
+            assert vocabulary.lemmas[lemma_id] == tokens[word].token
+        else:
+            assert lemma_id == -1
+
+
+def test_keyword_scores():
+    tokens = clean_text_by_word(TEXT, "english")
+    vocabulary = Vocabulary(tokens)
+    nodes = vocabulary.lemmas[1:5]
+    values = [0.2, 0.5, 0.2, 0.7]
+    scores = KeywordScores(vocabulary, nodes, values)
+    expected = dict(zip(nodes, values))
+    assert dict(scores) == expected
+    assert list(scores) == nodes
+    assert vocabulary.lemmas[0] not in scores
+    with pytest.raises(KeyError):
+        scores["unknownword"]
+    lemmas = list(expected)
+    lemmas.sort(key=lambda s: expected[s], reverse=True)
+    assert scores.ranked() == [(expected[x], x) for x in lemmas]
+    assert scores.top(2).tolist() == [3, 1]
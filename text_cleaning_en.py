@@ -1,9 +1,115 @@
+import os
+import threading
+from collections import OrderedDict, namedtuple
+from typing import Dict, Iterable, List, Optional
+
 import spacy
 
-from summa.preprocessing.textcleaner import init_textcleanner, filter_words, merge_syntactic_units
+from summa.preprocessing.snowball import SnowballStemmer
+from summa.preprocessing.stopwords import get_stopwords_by_language
+from summa.preprocessing.textcleaner import (
+    AB_ACRONYM_LETTERS, HAS_PATTERN, merge_syntactic_units, replace_with_separator,
+    strip_numeric, strip_punctuation, tokenize)
+
+if HAS_PATTERN:
+    from pattern.en import tag
 
 NLP = spacy.load("en_core_web_sm")
 
+MAX_WORDS = 200000
+
+WordCacheStats = namedtuple(
+    "WordCacheStats", ["hits", "misses", "entries", "table_size", "hit_rate"])
+
+
+class WordCache:
+    """Bounded, thread-safe cache of lowercase word -> stem.
+
+    Replaces the per-call stemming of summa's filter_words. The words of a
+    precomputed table (e.g. the most frequent English words, see `save_table`)
+    are never evicted. The stopwords are checked on every call, so requests
+    with different additional stopwords share the cached stems.
+    """
+
+    def __init__(self, max_size: int = MAX_WORDS, table_path: Optional[str] = None):
+        self.max_size = max_size
+        self._stemmer = SnowballStemmer("english")
+        self.stopwords = frozenset(
+            w for w in get_stopwords_by_language("english").split() if w)
+        # Precomputed stems
+        self._table: Dict[str, str] = {}
+        self._entries: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        if table_path:
+            self.load_table(table_path)
+
+    def _stem(self, word: str) -> str:
+        """Returns the stem of the word (under the lock)."""
+        stem = self._entries.get(word)
+        if stem is not None:
+            self._entries.move_to_end(word)
+            self.hits += 1
+            return stem
+        stem = self._table.get(word)
+        if stem is not None:
+            self.hits += 1
+            return stem
+        self.misses += 1
+        stem = self._entries[word] = self._stemmer.stem(word)
+        if len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+        return stem
+
+    def filter_words(self, texts: Iterable[str],
+                     additional_stopwords: Optional[Iterable[str]] = None) -> List[str]:
+        """Same output as summa's filter_words after init_textcleanner("english", ...)."""
+        stopwords = self.stopwords
+        if additional_stopwords:
+            stopwords = stopwords | frozenset(w for w in additional_stopwords if w)
+        results = []
+        with self._lock:
+            for text in texts:
+                words = strip_punctuation(strip_numeric(text.lower())).split()
+                results.append(" ".join(
+                    self._stem(word) for word in words if word not in stopwords))
+        return results
+
+    def load_table(self, path: str) -> None:
+        """Loads a tab-separated word -> stem table."""
+        table = {}
+        with open(path, encoding="utf-8") as fin:
+            for line in fin:
+                word, stem = line.rstrip("\n").split("\t")
+                table[word] = stem
+        with self._lock:
+            self._table = table
+
+    def save_table(self, path: str, words: Iterable[str]) -> None:
+        """Writes the stems of the given words (e.g. the top N English words) to a table."""
+        with open(path, "w", encoding="utf-8") as fout:
+            for word in dict.fromkeys(word.lower() for word in words):
+                fout.write("%s\t%s\n" % (word, self._stemmer.stem(word)))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    @property
+    def stats(self) -> WordCacheStats:
+        with self._lock:
+            total = self.hits + self.misses
+            return WordCacheStats(
+                self.hits, self.misses, len(self._entries), len(self._table),
+                self.hits / total if total else 0.)
+
+
+# Shared by all requests. Set EN_STEM_TABLE to preload a table at startup.
+WORD_CACHE = WordCache(table_path=os.environ.get("EN_STEM_TABLE"))
+
 
 def split_sentences(text):
     doc = NLP(text)
@@ -13,7 +119,34 @@ def split_sentences(text):
 def clean_text_by_sentences(text, additional_stopwords=None):
     """Tokenizes a given text into sentences, applying filters and lemmatizing them.
     Returns a SyntacticUnit list. """
-    init_textcleanner("english", additional_stopwords)
     original_sentences = split_sentences(text)
-    filtered_sentences = filter_words(original_sentences)
+    filtered_sentences = WORD_CACHE.filter_words(original_sentences, additional_stopwords)
     return merge_syntactic_units(original_sentences, filtered_sentences)
+
+
+def clean_paragraphs_by_sentences(paragraphs, additional_stopwords=None, batch_size=64):
+    """Bulk version of clean_text_by_sentences.
+
+    Runs spaCy over all the paragraphs with NLP.pipe. Returns one SyntacticUnit
+    list per paragraph.
+    """
+    results = []
+    for doc in NLP.pipe(paragraphs, batch_size=batch_size):
+        original_sentences = [sent.text.strip() for sent in doc.sents]
+        filtered_sentences = WORD_CACHE.filter_words(original_sentences, additional_stopwords)
+        results.append(merge_syntactic_units(original_sentences, filtered_sentences))
+    return results
+
+
+def clean_text_by_word(text, deacc=False, additional_stopwords=None):
+    """Same as summa's clean_text_by_word for English, using the shared word cache.
+    Returns a dict of word -> SyntacticUnit. """
+    text_without_acronyms = replace_with_separator(text, "", [AB_ACRONYM_LETTERS])
+    original_words = list(tokenize(text_without_acronyms, lowercase=True, deacc=deacc))
+    filtered_words = WORD_CACHE.filter_words(original_words, additional_stopwords)
+    if HAS_PATTERN:
+        tags = tag(" ".join(original_words))  # tag needs the context of the words in the text
+    else:
+        tags = None
+    units = merge_syntactic_units(original_words, filtered_words, tags)
+    return {unit.text: unit for unit in units}
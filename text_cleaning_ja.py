@@ -45,11 +45,21 @@ def get_tokens(text) -> List[TOKEN]:
     return [TOKEN(*x) for x in zip(results.words, mapped_tags, results.postags)]
 
 
+def get_paragraph_tokens(text) -> List[List[TOKEN]]:
+    paragraphs = clean_text(text).split("\n")
+    return [get_tokens(x) for x in paragraphs if x]
+
+
 def clean_and_cut_words(text: str, pos_tags: Sequence = ("noun", "verb"),
                         stopwords: Sequence = ("です", "する", "し", "いう"), verbose=DEBUG,
                         filter_digits=True) -> List[SyntacticUnit]:
-    paragraphs = clean_text(text).split("\n")
-    tokens = [get_tokens(x) for x in paragraphs if x]
+    tokens = get_paragraph_tokens(text)
+    return cut_words(tokens, pos_tags, stopwords, verbose, filter_digits)
+
+
+def cut_words(tokens: List[List[TOKEN]], pos_tags: Sequence = ("noun", "verb"),
+              stopwords: Sequence = ("です", "する", "し", "いう"), verbose=DEBUG,
+              filter_digits=True) -> List[SyntacticUnit]:
     results: List[SyntacticUnit] = []
     for paragraph_idx, paragraph in enumerate(tokens):
         word_idx = 0
@@ -68,8 +78,13 @@ def clean_and_cut_words(text: str, pos_tags: Sequence = ("noun", "verb"),
 def clean_and_cut_sentences(text: str, sentence_delimiter: str = "。！？；",
                             pos_tags: Sequence = ("noun", "verb"),
                             stopwords: Sequence = ("です", "する", "し", "いう"), filter_digits=True) -> List[SyntacticUnit]:
-    paragraphs = clean_text(text).split("\n")
-    tokens = [get_tokens(x) for x in paragraphs if x]
+    tokens = get_paragraph_tokens(text)
+    return cut_sentences(tokens, sentence_delimiter, pos_tags, stopwords, filter_digits)
+
+
+def cut_sentences(tokens: List[List[TOKEN]], sentence_delimiter: str = "。！？；",
+                  pos_tags: Sequence = ("noun", "verb"),
+                  stopwords: Sequence = ("です", "する", "し", "いう"), filter_digits=True) -> List[SyntacticUnit]:
     results: List[SyntacticUnit] = []
     for paragraph_idx, paragraph in enumerate(tokens):
         raw_text: List[str] = []
@@ -36,8 +36,8 @@ def clean_and_cut_words(text: str, pos_tags: Sequence = ("noun", "verb"),
     return cut_words(tokens, pos_tags, stopwords)
 
 
-def cut_words(tokens: List[Dict[str, Any]], pos_tags: Sequence,
-              stopwords: Sequence) -> List[SyntacticUnit]:
+def cut_words(tokens: List[Dict[str, Any]], pos_tags: Sequence = ("noun", "verb"),
+              stopwords: Sequence = ("是", "有")) -> List[SyntacticUnit]:
     results: List[SyntacticUnit] = []
     paragraph_idx, word_idx = 0, 0
     for token in tokens:
@@ -63,8 +63,9 @@ def clean_and_cut_sentences(text: str, sentence_delimiter: str = "。！？；",
     return cut_sentences(tokens, sentence_delimiter, pos_tags, stopwords)
 
 
-def cut_sentences(tokens: List[Dict[str, Any]], sentence_delimiter: str,
-                  pos_tags: Sequence, stopwords: Sequence) -> List[SyntacticUnit]:
+def cut_sentences(tokens: List[Dict[str, Any]], sentence_delimiter: str = "。！？；",
+                  pos_tags: Sequence = ("noun", "verb"),
+                  stopwords: Sequence = ("是",)) -> List[SyntacticUnit]:
     results: List[SyntacticUnit] = []
     paragraph_idx, sentence_idx = 0, 0
     raw_text: List[str] = []
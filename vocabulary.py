@@ -0,0 +1,91 @@
+"""Integer-interned lemma tables for the keyword pipeline.
+
+A `Vocabulary` gives every lemma of a document a dense id (in order of first
+appearance), and keeps the surface words of the lemmas as parallel arrays.
+`KeywordScores` holds the PageRank scores of the graph nodes as an array
+aligned with the nodes, while still behaving like the lemma -> score dict
+returned by the summa pipeline.
+"""
+from collections.abc import Mapping
+from typing import Dict, Iterable, Iterator, List, Tuple
+
+import numpy as np
+from summa.syntactic_unit import SyntacticUnit
+
+from ranking import top_k_indices
+
+
+class Vocabulary:
+    def __init__(self, tokens: Dict[str, SyntacticUnit]):
+        """`tokens` is the word -> unit dict of DocumentAnalysis.word_units."""
+        self.lemmas: List[str] = list(dict.fromkeys(unit.token for unit in tokens.values()))
+        self.ids: Dict[str, int] = {lemma: i for i, lemma in enumerate(self.lemmas)}
+        self.words: List[str] = list(tokens.keys())
+        # The lemma id of every word
+        self.word_lemma_ids = np.fromiter(
+            (self.ids[unit.token] for unit in tokens.values()),
+            dtype=np.int64, count=len(self.words))
+        self._word_ids: Dict[str, int] = {word: i for i, word in enumerate(self.words)}
+
+    def __len__(self) -> int:
+        return len(self.lemmas)
+
+    def lookup(self, lemmas: Iterable[str]) -> np.ndarray:
+        """Returns the ids of the lemmas."""
+        return np.asarray([self.ids[lemma] for lemma in lemmas], dtype=np.int64)
+
+    def encode_words(self, words: Iterable[str]) -> np.ndarray:
+        """Returns the lemma id of every word of a text (-1 for unknown words)."""
+        word_ids = np.asarray(
+            [self._word_ids.get(word, -1) for word in words], dtype=np.int64)
+        lemma_ids = np.full(len(word_ids), -1, dtype=np.int64)
+        known = word_ids >= 0
+        lemma_ids[known] = self.word_lemma_ids[word_ids[known]]
+        return lemma_ids
+
+    def surface_words(self) -> List[List[str]]:
+        """Returns the words of every lemma (in word order), indexed by lemma id."""
+        order = np.argsort(self.word_lemma_ids, kind="stable")
+        bounds = np.searchsorted(self.word_lemma_ids[order], np.arange(len(self) + 1))
+        return [[self.words[i] for i in order[start:end].tolist()]
+                for start, end in zip(bounds[:-1].tolist(), bounds[1:].tolist())]
+
+    def lemmas_to_words(self) -> Dict[str, List[str]]:
+        """Same as summa.keywords._lemmas_to_words."""
+        return dict(zip(self.lemmas, self.surface_words()))
+
+
+class KeywordScores(Mapping):
+    """Scores of the graph nodes, in node order, with a lemma -> score dict interface."""
+
+    def __init__(self, vocabulary: Vocabulary, lemmas: List[str], scores: np.ndarray):
+        self.vocabulary = vocabulary
+        self.node_ids = vocabulary.lookup(lemmas)
+        self.array = np.asarray(scores, dtype=np.float64)
+        self._positions = np.full(len(vocabulary), -1, dtype=np.int64)
+        self._positions[self.node_ids] = np.arange(len(self.node_ids))
+
+    def __getitem__(self, lemma: str) -> float:
+        lemma_id = self.vocabulary.ids.get(lemma)
+        position = -1 if lemma_id is None else self._positions[lemma_id]
+        if position < 0:
+            raise KeyError(lemma)
+        return float(self.array[position])
+
+    def __iter__(self) -> Iterator[str]:
+        lemmas = self.vocabulary.lemmas
+        return (lemmas[i] for i in self.node_ids.tolist())
+
+    def __len__(self) -> int:
+        return len(self.node_ids)
+
+    def top(self, n: int) -> np.ndarray:
+        """Node positions of the n best scores, best first (ties in node order)."""
+        return top_k_indices(self.array, n)
+
+    def ranked(self) -> List[Tuple[float, str]]:
+        """(score, lemma) of every node, best first, like summa's _extract_tokens."""
+        order = self.top(len(self))
+        lemmas = self.vocabulary.lemmas
+        return [(score, lemmas[i]) for score, i in zip(
+            self.array[order].tolist(), self.node_ids[order].tolist())]